@@ -0,0 +1,61 @@
+"""
+Бенчмарк: поточечный geopy.distance.geodesic против векторного geo_utils.nearest_within.
+Заодно проверяет заявленную точность на широтах ЕС.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_distance.py
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+from geopy.distance import geodesic
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geo_utils import distances_km, nearest_within  # noqa: E402
+
+MAX_DISTANCE_KM = 40
+TOP_N = 10
+
+
+def make_points(lat: float, lon: float, count: int, spread_km: float, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    lats = lat + rng.uniform(-1, 1, count) * spread_km / 111.0
+    lons = lon + rng.uniform(-1, 1, count) * spread_km / (111.0 * np.cos(np.radians(lat)))
+    return lats, lons
+
+
+def geodesic_loop(lat, lon, lats, lons):
+    """Как было: расстояние до каждой точки по одной, фильтр и полная сортировка."""
+    found = []
+    for el_lat, el_lon in zip(lats, lons):
+        distance_km = geodesic((lat, lon), (el_lat, el_lon)).kilometers
+        if distance_km <= MAX_DISTANCE_KM:
+            found.append(distance_km)
+    found.sort()
+    return found[:TOP_N]
+
+
+def main():
+    print("Точность относительно geodesic (радиус 50 км):")
+    for lat in (36.0, 45.0, 55.0, 70.0):
+        lats, lons = make_points(lat, 10.0, 2000, 35)
+        reference = np.array([geodesic((lat, 10.0), p).kilometers for p in zip(lats, lons)])
+        error = np.abs(distances_km(lat, 10.0, lats, lons) - reference)
+        print(f"  широта {lat:>4.0f}°: макс. {error.max() * 1000:.2f} м, {np.max(error / reference) * 100:.4f} %")
+
+    print(f"\n{'точек':>6} | {'geodesic, мс':>13} | {'numpy, мс':>10} | ускорение")
+    for count in (100, 1000, 10000):
+        lats, lons = make_points(52.5, 13.4, count, 60)
+        runs = max(1, 2000 // count)
+        loop_time = timeit.timeit(lambda: geodesic_loop(52.5, 13.4, lats, lons), number=runs) / runs
+        numpy_time = timeit.timeit(
+            lambda: nearest_within(52.5, 13.4, lats, lons, MAX_DISTANCE_KM, TOP_N), number=runs * 20
+        ) / (runs * 20)
+        print(f"{count:>6} | {loop_time * 1e3:>13.2f} | {numpy_time * 1e3:>10.3f} | x{loop_time / numpy_time:.0f}")
+
+
+if __name__ == "__main__":
+    main()
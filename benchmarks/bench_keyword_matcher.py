@@ -0,0 +1,63 @@
+"""
+Микробенчмарк: поиск ключевых слов циклом `keyword in lowered` против KeywordMatcher.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_keyword_matcher.py
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_matcher import KeywordMatcher  # noqa: E402
+
+ALPHABET = "абвгдежзиклмнопрстуфхцчшщэюя"
+MESSAGES = [
+    "Сколько мне осталось до паузы, если я еду с 6 утра и сделал разрыв паузы?",
+    "Нужен паром из Польши в Швецию с каютой, какие есть варианты?",
+    "Как заполнить CMR, если получатель поменял адрес разгрузки?",
+    "Где поесть и принять душ рядом с трассой A2 в Германии?",
+    "Карта тахографа не читается, что делать на проверке?",
+]
+
+
+def make_keywords(count: int, seed: int = 42) -> dict:
+    rng = random.Random(seed)
+    keywords = {}
+    while len(keywords) < count:
+        word = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(4, 10)))
+        keywords[word] = f"file_{len(keywords) % 12}"
+    # Реальные ключи, чтобы были совпадения
+    keywords.update({"пауза": "Rezim_RTO", "паром": "ferry_routes", "cmr": "CMR", "тахограф": "tahograf"})
+    return keywords
+
+
+def loop_match(keywords_map: dict, text: str) -> set:
+    lowered = text.lower()
+    return {filename for keyword, filename in keywords_map.items() if keyword in lowered}
+
+
+def main():
+    print(f"{'ключей':>7} | {'цикл, мкс/сообщ.':>17} | {'matcher, мкс/сообщ.':>20} | {'сборка matcher, мс':>19}")
+    for count in (50, 500, 5000):
+        keywords_map = make_keywords(count)
+        build = timeit.timeit(lambda: KeywordMatcher(keywords_map, stem=False), number=3) / 3
+        matcher = KeywordMatcher(keywords_map, stem=False)
+
+        for text in MESSAGES:
+            assert loop_match(keywords_map, text) >= matcher.targets_for(text)
+
+        runs = max(20, 20000 // count)
+        loop_time = timeit.timeit(lambda: [loop_match(keywords_map, t) for t in MESSAGES], number=runs)
+        matcher_time = timeit.timeit(lambda: [matcher.find(t) for t in MESSAGES], number=runs)
+        per_message = runs * len(MESSAGES)
+        print(
+            f"{count:>7} | {loop_time / per_message * 1e6:>17.1f} | "
+            f"{matcher_time / per_message * 1e6:>20.1f} | {build * 1e3:>19.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Бенчмарк: старый nlp_search (nlp(keyword) + token.similarity во вложенном цикле)
+против матричного поиска VectorIndex.
+
+Нужна модель ru_core_news_sm. Запуск из корня репозитория:
+    python benchmarks/bench_nlp_search.py
+"""
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nlp_search  # noqa: E402
+
+MESSAGES = [
+    "Сколько мне осталось до паузы, если я еду с 6 утра?",
+    "Нужен паром из Польши в Швецию, какие есть варианты?",
+    "Как заполнить документ на груз, если получатель поменял адрес?",
+    "Где нормально поесть рядом с трассой, хочу питание получше",
+    "Карта тахографа не читается, что делать на проверке?",
+]
+
+
+def legacy_match_files(user_input: str) -> set:
+    """Поиск файлов в том виде, как он был до векторизации."""
+    doc = nlp_search.nlp(user_input.lower())
+    selected_files = set()
+    for keyword, filename in nlp_search.keywords_map.items():
+        keyword_doc = nlp_search.nlp(keyword)
+        for token in doc:
+            if token.similarity(keyword_doc) > nlp_search.SIMILARITY_THRESHOLD:
+                selected_files.add(filename)
+    return selected_files
+
+
+def vector_match_files(user_input: str) -> set:
+    return nlp_search.vector_index.match_files(nlp_search.nlp(user_input.lower()))
+
+
+def main():
+    started = time.perf_counter()
+    if not nlp_search.load_model():
+        raise SystemExit(f"Модель {nlp_search.MODEL_NAME} не установлена")
+    print(f"Загрузка модели и индекса: {(time.perf_counter() - started) * 1e3:.1f} мс")
+
+    for text in MESSAGES:
+        legacy, vector = legacy_match_files(text), vector_match_files(text)
+        marker = "=" if legacy == vector else "≠"
+        print(f"{marker} {text[:50]!r}: {sorted(legacy)} / {sorted(vector)}")
+
+    runs = 20
+    legacy_time = timeit.timeit(lambda: [legacy_match_files(t) for t in MESSAGES], number=runs)
+    vector_time = timeit.timeit(lambda: [vector_match_files(t) for t in MESSAGES], number=runs)
+    per_message = runs * len(MESSAGES)
+    print(f"старый цикл:      {legacy_time / per_message * 1e3:.2f} мс/сообщение")
+    print(f"матричный поиск:  {vector_time / per_message * 1e3:.2f} мс/сообщение")
+    print(f"ускорение:        x{legacy_time / vector_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
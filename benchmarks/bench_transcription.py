@@ -0,0 +1,115 @@
+"""
+Бенчмарк распознавания голоса: задержка и точность (WER) бэкендов transcription.py
+на наборе русских голосовых.
+
+Образцы — файлы .oga/.ogg/.mp3/.wav в каталоге, рядом с каждым эталонная расшифровка
+с тем же именем и расширением .txt (например, pauza.oga + pauza.txt).
+
+Запуск из корня репозитория:
+    python benchmarks/bench_transcription.py benchmarks/voice_samples --backends openai,local
+Для openai нужен OPENAI_API_KEY, для local — установленный faster-whisper.
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transcription import LocalWhisperBackend, OpenAIWhisperBackend  # noqa: E402
+
+AUDIO_EXTENSIONS = (".oga", ".ogg", ".opus", ".mp3", ".wav", ".m4a")
+WORD_RE = re.compile(r"\w+")
+
+
+def words(text: str) -> list:
+    return WORD_RE.findall(text.lower().replace("ё", "е"))
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """WER: расстояние Левенштейна по словам, делённое на число слов эталона."""
+    ref, hyp = words(reference), words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def load_samples(directory: str) -> list:
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(name)
+        reference_path = os.path.join(directory, stem + ".txt")
+        if ext.lower() not in AUDIO_EXTENSIONS or not os.path.exists(reference_path):
+            continue
+        with open(reference_path, "r", encoding="utf-8") as f:
+            samples.append((os.path.join(directory, name), f.read().strip()))
+    return samples
+
+
+def make_backend(name: str):
+    if name == "openai":
+        from openai import AsyncOpenAI
+        return OpenAIWhisperBackend(AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")))
+    if name == "local":
+        return LocalWhisperBackend(model_size=os.getenv("LOCAL_WHISPER_MODEL", "small"))
+    raise SystemExit(f"Неизвестный бэкенд: {name}")
+
+
+async def run_backend(backend, samples: list):
+    await backend.start()  # Загрузка модели не входит в замер
+    latencies, errors = [], []
+    try:
+        for path, reference in samples:
+            with open(path, "rb") as audio:
+                started = time.perf_counter()
+                try:
+                    text = await backend.transcribe(audio)
+                except Exception as e:
+                    print(f"  {os.path.basename(path)}: ошибка {e}")
+                    continue
+                latencies.append(time.perf_counter() - started)
+            errors.append(word_error_rate(reference, text))
+            print(f"  {os.path.basename(path)}: {latencies[-1]:.2f} с, WER {errors[-1]:.0%} — {text}")
+    finally:
+        await backend.close()
+    return latencies, errors
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("samples", help="каталог с голосовыми и эталонными .txt")
+    parser.add_argument("--backends", default="openai,local")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    if not samples:
+        raise SystemExit(f"В {args.samples} нет пар аудио + .txt")
+    print(f"Образцов: {len(samples)}")
+
+    results = {}
+    for name in args.backends.split(","):
+        print(f"\n{name}:")
+        results[name] = await run_backend(make_backend(name.strip()), samples)
+
+    print(f"\n{'бэкенд':>8} | {'среднее, с':>10} | {'p50, с':>7} | {'макс, с':>8} | {'WER':>5}")
+    for name, (latencies, errors) in results.items():
+        if not latencies:
+            print(f"{name:>8} | {'—':>10} | {'—':>7} | {'—':>8} | {'—':>5}")
+            continue
+        print(
+            f"{name:>8} | {statistics.mean(latencies):>10.2f} | {statistics.median(latencies):>7.2f} | "
+            f"{max(latencies):>8.2f} | {statistics.mean(errors):>5.0%}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,3 +1,6 @@
+import contextlib
+import time
+STARTED_AT = time.perf_counter()  # Для замера времени холодного старта (включая импорты)
 import logging
 import os
 import openai
@@ -14,27 +17,68 @@ from telegram.ext import (
     ContextTypes,
 )
 from dotenv import load_dotenv
-import requests
+import aiohttp
 import asyncio
+from datetime import datetime
 from urllib.parse import quote as urllib_quote
-from geopy.distance import geodesic
 from openai import AsyncOpenAI
-import tempfile
+from knowledge_base import knowledge_store, retrieve_sections, snippet_cache
+from keyword_matcher import KeywordMatcher
+import nlp_search
+from conversation_store import create_store
+from http_client import start_session, get_session, close_session
+from place_cache import PlaceCache
+from place_results import PlaceAccumulator
+from telegram_stream import StreamingReply
+from voice_input import download_voice
+from transcription import create_transcriber
+from user_queue import UserQueue, DEBOUNCE_SECONDS, MAX_CONCURRENT_REQUESTS
+from model_router import ModelRouter, classify_query
+from response_cache import ResponseCache, RESPONSE_CACHE_TTL
+from prompt_builder import PromptBuilder
+from logic.helpers import parse_schedule_request
+from logic.route_calc import plan_schedule, format_schedule
+from logic.ferries import FERRY_FILE, parse_ferry_query, find_routes, format_routes
+from geo_utils import nearest_within
+from overpass_utils import (
+    OVERPASS_URL, OVERPASS_CATEGORIES, OVERPASS_QUERY_TIMEOUT, build_combined_query, classify_element, element_coords,
+)
 
 # --- Настройки ---
-user_contexts = {}  # {user_id: [{"role": "user", "content": "..."}, ...]}
 MAX_TURNS = 3
+HISTORY_DEPTH = int(os.getenv("HISTORY_DEPTH", "20"))  # Сколько сообщений на пользователя хранить
 MAX_DISTANCE_KM = 40  # Максимальное расстояние для результатов (в км)
 REQUEST_TIMEOUT = 15  # Таймаут для внешних HTTP-запросов в секундах
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+# Overpass сам может выполнять запрос до OVERPASS_QUERY_TIMEOUT секунд, плюс очередь и передача ответа
+OVERPASS_HTTP_TIMEOUT = aiohttp.ClientTimeout(total=OVERPASS_QUERY_TIMEOUT + 15)
 
 # --- Загрузка .env ---
 load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+# Семантический поиск по базе знаний через spaCy (модель грузится в фоне после старта)
+SEMANTIC_SEARCH = os.getenv("SEMANTIC_SEARCH", "0") == "1"
+# Где хранить историю диалогов: json (memory/sessions.json), sqlite (memory/sessions.db) или memory
+SESSIONS_BACKEND = os.getenv("SESSIONS_BACKEND", "json")
+
+# Кеш результатов поиска мест по geohash-ячейкам (точность настраивается)
+place_cache = PlaceCache(precision=int(os.getenv("PLACE_CACHE_PRECISION", "5")))
+
+# История диалогов: кольцевой буфер на пользователя, LRU и пакетная запись на диск
+conversation_store = create_store(SESSIONS_BACKEND, depth=HISTORY_DEPTH)
 
 # Инициализация клиента OpenAI v1+
 client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+model_router = ModelRouter(client)
+# Готовые ответы на повторяющиеся вопросы. Похожие (не дословные) вопросы ищутся по векторам только
+# по явному включению: усреднённый вектор плохо различает вопросы, отличающиеся названием места
+NEAR_DUPLICATE_ANSWERS = SEMANTIC_SEARCH and os.getenv("RESPONSE_CACHE_NEAR_DUPLICATES", "0") == "1"
+response_cache = ResponseCache(
+    ttl=int(os.getenv("RESPONSE_CACHE_TTL", str(RESPONSE_CACHE_TTL))),
+    embed=nlp_search.embed if NEAR_DUPLICATE_ANSWERS else None,
+)
 
 # --- Логирование ---
 logging.basicConfig(
@@ -49,109 +93,152 @@ try:
 except FileNotFoundError:
     SYSTEM_PROMPT = "Ты — Макс. Диспетчер, помощник и навигатор по жизни в рейсе."
 
+# Распознавание голоса: бэкенды по порядку (openai — Whisper API, local — faster-whisper на CPU)
+transcriber = create_transcriber(
+    client,
+    os.getenv("TRANSCRIPTION_BACKENDS", "openai,local"),
+    model_size=os.getenv("LOCAL_WHISPER_MODEL", "small"),
+    compute_type=os.getenv("LOCAL_WHISPER_COMPUTE_TYPE", "int8"),
+    workers=int(os.getenv("LOCAL_WHISPER_WORKERS", "1")),
+)
+
+# Сборка промта в пределах бюджета токенов модели
+prompt_builder = PromptBuilder(SYSTEM_PROMPT)
+
 # --- Загрузка базы знаний по ключевым словам ---
-def load_relevant_knowledge(user_input: str) -> str:
-    keywords_map = {
-        # Режим RTO
-        "отдых": "Rezim_RTO.md",
-        "смена": "Rezim_RTO.md",
-        "пауза": "Rezim_RTO.md",
-        "разрыв паузы": "Rezim_RTO.md",
-        "режим отдыха": "Rezim_RTO.md",
-        "45 часов": "Rezim_RTO.md",
-        "расчитай": "Rezim_RTO.md",
-
-        # Паромы
-        "поезд": "ferry_routes.md",
-        "паром": "ferry_routes.md",
-        "переправа": "ferry_routes.md",
-
-        # CMR
-        "цмр": "CMR.md",
-        "cmr": "CMR.md",
-        "документ": "CMR.md",
-        "накладная": "CMR.md",
-
-        # Тахограф
-        "тахограф": "4_tahograf_i_karty.md",
-        "карта тахографа": "4_tahograf_i_karty.md",
-
-        # Комфорт
-        "комфорт": "11_komfort_i_byt.md",
-        "бытовые условия": "11_komfort_i_byt.md",
-
-        # Питание
-        "питание": "12_pitanie_i_energiya.md",
-        "еда": "12_pitanie_i_energiya.md"
-    }
+KEYWORDS_MAP = {
+    # Режим RTO
+    "отдых": "Rezim_RTO.md",
+    "смена": "Rezim_RTO.md",
+    "пауза": "Rezim_RTO.md",
+    "разрыв паузы": "Rezim_RTO.md",
+    "режим отдыха": "Rezim_RTO.md",
+    "45 часов": "Rezim_RTO.md",
+    "расчитай": "Rezim_RTO.md",
+
+    # Паромы
+    "поезд": "ferry_routes.md",
+    "паром": "ferry_routes.md",
+    "переправа": "ferry_routes.md",
+
+    # CMR
+    "цмр": "CMR.md",
+    "cmr": "CMR.md",
+    "документ": "CMR.md",
+    "накладная": "CMR.md",
+
+    # Тахограф
+    "тахограф": "4_tahograf_i_karty.md",
+    "карта тахографа": "4_tahograf_i_karty.md",
+
+    # Комфорт
+    "комфорт": "11_komfort_i_byt.md",
+    "бытовые условия": "11_komfort_i_byt.md",
+
+    # Питание
+    "питание": "12_pitanie_i_energiya.md",
+    "еда": "12_pitanie_i_energiya.md"
+}
+
+# Все ключи ищутся за один проход; окончания отрезаются ("пауза" находит "паузу", "паузы")
+keyword_matcher = KeywordMatcher(KEYWORDS_MAP)
+
+def relevant_sections(user_input: str) -> list:
+    if SEMANTIC_SEARCH:
+        # Пока модель не загрузилась, nlp_search сам откатывается на поиск по ключевым словам
+        return nlp_search.relevant_sections(user_input)
 
     selected_files = set()
-    lowered = user_input.lower()
-
-    for keyword, filename in keywords_map.items():
-        if keyword in lowered:
-            logging.info(f"[База знаний] Совпадение найдено: '{keyword}' → {filename}")
-            selected_files.add(filename)
+    for keyword, filename in keyword_matcher.find(user_input):
+        logging.info(f"[База знаний] Совпадение найдено: '{keyword}' → {filename}")
+        selected_files.add(filename)
 
-    texts = []
+    filenames = []
     for filename in sorted(selected_files):
-        path = os.path.join("knowledge", filename)
-        if os.path.exists(path):
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    content = f.read().strip()
-                    if content:
-                        texts.append(f"📘 {filename}:\n{content}\n")
-                    else:
-                        logging.warning(f"[База знаний] Файл пуст: {filename}")
-            except Exception as e:
-                logging.error(f"[База знаний] Ошибка чтения файла {filename}: {e}")
-        else:
-            logging.warning(f"[База знаний] Файл не найден: {path}")
-
-    return "\n".join(texts) or ""
-
-# --- GPT-запрос (асинхронный, совместимый с openai>=1.0.0) ---
-async def ask_gpt(messages):
-    try:
-        response = await client.chat.completions.create(
-            model="gpt-5",
-            messages=messages,
-            temperature=1,
-            max_tokens=4000,
-            top_p=1.0,
-            frequency_penalty=0.0,
-            presence_penalty=0.0
-        )
-        return response
-    except Exception as e:
-        logging.warning(f"[GPT] gpt-5 недоступна, fallback на gpt-4.1-turbo: {e}")
-        try:
-            response = await client.chat.completions.create(
-                model="gpt-4.1",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=4000
-            )
-            return response
-        except Exception as e2:
-            logging.warning(f"[GPT] gpt-4.1-turbo недоступна, fallback на gpt-3.5-turbo: {e2}")
-            try:
-                response = await client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=messages,
-                    temperature=0.2,
-                    max_tokens=4000
-                )
-                return response
-            except Exception as e3:
-                logging.error(f"[GPT] Все модели GPT не сработали: {e3}")
-                return None
+        if knowledge_store.resolve(filename) is None:
+            logging.warning(f"[База знаний] Файл не найден: {filename}")
+            continue
+        filenames.append(filename)
+
+    # В промт идут только релевантные разделы, а не файлы целиком
+    return retrieve_sections(user_input, filenames)
+
+# --- Ответ GPT: модель выбирает роутер (размыкатель + дешёвые модели для простых вопросов) ---
+async def reply_with_gpt(update: Update, user_id: int, question: str, sections: list, knowledge_header: str,
+                         computed: str = None):
+    """
+    Стримит ответ GPT в чат (сообщение правится по мере генерации) и сохраняет его в историю.
+    Повторный вопрос по тем же разделам базы знаний берётся из кеша ответов без запроса к GPT.
+    Промт собирается в пределах бюджета токенов той модели, к которой роутер отправляет запрос.
+    computed — готовый расчёт или выборка, которые GPT только формулирует; такие ответы не кешируются.
+    """
+    complexity = classify_query(question, has_knowledge=bool(sections))
+    model = model_router.preferred(complexity)
+    cacheable = not computed and response_cache.cacheable(question, sections)
+    if cacheable:
+        cached = response_cache.get(question, sections, model)
+        if cached:
+            logging.info("[Кеш ответов] Ответ взят из кеша")
+            conversation_store.append(user_id, "assistant", cached)
+            reply = StreamingReply(update.message)
+            await reply.append(cached)
+            await reply.finish()
+            return
+
+    history = conversation_store.history(user_id, MAX_TURNS)
+
+    def messages_for(name: str) -> list:
+        # Роутер может уйти на запасную модель с меньшим бюджетом — промт собирается под каждую
+        return prompt_builder.build(name, history, sections, knowledge_header, computed=computed)
+
+    reply = StreamingReply(update.message)
+    route = {}
+    async for delta in model_router.stream(messages_for, complexity, route=route):
+        await reply.append(delta)
+    assistant_reply = (await reply.finish()).strip()
+    if assistant_reply:
+        conversation_store.append(user_id, "assistant", assistant_reply)
+        if cacheable and "model" in route:
+            response_cache.put(question, sections, route["model"], assistant_reply)
+    else:
+        await update.message.reply_text("❌ Ошибка при запросе к GPT. Попробуй позже.")
 
 # --- Команда /start ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Здарова, я — Макс. Диспетчер, друг и напарник. Пиши, говори или отправляй координаты — разберёмся!")
 
+# --- Команда /stats ---
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Счётчики кеша мест (чтобы подбирать точность geohash), состояние моделей GPT и кеш ответов."""
+    cache = place_cache.stats()
+    lines = [
+        f"📊 Кеш мест: попаданий {cache['hits']}, промахов {cache['misses']} "
+        f"(hit rate {cache['hit_rate']:.0%}), записей {cache['entries']}, точность geohash {cache['precision']}",
+        "",
+        "🤖 Модели:",
+    ]
+    router = model_router.stats()
+    for name, model in router["models"].items():
+        latency = model["latency"]
+        lines.append(
+            f"{name} [{model['state']}]: запросов {model['requests']}, ошибок {model['errors']} "
+            f"({model['error_rate']:.0%}), p50 ≤{latency['p50']} с, p95 ≤{latency['p95']} с"
+        )
+    if router["decisions"]:
+        lines.append("Маршрутизация: " + ", ".join(f"{key} {count}" for key, count in router["decisions"].items()))
+    queue = user_queue.stats()
+    answers = response_cache.stats()
+    snippets = snippet_cache.stats()
+    lines += [
+        "",
+        f"💬 Кеш ответов: попаданий {answers['hits']} (+{answers['near_hits']} похожих), промахов {answers['misses']} "
+        f"(hit rate {answers['hit_rate']:.0%}), мимо кеша {answers['bypassed']}, записей {answers['entries']}",
+        f"📘 Фрагменты базы знаний: попаданий {snippets['hits']}, промахов {snippets['misses']} "
+        f"(hit rate {snippets['hit_rate']:.0%}), записей {snippets['entries']}",
+        f"📨 Сообщений {queue['received']}, запросов после склейки {queue['batches']}",
+    ]
+    await update.message.reply_text("\n".join(lines))
+
 # --- Обработка текстовых сообщений ---
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Показываем статус "печатает..."
@@ -162,86 +249,101 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Чем могу помочь?")
         return
 
-    user_id = update.effective_user.id
-    if user_id not in user_contexts:
-        user_contexts[user_id] = []
+    # Несколько сообщений подряд уйдут в GPT одним запросом
+    user_queue.submit(update.effective_user.id, update, user_input)
 
-    # Сохраняем пользовательский ввод
-    user_contexts[user_id].append({"role": "user", "content": user_input})
-    
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-    kb_snippet = load_relevant_knowledge(user_input)
-    
-    if kb_snippet:
-        # Заставляем модель использовать контекст
-        messages.append({
-            "role": "system",
-            "content": "⚠️ ВНИМАНИЕ: ОТВЕЧАЙ ТОЛЬКО НА ОСНОВЕ СЛЕДУЮЩИХ ДАННЫХ ИЗ БАЗЫ ЗНАНИЙ:\n" + kb_snippet
-        })
-    
-    # Добавляем историю диалога
-    messages += user_contexts[user_id][-MAX_TURNS:]
+# --- Обработка голосовых сообщений ---
+async def transcribe_voice(update: Update):
+    """Распознанный текст голосового или None (пользователю уже отправлено сообщение об ошибке)."""
+    try:
+        # Файл скачивается в память и сразу уходит в распознавание; буфер закрывается даже при ошибке
+        with await download_voice(update.message.voice) as audio:
+            user_text = await transcriber.transcribe(audio)
+    except Exception as e:
+        logging.error(f"[ERROR] Голосовая ошибка: {e}")
+        await update.message.reply_text("⚠️ Не смог обработать голос. Возможно, проблема с форматом.")
+        return None
 
-    # Отправляем в GPT
-    response = await ask_gpt(messages)
-    
-    if response and response.choices:
-        assistant_reply = response.choices[0].message.content.strip()
-        user_contexts[user_id].append({"role": "assistant", "content": assistant_reply})
-        await update.message.reply_text(assistant_reply)
-    else:
-        await update.message.reply_text("❌ Ошибка при запросе к GPT. Попробуй позже.")
+    if not user_text:
+        await update.message.reply_text("🎧 Не смог разобрать голос. Попробуй снова.")
+        return None
+
+    await update.message.reply_text(f"Ты сказал: {user_text}")
+    return user_text
 
-# --- Обработка голосовых сообщений ---
 async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Показываем статус "печатает..."
     await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
 
-    try:
-        file = await update.message.voice.get_file()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".oga") as f:
-            await file.download_to_drive(f.name)
-            audio_path = f.name
-
-        with open(audio_path, "rb") as audio_file:
-            transcript = await client.audio.transcriptions.create(model="whisper-1", file=audio_file)
-            user_text = transcript.text
-
-        os.remove(audio_path)  # Удаляем временный файл
+    # Распознавание идёт сразу, а место в очереди занимается в момент получения — порядок сообщений сохраняется
+    user_queue.submit(update.effective_user.id, update, asyncio.create_task(transcribe_voice(update)))
 
-        if not user_text:
-            await update.message.reply_text("🎧 Не смог разобрать голос. Попробуй снова.")
-            return
-
-        await update.message.reply_text(f"Ты сказал: {user_text}")
-
-        user_id = update.effective_user.id
-        if user_id not in user_contexts:
-            user_contexts[user_id] = []
-
-        user_contexts[user_id].append({"role": "user", "content": user_text})
-        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-        kb_snippet = load_relevant_knowledge(user_text)
-
-        if kb_snippet:
-            messages.append({
-                "role": "system",
-                "content": "⚠️ ВНИМАНИЕ: ОТВЕЧАЙ ТОЛЬКО НА ОСНОВЕ СЛЕДУЮЩИХ ДАННЫХ:\n" + kb_snippet
-            })
-
-        messages += user_contexts[user_id][-MAX_TURNS:]
-        
-        response = await ask_gpt(messages)
-        
-        if response and response.choices:
-            assistant_reply = response.choices[0].message.content.strip()
-            user_contexts[user_id].append({"role": "assistant", "content": assistant_reply})
-            await update.message.reply_text(assistant_reply)
-        else:
-            await update.message.reply_text("❌ Ошибка при запросе к GPT. Попробуй позже.")
+# --- Расчёт графика по РТО (без GPT) ---
+def schedule_for(user_input: str) -> str:
+    """График по РТО, если водитель просит рассчитать поездку; считается локально, GPT его только пересказывает."""
+    request = parse_schedule_request(user_input, datetime.now())
+    if not request:
+        return None
+    started = time.perf_counter()
+    try:
+        schedule = plan_schedule(**request)
     except Exception as e:
-        logging.error(f"[ERROR] Голосовая ошибка: {e}")
-        await update.message.reply_text("⚠️ Не смог обработать голос. Возможно, проблема с форматом.")
+        logging.error(f"[РТО] Ошибка расчёта графика: {e}", exc_info=True)
+        return None
+    logging.info(f"[РТО] График на {request['distance_km']:g} км рассчитан за {(time.perf_counter() - started) * 1e6:.0f} мкс")
+    return (
+        "📐 ГРАФИК УЖЕ РАССЧИТАН ПО РЕГЛАМЕНТУ 561/2006. Не пересчитывай его, только объясни водителю "
+        "понятно и коротко, сохранив все времена:\n" + format_schedule(schedule)
+    )
+
+# --- Паромы и поезда из индекса маршрутов (без GPT) ---
+FERRY_ANSWER_LIMIT = 10  # Сколько маршрутов максимум отдаём в промт
+
+def ferries_for(user_input: str) -> str:
+    """Маршруты, подходящие под вопрос о пароме/поезде: ищутся по индексу, GPT их только пересказывает."""
+    query = parse_ferry_query(user_input)
+    if query is None:
+        return None
+    routes = find_routes(**query)
+    logging.info(f"[Паромы] Запрос {query}: найдено маршрутов {len(routes)}")
+    if not routes:
+        return "🚢 В базе маршрутов нет паромов или поездов под эти условия. Так и скажи водителю, ничего не придумывай."
+    return (
+        "🚢 МАРШРУТЫ ИЗ БАЗЫ ПО ЗАПРОСУ ВОДИТЕЛЯ (от коротких к длинным), отвечай по ним:\n"
+        + format_routes(routes[:FERRY_ANSWER_LIMIT])
+    )
+
+# --- Ответ на пачку сообщений пользователя ---
+async def answer_messages(batch: list):
+    """Один запрос к GPT на все сообщения, пришедшие подряд (user_queue); отвечаем на последнее."""
+    update = batch[-1][0]
+    user_id = update.effective_user.id
+    user_input = "\n".join(text for _, text in batch)
+    await update.get_bot().send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
+
+    # Сохраняем пользовательский ввод
+    conversation_store.append(user_id, "user", user_input)
+
+    sections = relevant_sections(user_input)
+    ferries = ferries_for(user_input)
+    if ferries:
+        # Маршруты уже выбраны по индексу — текст файла с паромами в промте не нужен
+        sections = [section for section in sections if section["file"] != FERRY_FILE]
+    computed = "\n\n".join(part for part in (schedule_for(user_input), ferries) if part) or None
+
+    # Отправляем в GPT (заставляем модель использовать контекст), ответ дописывается по мере генерации
+    await reply_with_gpt(
+        update, user_id, user_input, sections,
+        "⚠️ ВНИМАНИЕ: ОТВЕЧАЙ ТОЛЬКО НА ОСНОВЕ СЛЕДУЮЩИХ ДАННЫХ ИЗ БАЗЫ ЗНАНИЙ:\n",
+        computed=computed,
+    )
+
+# Очередь по пользователям: склеивает сообщения подряд и ограничивает число одновременных запросов к GPT
+user_queue = UserQueue(
+    answer_messages,
+    debounce=float(os.getenv("USER_DEBOUNCE_SECONDS", str(DEBOUNCE_SECONDS))),
+    max_concurrent=int(os.getenv("MAX_CONCURRENT_REQUESTS", str(MAX_CONCURRENT_REQUESTS))),
+)
 
 # --- Обработка геолокации ---
 async def handle_location(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -280,144 +382,233 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
         await query.edit_message_text(text="Произошла ошибка, попробуйте снова.")
 
 # --- Поиск через Google API ---
+GOOGLE_PLACES_URL = "https://maps.googleapis.com/maps/api/place/"
+GOOGLE_CONCURRENCY = 6  # Сколько запросов к Google Places выполнять одновременно
+GOOGLE_PLACE_QUERIES = [
+    {"label": "🌳 Парки", "type": "park", "keyword": "park", "radius": 20000},
+    {"label": "🏛 Достопримечательности", "type": "tourist_attraction", "keyword": "tourist attraction|museum|landmark", "radius": 20000},
+    {"label": "🅿️ Парковка для фур", "keyword": "грузовая парковка|truck parking", "radius": 10000},
+    {"label": "🏨 Отель/Мотель", "type": "lodging", "keyword": "мотель|гостиница|hotel|motel", "radius": 10000},
+    {"label": "🛒 Магазин", "type": "supermarket", "radius": 5000},
+    {"label": "🧺 Прачечная", "keyword": "прачечная самообслуживания|self-service laundry", "radius": 5000},
+    {"label": "🚿 Душевые", "keyword": "душ|сауна|truck stop showers", "radius": 10000},
+]
+
+def google_category_urls(query_info: dict, lat: float, lon: float) -> list:
+    """URL-запросы Google Places для одной категории (nearbysearch по типу и textsearch по ключевым словам)."""
+    place_type = query_info.get("type")
+    keyword = query_info.get("keyword")
+    radius = query_info.get("radius", 10000)
+    urls = []
+    if place_type:
+        urls.append(
+            f"{GOOGLE_PLACES_URL}nearbysearch/json"
+            f"?location={lat},{lon}&type={place_type}&rankby=distance&key={GOOGLE_MAPS_API_KEY}"
+        )
+    if keyword:
+        query_str = urllib_quote(keyword)
+        urls.append(
+            f"{GOOGLE_PLACES_URL}textsearch/json"
+            f"?query={query_str}&location={lat},{lon}&radius={radius}&key={GOOGLE_MAPS_API_KEY}&language=ru"
+        )
+    return urls
+
+def place_accumulator(context: ContextTypes.DEFAULT_TYPE, lat: float, lon: float, source: str) -> PlaceAccumulator:
+    """
+    Общий накопитель результатов для одной точки: если по тем же координатам уже искали
+    через другой источник, показанные там места не повторяются. Повторный поиск тем же
+    источником начинает с чистого листа.
+    """
+    stored = context.user_data.get("place_results")
+    if stored and stored["location"] == (lat, lon) and source not in stored["sources"]:
+        stored["sources"].add(source)
+        return stored["accumulator"]
+    accumulator = PlaceAccumulator()
+    context.user_data["place_results"] = {"location": (lat, lon), "sources": {source}, "accumulator": accumulator}
+    return accumulator
+
+def nearby_places(raw_places: list, lat: float, lon: float, label: str, source: str,
+                  accumulator: PlaceAccumulator, limit: int = None) -> list:
+    """
+    Считает расстояния от точки пользователя до «сырых» мест одним векторным расчётом,
+    отбрасывает дальше MAX_DISTANCE_KM и добавляет в накопитель до limit новых (не дублей) мест.
+    Возвращает добавленные кортежи (название, адрес, ссылка на маршрут, км) по возрастанию расстояния.
+    """
+    if not raw_places:
+        return []
+    # Кандидатов берём с запасом: часть отсеется как дубли (одно место из двух URL, уже показанные)
+    candidates = 2 * limit + len(accumulator) if limit else None
+    indices, distances = nearest_within(
+        lat, lon,
+        [place["lat"] for place in raw_places],
+        [place["lon"] for place in raw_places],
+        MAX_DISTANCE_KM, candidates,
+    )
+    added = 0
+    for index, distance_km in zip(indices, distances):
+        place = raw_places[index]
+        maps_url = f"https://www.google.com/maps/dir/?api=1&origin={lat},{lon}&destination={place['lat']},{place['lon']}&travelmode=driving"
+        if accumulator.add(label, source, place, maps_url, float(distance_km)):
+            added += 1
+            if limit and added >= limit:
+                break
+    return accumulator.grouped.get(label, [])[-added:] if added else []
+
+async def fetch_google_url(url: str, label: str, semaphore: asyncio.Semaphore):
+    """
+    Все страницы одного URL. Страницы идут последовательно: next_page_token оживает только через ~2 с.
+    Возвращает (места, True, если все страницы получены без ошибок).
+    """
+    found = []
+    next_page_token = None
+    while True:
+        try:
+            if next_page_token:
+                request_url = f"{url}&pagetoken={next_page_token}"
+                logging.info(f"Google API пагинация для {label}: {request_url}")
+            else:
+                request_url = url
+                logging.info(f"Google API запрос для {label}: {url}")
+            async with semaphore:
+                async with get_session().get(request_url, timeout=HTTP_TIMEOUT) as res:
+                    res.raise_for_status()
+                    data = await res.json()
+            logging.info(f"Статус Google API для {label}: {data.get('status')}")
+            if data.get("status") == "ZERO_RESULTS":
+                return found, True
+            if data.get("status") != "OK":
+                logging.warning(f"Google API вернул статус {data.get('status')} для {label}: {data.get('error_message', '')}")
+                return found, False
+            for place in data.get("results", [])[:15]:
+                loc = place["geometry"]["location"]
+                found.append({
+                    "id": place.get("place_id"),
+                    "name": place.get("name"),
+                    "address": place.get("vicinity", "Без адреса"),
+                    "lat": loc["lat"],
+                    "lon": loc["lng"],
+                })
+            next_page_token = data.get("next_page_token")
+            if not next_page_token:
+                return found, True
+            await asyncio.sleep(2)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.error(f"Ошибка HTTP запроса Google API для {label}: {e}")
+            return found, False
+        except Exception as e:
+            logging.error(f"Ошибка обработки данных Google API для {label}: {e}")
+            return found, False
+
+async def fetch_google_category(query_info: dict, lat: float, lon: float, semaphore: asyncio.Semaphore):
+    """Места одной категории: сначала из кеша ячейки, иначе все её URL запрашиваются параллельно."""
+    label = query_info["label"]
+    cached = place_cache.get("google", label, lat, lon)
+    if cached is not None:
+        return label, cached
+    urls = google_category_urls(query_info, lat, lon)
+    pages = await asyncio.gather(*(fetch_google_url(url, label, semaphore) for url in urls))
+    raw_places = [place for found, _ in pages for place in found]
+    # Неполные ответы (ошибка, лимит) не кешируем
+    if all(complete for _, complete in pages):
+        place_cache.put("google", label, lat, lon, raw_places)
+    return label, raw_places
+
 async def search_with_google(query, context: ContextTypes.DEFAULT_TYPE, lat: float, lon: float):
-    """Поиск мест через Google Places API с фильтрацией по расстоянию и пагинацией."""
+    """
+    Поиск мест через Google Places API с фильтрацией по расстоянию и пагинацией.
+    Все категории запрашиваются параллельно (не больше GOOGLE_CONCURRENCY запросов сразу),
+    и каждая категория отправляется пользователю, как только готова.
+    """
     # Показываем статус "печатает..." в чате, где была нажата кнопка
     await context.bot.send_chat_action(chat_id=query.message.chat_id, action=ChatAction.TYPING)
     try:
-        place_queries = [
-            {"label": "🌳 Парки", "type": "park", "keyword": "park", "radius": 20000},
-            {"label": "🏛 Достопримечательности", "type": "tourist_attraction", "keyword": "tourist attraction|museum|landmark", "radius": 20000},
-            {"label": "🅿️ Парковка для фур", "keyword": "грузовая парковка|truck parking", "radius": 10000},
-            {"label": "🏨 Отель/Мотель", "type": "lodging", "keyword": "мотель|гостиница|hotel|motel", "radius": 10000},
-            {"label": "🛒 Магазин", "type": "supermarket", "radius": 5000},
-            {"label": "🧺 Прачечная", "keyword": "прачечная самообслуживания|self-service laundry", "radius": 5000},
-            {"label": "🚿 Душевые", "keyword": "душ|сауна|truck stop showers", "radius": 10000},
-        ]
-        found_results_grouped = {}
-        base_url = "https://maps.googleapis.com/maps/api/place/"
-        user_location = (lat, lon)
-
-        for query_info in place_queries:
-            label = query_info["label"]
-            place_type = query_info.get("type")
-            keyword = query_info.get("keyword")
-            radius = query_info.get("radius", 10000)
-            next_page_token = None
-            urls = []
-            if place_type:
-                urls.append(
-                    f"{base_url}nearbysearch/json"
-                    f"?location={lat},{lon}&type={place_type}&rankby=distance&key={GOOGLE_MAPS_API_KEY}"
-                )
-            if keyword:
-                query_str = urllib_quote(keyword)
-                urls.append(
-                    f"{base_url}textsearch/json"
-                    f"?query={query_str}&location={lat},{lon}&radius={radius}&key={GOOGLE_MAPS_API_KEY}&language=ru"
-                )
-
-            for url in urls:
-                while True:
-                    try:
-                        if next_page_token:
-                            paginated_url = f"{url}&pagetoken={next_page_token}"
-                            logging.info(f"Google API пагинация для {label}: {paginated_url}")
-                            res = requests.get(paginated_url, timeout=REQUEST_TIMEOUT)
-                        else:
-                            logging.info(f"Google API запрос для {label}: {url}")
-                            res = requests.get(url, timeout=REQUEST_TIMEOUT)
-                        res.raise_for_status()
-                        data = res.json()
-                        logging.info(f"Статус Google API для {label}: {data.get('status')}")
-                        if data.get("status") != "OK":
-                            logging.warning(f"Google API вернул статус {data.get('status')} для {label}: {data.get('error_message', '')}")
-                            break
-                        if data.get("results"):
-                            if label not in found_results_grouped:
-                                found_results_grouped[label] = []
-                            for place in data["results"][:15]:
-                                name = place.get("name")
-                                address = place.get("vicinity", "Без адреса")
-                                loc = place["geometry"]["location"]
-                                place_location = (loc["lat"], loc["lng"])
-                                distance_km = geodesic(user_location, place_location).kilometers
-                                if distance_km <= MAX_DISTANCE_KM:
-                                    maps_url = f"https://www.google.com/maps/dir/?api=1&origin={lat},{lon}&destination={loc['lat']},{loc['lng']}&travelmode=driving"
-                                    if (name, address) not in [(item[0], item[1]) for item in found_results_grouped[label]]:
-                                        found_results_grouped[label].append((name, address, maps_url, distance_km))
-                            next_page_token = data.get("next_page_token")
-                            if not next_page_token:
-                                break
-                            await asyncio.sleep(2)
-                    except requests.exceptions.RequestException as e:
-                        logging.error(f"Ошибка HTTP запроса Google API для {label}: {e}")
-                        break
-                    except Exception as e:
-                        logging.error(f"Ошибка обработки данных Google API для {label}: {e}")
-                        break
-
-        messages, buttons = format_places_reply(found_results_grouped, "Google Maps")
-        for msg in messages:
-            await query.message.reply_markdown(msg, reply_markup=buttons if msg == messages[-1] else None)
+        accumulator = place_accumulator(context, lat, lon, "google")
+        semaphore = asyncio.Semaphore(GOOGLE_CONCURRENCY)
+        tasks = [fetch_google_category(query_info, lat, lon, semaphore) for query_info in GOOGLE_PLACE_QUERIES]
+        sent = 0
+        for next_done in asyncio.as_completed(tasks):
+            label, raw_places = await next_done
+            places = nearby_places(raw_places, lat, lon, label, "google", accumulator)
+            if not places:
+                continue
+            messages, buttons = format_places_reply({label: places}, "Google Maps")
+            for msg in messages:
+                await query.message.reply_markdown(msg, reply_markup=buttons)
+            sent += 1
+        if not sent:
+            messages, _ = format_places_reply({}, "Google Maps")
+            await query.message.reply_text(messages[0])
+        logging.info(f"[Кеш мест] {place_cache.stats()}")
     except Exception as e:
         logging.error(f"Ошибка поиска Google API: {e}", exc_info=True)
         await query.message.reply_text("❌ Ошибка при поиске через Google Maps.")
 
 # --- Поиск через Overpass API ---
+OVERPASS_RESULTS_PER_CATEGORY = 10
+
+async def fetch_overpass_places(lat: float, lon: float) -> dict:
+    """
+    «Сырые» места по категориям OSM: из кеша ячейки, если там есть все категории,
+    иначе одним общим запросом. Возвращает {метка категории: [места]}.
+    """
+    labels = [category["label"] for category in OVERPASS_CATEGORIES]
+    cached = {label: place_cache.get("overpass", label, lat, lon) for label in labels}
+    if all(places is not None for places in cached.values()):
+        return cached
+
+    grouped = {label: [] for label in labels}
+    radius_m = MAX_DISTANCE_KM * 1000
+    full_query = build_combined_query(lat, lon, radius_m)
+    logging.info(f"Overpass API запрос: {full_query}")
+    async with get_session().post(OVERPASS_URL, data={"data": full_query}, timeout=OVERPASS_HTTP_TIMEOUT) as res:
+        res.raise_for_status()
+        data = await res.json(content_type=None)
+    elements = data.get("elements", [])
+    logging.info(f"Результаты Overpass API: {len(elements)} элементов")
+    for element in elements:
+        tags = element.get("tags", {})
+        coords = element_coords(element)
+        element_labels = classify_element(tags)
+        if not coords or not element_labels:
+            continue
+        address_parts = []
+        for tag in ["addr:street", "addr:housenumber", "addr:city", "addr:country"]:
+            if tag in tags:
+                address_parts.append(tags[tag])
+        place = {
+            "id": f"{element.get('type')}/{element.get('id')}",
+            "name": tags.get("name", "Без названия"),
+            "address": ", ".join(address_parts) if address_parts else "Без адреса",
+            "lat": coords[0],
+            "lon": coords[1],
+        }
+        for label in element_labels:
+            grouped[label].append(place)
+    for label, places in grouped.items():
+        place_cache.put("overpass", label, lat, lon, places)
+    return grouped
+
 async def search_with_overpass(query, context: ContextTypes.DEFAULT_TYPE, lat: float, lon: float):
-    """Поиск мест через Overpass API (OpenStreetMap)."""
+    """
+    Поиск мест через Overpass API (OpenStreetMap): один общий запрос на все категории,
+    элементы раскладываются по категориям по тегам на нашей стороне.
+    """
     # Показываем статус "печатает..." в чате, где была нажата кнопка
     await context.bot.send_chat_action(chat_id=query.message.chat_id, action=ChatAction.TYPING)
     try:
-        place_queries = [
-            {"label": "🌳 Парки", "query": 'node["leisure"="park"]'},
-            {"label": "🏛 Достопримечательности", "query": 'node["tourism"~"attraction|museum|monument"]'},
-            {"label": "🅿️ Парковка для фур", "query": 'node["amenity"="parking"]["truck"="yes"]'},
-            {"label": "🏨 Отель/Мотель", "query": 'node["tourism"~"hotel|motel"]'},
-            {"label": "🛒 Магазин", "query": 'node["shop"="supermarket"]'},
-            {"label": "🧺 Прачечная", "query": 'node["shop"="laundry"]'},
-            {"label": "🚿 Душевые", "query": 'node["amenity"="shower"]'},
-        ]
         found_results_grouped = {}
-        overpass_url = "http://overpass-api.de/api/interpreter"
-        user_location = (lat, lon)
-        
-        radius_m = MAX_DISTANCE_KM * 1000
-
-        for query_info in place_queries:
-            label = query_info["label"]
-            # Добавляем фильтр по радиусу в каждый запрос
-            full_query = f"[out:json];({query_info['query']}(around:{radius_m},{lat},{lon}););out body;"
-            try:
-                logging.info(f"Overpass API запрос для {label}: {full_query}")
-                res = requests.post(overpass_url, data={"data": full_query}, timeout=REQUEST_TIMEOUT)
-                res.raise_for_status()
-                data = res.json()
-                logging.info(f"Результаты Overpass API для {label}: {len(data.get('elements', []))} элементов")
-                if data.get("elements"):
-                    if label not in found_results_grouped:
-                        found_results_grouped[label] = []
-                    for element in data["elements"][:10]:
-                        name = element.get("tags", {}).get("name", "Без названия")
-                        address_parts = []
-                        tags = element.get("tags", {})
-                        for tag in ["addr:street", "addr:housenumber", "addr:city", "addr:country"]:
-                            if tag in tags:
-                                address_parts.append(tags[tag])
-                        address = ", ".join(address_parts) if address_parts else "Без адреса"
-                        el_lat, el_lon = element["lat"], element["lon"]
-                        place_location = (el_lat, el_lon)
-                        distance_km = geodesic(user_location, place_location).kilometers
-                        # Проверка дистанции на всякий случай, хотя API уже должен был отфильтровать
-                        if distance_km <= MAX_DISTANCE_KM:
-                            maps_url = f"https://www.google.com/maps/dir/?api=1&origin={lat},{lon}&destination={el_lat},{el_lon}&travelmode=driving"
-                            if (name, address) not in [(item[0], item[1]) for item in found_results_grouped[label]]:
-                                found_results_grouped[label].append((name, address, maps_url, distance_km))
-            except requests.exceptions.RequestException as e:
-                logging.error(f"Ошибка HTTP запроса Overpass API для {label}: {e}")
-            except Exception as e:
-                logging.error(f"Ошибка обработки данных Overpass API для {label}: {e}")
+        accumulator = place_accumulator(context, lat, lon, "overpass")
+        try:
+            for label, raw_places in (await fetch_overpass_places(lat, lon)).items():
+                places = nearby_places(raw_places, lat, lon, label, "overpass", accumulator,
+                                       limit=OVERPASS_RESULTS_PER_CATEGORY)
+                if places:
+                    found_results_grouped[label] = places
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.error(f"Ошибка HTTP запроса Overpass API: {e}")
+        except Exception as e:
+            logging.error(f"Ошибка обработки данных Overpass API: {e}")
+        logging.info(f"[Кеш мест] {place_cache.stats()}")
         messages, buttons = format_places_reply(found_results_grouped, "OpenStreetMap")
         for msg in messages:
             await query.message.reply_markdown(msg, reply_markup=buttons if msg == messages[-1] else None)
@@ -446,13 +637,46 @@ def format_places_reply(results, source):
     
     return messages, None # Убрал кнопку "Все места" для простоты
 
+# --- Запуск и остановка приложения ---
+async def stop_task(task):
+    """Отменяет фоновую задачу старта, если она ещё идёт, и дожидается её завершения."""
+    if task is None:
+        return
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+async def on_startup(app):
+    await start_session()
+    await conversation_store.start()
+    if SEMANTIC_SEARCH:
+        nlp_search.start_background_load()
+    # Основной бэкенд распознавания прогревается в фоне и не задерживает старт
+    app.bot_data["transcriber_start"] = asyncio.create_task(transcriber.start())
+    logging.info(f"[Старт] Бот готов к работе за {time.perf_counter() - STARTED_AT:.2f} с")
+
+async def on_shutdown(app):
+    await user_queue.close()
+    await stop_task(app.bot_data.pop("transcriber_start", None))
+    await transcriber.close()
+    await conversation_store.close()
+    await close_session()
+
 # --- Запуск бота ---
 if __name__ == '__main__':
     if not all([TELEGRAM_TOKEN, OPENAI_API_KEY, GOOGLE_MAPS_API_KEY]):
         logging.critical("Не установлены все необходимые переменные окружения!")
     else:
-        app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+        knowledge_store.load()
+        # Обработчики разных пользователей идут параллельно; порядок внутри чата держит user_queue
+        app = (
+            ApplicationBuilder().token(TELEGRAM_TOKEN)
+            .concurrent_updates(True)
+            .post_init(on_startup).post_shutdown(on_shutdown)
+            .build()
+        )
         app.add_handler(CommandHandler("start", start))
+        app.add_handler(CommandHandler("stats", stats))
         app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
         app.add_handler(MessageHandler(filters.VOICE, handle_voice))
         app.add_handler(MessageHandler(filters.LOCATION, handle_location))
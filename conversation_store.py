@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict, deque
+
+SESSIONS_PATH = os.path.join("memory", "sessions.json")
+SESSIONS_DB_PATH = os.path.join("memory", "sessions.db")
+HISTORY_DEPTH = 20        # Сколько последних сообщений хранить на пользователя
+MAX_USERS = 5000          # Сколько пользователей держать в памяти (LRU)
+IDLE_TTL = 7 * 24 * 3600  # Через сколько секунд простоя пользователь вытесняется из памяти
+FLUSH_INTERVAL = 10       # Как часто (в секундах) сбрасывать изменения на диск
+
+
+class JsonBackend:
+    """
+    Весь стор целиком в одном JSON-файле (memory/sessions.json). Содержимое файла держится рядом
+    с ним в памяти: изменения вливаются в него, поэтому вытесненные из LRU пользователи не теряются
+    при следующей записи и подгружаются обратно через load.
+    """
+
+    def __init__(self, path: str = SESSIONS_PATH):
+        self.path = path
+        self._stored = {}  # {str(user_id): запись} — то, что сейчас лежит в файле
+
+    def load_all(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._stored = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"[Сессии] Не удалось прочитать {self.path}: {e}")
+            return {}
+        return dict(self._stored)
+
+    def load(self, user_id):
+        return self._stored.get(str(user_id))
+
+    def save(self, changed: dict):
+        stored = dict(self._stored, **changed)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(stored, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._stored = stored
+
+
+class SqliteBackend:
+    """По строке на пользователя; пишутся только изменённые, вытесненные подгружаются по запросу."""
+
+    def __init__(self, path: str = SESSIONS_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions (user_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def load_all(self) -> dict:
+        return {}  # Пользователи подгружаются лениво
+
+    def load(self, user_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM sessions WHERE user_id = ?", (str(user_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, changed: dict):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO sessions (user_id, data) VALUES (?, ?)",
+                [(key, json.dumps(value, ensure_ascii=False)) for key, value in changed.items()],
+            )
+
+
+class ConversationStore:
+    """
+    История диалогов по пользователям: кольцевой буфер на HISTORY_DEPTH сообщений,
+    LRU-вытеснение простаивающих пользователей и пакетная запись на диск в фоне.
+    Рядом с историей хранится сводка диалога и счётчик сообщений, которые в неё уже вошли.
+    """
+
+    def __init__(self, depth: int = HISTORY_DEPTH, max_users: int = MAX_USERS, idle_ttl: float = IDLE_TTL,
+                 backend=None, flush_interval: float = FLUSH_INTERVAL):
+        self.depth = depth
+        self.max_users = max_users
+        self.idle_ttl = idle_ttl
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._users = OrderedDict()  # {user_id: {"messages": deque, "last_seen": ts, "summary": str, ...}}
+        self._dirty = set()
+        self._pending_evicted = {}  # Несохранённые записи вытесненных пользователей
+        self._flush_task = None
+
+    # --- Доступ к истории ---
+    def _entry(self, user_id) -> dict:
+        entry = self._users.get(user_id)
+        if entry is None:
+            stored = self.backend.load(user_id) if self.backend else None
+            entry = self._from_json(stored or {})
+            # Отметка до вставки: иначе вернувшийся после долгого простоя пользователь
+            # вытесняется сразу же, и новые сообщения пишутся мимо стора
+            entry["last_seen"] = time.time()
+            self._users[user_id] = entry
+            self._evict()
+        else:
+            self._users.move_to_end(user_id)
+            entry["last_seen"] = time.time()
+        return entry
+
+    def append(self, user_id, role: str, content: str):
+        entry = self._entry(user_id)
+        entry["messages"].append({"role": role, "content": content})
+        entry["total"] += 1
+        self._dirty.add(user_id)
+
+    def history(self, user_id, limit: int = None) -> list:
+        messages = list(self._entry(user_id)["messages"])
+        return messages[-limit:] if limit else messages
+
+    def clear(self, user_id):
+        entry = self._entry(user_id)
+        entry["messages"].clear()
+        entry["summary"] = ""
+        entry["summarized"] = entry["total"]
+        self._dirty.add(user_id)
+
+    # --- Сводка диалога ---
+    def summary(self, user_id) -> str:
+        return self._entry(user_id)["summary"]
+
+    def unsummarized(self, user_id) -> tuple:
+        """
+        (текущая сводка, сообщения, ещё не вошедшие в неё, номер сообщения, до которого будет новая сводка).
+        Сообщения, вытесненные из буфера до того, как попали в сводку, пропускаются.
+        """
+        entry = self._entry(user_id)
+        messages = list(entry["messages"])
+        first_number = entry["total"] - len(messages)
+        return entry["summary"], messages[max(0, entry["summarized"] - first_number):], entry["total"]
+
+    def set_summary(self, user_id, summary: str, upto: int):
+        """Сохраняет сводку первых upto сообщений; устаревшую (например, после clear) отбрасывает."""
+        entry = self._entry(user_id)
+        if upto <= entry["summarized"]:
+            return
+        entry["summary"] = summary
+        entry["summarized"] = upto
+        self._dirty.add(user_id)
+
+    def __len__(self):
+        return len(self._users)
+
+    def _evict(self):
+        now = time.time()
+        while self._users:
+            user_id, entry = next(iter(self._users.items()))
+            if len(self._users) <= self.max_users and now - entry["last_seen"] <= self.idle_ttl:
+                break
+            self._users.popitem(last=False)
+            if self.backend and user_id in self._dirty:
+                self._pending_evicted[user_id] = self._to_json(entry)
+            self._dirty.discard(user_id)
+
+    # --- Сериализация ---
+    def _from_json(self, data: dict) -> dict:
+        messages = data.get("messages", [])
+        return {
+            "messages": deque(messages, maxlen=self.depth),
+            "last_seen": data.get("last_seen", time.time()),
+            "summary": data.get("summary", ""),
+            "summarized": data.get("summarized", 0),
+            "total": data.get("total", len(messages)),
+        }
+
+    @staticmethod
+    def _to_json(entry: dict) -> dict:
+        return {
+            "messages": list(entry["messages"]),
+            "last_seen": entry["last_seen"],
+            "summary": entry["summary"],
+            "summarized": entry["summarized"],
+            "total": entry["total"],
+        }
+
+    # --- Персистентность ---
+    def load(self):
+        if not self.backend:
+            return
+        for key, data in self.backend.load_all().items():
+            user_id = int(key) if key.lstrip("-").isdigit() else key
+            self._users[user_id] = self._from_json(data)
+        self._users = OrderedDict(sorted(self._users.items(), key=lambda item: item[1]["last_seen"]))
+        self._evict()
+        logging.info(f"[Сессии] Загружено пользователей: {len(self._users)}")
+
+    def _changes(self) -> dict:
+        changed = {str(user_id): self._to_json(self._users[user_id]) for user_id in self._dirty if user_id in self._users}
+        changed.update({str(user_id): data for user_id, data in self._pending_evicted.items()})
+        self._dirty.clear()
+        self._pending_evicted = {}
+        return changed
+
+    async def flush(self):
+        """Сбрасывает накопленные изменения на диск в отдельном потоке."""
+        if not self.backend or not (self._dirty or self._pending_evicted):
+            return
+        changed = self._changes()
+        try:
+            await asyncio.to_thread(self.backend.save, changed)
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"[Сессии] Ошибка записи истории: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self._evict()
+            await self.flush()
+
+    async def start(self):
+        """Загружает историю и запускает периодический сброс на диск."""
+        self.load()
+        if self.backend and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+
+def create_store(kind: str = "json", **kwargs) -> ConversationStore:
+    """Стор с бэкендом по имени: 'json' (memory/sessions.json), 'sqlite' (memory/sessions.db) или 'memory'."""
+    backends = {"json": JsonBackend, "sqlite": SqliteBackend}
+    backend = backends[kind]() if kind in backends else None
+    return ConversationStore(backend=backend, **kwargs)
@@ -1,6 +1,6 @@
 import os
-import aiohttp
 from dotenv import load_dotenv
+from http_client import get_session
 
 load_dotenv()
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
@@ -11,17 +11,16 @@ async def find_nearby_places(lat, lon, place_type="park", radius=5000):
         f"location={lat},{lon}&radius={radius}&type={place_type}&key={GOOGLE_MAPS_API_KEY}"
     )
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
-            data = await resp.json()
-            results = data.get("results", [])
-            return [
-                {
-                    "name": r.get("name"),
-                    "address": r.get("vicinity"),
-                    "rating": r.get("rating", "–"),
-                    "lat": r["geometry"]["location"]["lat"],
-                    "lon": r["geometry"]["location"]["lng"]
-                }
-                for r in results[:5]
-            ]
+    async with get_session().get(url) as resp:
+        data = await resp.json()
+        results = data.get("results", [])
+        return [
+            {
+                "name": r.get("name"),
+                "address": r.get("vicinity"),
+                "rating": r.get("rating", "–"),
+                "lat": r["geometry"]["location"]["lat"],
+                "lon": r["geometry"]["location"]["lng"]
+            }
+            for r in results[:5]
+        ]
@@ -0,0 +1,52 @@
+import asyncio
+import logging
+
+import aiohttp
+
+REQUEST_TIMEOUT = 15        # Таймаут для внешних HTTP-запросов в секундах
+POOL_LIMIT = 50             # Всего одновременных соединений
+POOL_LIMIT_PER_HOST = 10    # Соединений на один хост (Google, Overpass)
+KEEPALIVE_TIMEOUT = 30      # Сколько секунд держать простаивающее соединение открытым
+
+_session = None
+
+
+def _create_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=POOL_LIMIT,
+        limit_per_host=POOL_LIMIT_PER_HOST,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=300,
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+
+
+async def start_session() -> aiohttp.ClientSession:
+    """Создаёт общий HTTP-клиент (вызывается при старте приложения)."""
+    global _session
+    if _session is None or _session.closed:
+        _session = _create_session()
+        logging.info("[HTTP] Общий HTTP-клиент создан")
+    return _session
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Общий клиент с пулом соединений и keep-alive. Если приложение его ещё не создало
+    (например, модуль используется отдельно), клиент создаётся при первом обращении.
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = _create_session()
+    return _session
+
+
+async def close_session():
+    """Закрывает общий HTTP-клиент (вызывается при остановке приложения)."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        # Даём соединениям SSL корректно закрыться
+        await asyncio.sleep(0.25)
+        logging.info("[HTTP] Общий HTTP-клиент закрыт")
+    _session = None
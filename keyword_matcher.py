@@ -0,0 +1,84 @@
+import re
+
+# Окончания, которые отрезаем у ключевых слов, чтобы "пауза" находила "паузу", "паузы", "паузой"
+RUSSIAN_ENDINGS = sorted(
+    ["а", "я", "ы", "и", "у", "ю", "е", "о", "ой", "ей", "ом", "ем", "ам", "ям", "ах", "ях",
+     "ами", "ями", "ов", "ев", "ий", "ый", "ая", "ое", "ие", "ые", "ия", "ть"],
+    key=len, reverse=True,
+)
+MIN_STEM_LENGTH = 4
+
+
+def stem_word(word: str) -> str:
+    """Грубый стемминг: отрезает одно окончание, если основа остаётся не короче MIN_STEM_LENGTH."""
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def stem_keyword(keyword: str) -> str:
+    """Стеммит последнее слово ключевой фразы: "разрыв паузы" → "разрыв пауз", "карта тахографа" → "карта тахограф"."""
+    words = keyword.split()
+    return " ".join(words[:-1] + [stem_word(words[-1])]) if words else keyword
+
+
+def normalize(text: str) -> str:
+    return text.lower().replace("ё", "е")
+
+
+def _trie_pattern(node: dict) -> str:
+    """Превращает префиксное дерево в регулярку; жадные группы дают самое длинное совпадение."""
+    terminal = "" in node
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if terminal:
+        return body + "?" if len(body) == 1 else "(?:" + body + ")?"
+    return body
+
+
+class KeywordMatcher:
+    """
+    Находит все ключевые слова в тексте за один проход одной скомпилированной регуляркой.
+
+    Ключи собираются в префиксное дерево, из которого строится регулярка вида
+    (?<!\\w)(?=(пар(?:ом|...)|...)) — в каждой позиции начала слова она отдаёт самое
+    длинное совпадение, а все более короткие ключи-префиксы добавляются из заранее
+    посчитанной таблицы. Ключ должен начинаться с начала слова ("еда" не срабатывает на "среда").
+    """
+
+    def __init__(self, keywords_map: dict, stem: bool = True):
+        self.targets = {}   # {нормализованный ключ: [(исходный ключ, цель), ...]}
+        for keyword, target in keywords_map.items():
+            key = normalize(keyword)
+            if stem:
+                key = stem_keyword(key)
+            self.targets.setdefault(key, []).append((keyword, target))
+
+        trie = {}
+        for key in self.targets:
+            node = trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[""] = True
+
+        # Для каждого ключа — все ключи, которые являются его префиксами (включая его самого)
+        self._prefix_hits = {
+            key: [hit for i in range(1, len(key) + 1) for hit in self.targets.get(key[:i], ())]
+            for key in self.targets
+        }
+        pattern = _trie_pattern(trie) if trie else r"(?!)"
+        self._regex = re.compile(r"(?<!\w)(?=(" + pattern + "))")
+
+    def find(self, text: str) -> list:
+        """Возвращает [(ключ, цель), ...] для всех сработавших ключей в порядке первого появления."""
+        hits = {}
+        for match in self._regex.finditer(normalize(text)):
+            for keyword, target in self._prefix_hits[match.group(1)]:
+                hits.setdefault(keyword, target)
+        return list(hits.items())
+
+    def targets_for(self, text: str) -> set:
+        return {target for _, target in self.find(text)}
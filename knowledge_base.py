@@ -0,0 +1,306 @@
+import logging
+import math
+import os
+import re
+import time
+from collections import Counter, OrderedDict
+
+KNOWLEDGE_DIR = "knowledge"
+RELOAD_CHECK_INTERVAL = 30  # Как часто (в секундах) проверять mtime файлов базы знаний
+KNOWLEDGE_TOP_K = 4              # Сколько разделов базы знаний максимум отправлять в промт
+KNOWLEDGE_TOKEN_BUDGET = 1500    # Бюджет токенов на фрагменты базы знаний
+SNIPPET_CACHE_MAX_ENTRIES = 512  # Сколько склеенных фрагментов (наборов разделов) держать в памяти
+PART_TOKENS_MAX_ENTRIES = 4096   # Сколько чисел токенов отдельных разделов и заголовков держать в памяти
+
+# Заголовки разделов: "## ...", "### ..." и экранированные "\#\# ..." (файлы, выгруженные из редактора)
+HEADING_RE = re.compile(r"^((?:\\?#){2,4})\s*(.+?)\s*$", re.MULTILINE)
+TERM_RE = re.compile(r"\w+")
+STEM_LENGTH = 5  # Грубая основа слова: "паромы", "паромом" → "паром"
+
+
+def estimate_tokens(text: str) -> int:
+    """Приблизительное число токенов (для кириллицы ~3 символа на токен)."""
+    return max(1, len(text) // 3) if text else 0
+
+
+def extract_terms(text: str) -> Counter:
+    """Нормализованные термы текста для ранжирования разделов."""
+    return Counter(
+        word[:STEM_LENGTH]
+        for word in TERM_RE.findall(text.lower().replace("ё", "е"))
+        if len(word) >= 3 or word.isdigit()
+    )
+
+
+def _clean_heading(raw: str) -> str:
+    return raw.replace("\\", "").replace("*", "").strip()
+
+
+def split_sections(filename: str, text: str) -> list:
+    """
+    Делит markdown-файл на разделы по заголовкам ##/###/####.
+    Каждый раздел адресуется как "<файл>#<номер>" и хранит путь заголовков.
+    """
+    sections = []
+    matches = list(HEADING_RE.finditer(text))
+    heading_path = []  # [(уровень, заголовок), ...]
+
+    def add(title, body):
+        body = body.strip()
+        if not body:
+            return
+        sections.append({
+            "id": f"{filename}#{len(sections)}",
+            "file": filename,
+            "title": title,
+            "text": body,
+            "tokens": estimate_tokens(body),
+            "terms": extract_terms(f"{title}\n{body}"),
+            "title_terms": extract_terms(title),
+        })
+
+    # Вступление до первого заголовка раздела
+    intro_end = matches[0].start() if matches else len(text)
+    add("", text[:intro_end])
+
+    for i, match in enumerate(matches):
+        level = match.group(1).count("#")
+        title = _clean_heading(match.group(2))
+        heading_path = [(lvl, t) for lvl, t in heading_path if lvl < level] + [(level, title)]
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        add(" / ".join(t for _, t in heading_path), text[match.end():end])
+
+    return sections
+
+
+class KnowledgeStore:
+    """Хранит все файлы базы знаний в памяти и перечитывает файл только при смене mtime."""
+
+    def __init__(self, directory: str = KNOWLEDGE_DIR, check_interval: float = RELOAD_CHECK_INTERVAL):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._texts = {}    # {имя файла: содержимое}
+        self._mtimes = {}   # {имя файла: mtime на момент чтения}
+        self._sections = {}  # {имя файла: список разделов}
+        self._loaded = False
+        self._last_check = 0.0
+
+    def load(self):
+        """Читает все файлы из каталога базы знаний (вызывается при старте или при первом обращении)."""
+        self._loaded = True
+        self.refresh(force=True)
+
+    def refresh(self, force: bool = False):
+        """Перечитывает изменённые файлы, добавляет новые и забывает удалённые."""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        try:
+            names = [n for n in os.listdir(self.directory) if os.path.isfile(os.path.join(self.directory, n))]
+        except OSError as e:
+            logging.error(f"[База знаний] Не удалось прочитать каталог {self.directory}: {e}")
+            return
+
+        for name in set(self._texts) - set(names):
+            logging.info(f"[База знаний] Файл удалён: {name}")
+            self._texts.pop(name, None)
+            self._mtimes.pop(name, None)
+            self._sections.pop(name, None)
+
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.path.getmtime(path)
+                if self._mtimes.get(name) == mtime:
+                    continue
+                with open(path, "r", encoding="utf-8") as f:
+                    content = f.read().strip()
+            except (OSError, UnicodeDecodeError) as e:
+                logging.error(f"[База знаний] Ошибка чтения файла {name}: {e}")
+                continue
+            if not content:
+                logging.warning(f"[База знаний] Файл пуст: {name}")
+            if name in self._mtimes:
+                logging.info(f"[База знаний] Файл изменён, перечитан: {name}")
+            self._texts[name] = content
+            self._mtimes[name] = mtime
+            self._sections[name] = split_sections(name, content)
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+        else:
+            self.refresh()
+
+    def resolve(self, filename: str):
+        """Сопоставляет имя из keywords_map (например, 'CMR.md') реальному файлу без расширения."""
+        self._ensure_loaded()
+        if filename in self._texts:
+            return filename
+        stem, ext = os.path.splitext(filename)
+        if ext == ".md" and stem in self._texts:
+            return stem
+        return None
+
+    def get(self, filename: str) -> str:
+        """Возвращает содержимое файла из памяти (пустая строка, если файла нет)."""
+        name = self.resolve(filename)
+        if name is None:
+            return ""
+        return self._texts[name]
+
+    def version(self, filename: str):
+        """Версия файла — mtime, с которым он был прочитан."""
+        name = self.resolve(filename)
+        return self._mtimes.get(name) if name else None
+
+    def sections(self, filename: str) -> list:
+        """Разделы файла, нарезанные при последнем чтении."""
+        name = self.resolve(filename)
+        return self._sections.get(name, []) if name else []
+
+    def names(self) -> list:
+        self._ensure_loaded()
+        return sorted(self._texts)
+
+
+knowledge_store = KnowledgeStore()
+
+
+def retrieve_sections(query: str, filenames, store: KnowledgeStore = knowledge_store,
+                      top_k: int = KNOWLEDGE_TOP_K, token_budget: int = KNOWLEDGE_TOKEN_BUDGET) -> list:
+    """
+    Выбирает из указанных файлов не более top_k самых релевантных запросу разделов,
+    укладываясь в бюджет токенов. Ранжирование — TF-IDF по основам слов (заголовок весит больше).
+    """
+    candidates = [section for filename in filenames for section in store.sections(filename)]
+    if not candidates:
+        return []
+
+    query_terms = extract_terms(query)
+    doc_freq = Counter(term for section in candidates for term in section["terms"] if term in query_terms)
+    total = len(candidates)
+
+    scored = []
+    for order, section in enumerate(candidates):
+        score = 0.0
+        for term in query_terms:
+            tf = section["terms"].get(term, 0)
+            if not tf:
+                continue
+            idf = math.log(1 + total / doc_freq[term])
+            score += idf * (1 + math.log(tf)) + (2 * idf if term in section["title_terms"] else 0)
+        scored.append((score, order, section))
+
+    # Если ни один раздел не совпал по словам, берём разделы в порядке следования в файлах
+    scored.sort(key=lambda item: (-item[0], item[1]))
+
+    selected, used = [], 0
+    for score, _, section in scored:
+        if len(selected) >= top_k:
+            break
+        if used + section["tokens"] > token_budget:
+            continue
+        selected.append(section)
+        used += section["tokens"]
+
+    if not selected:
+        # Даже самый маленький подходящий раздел не влез — отдаём лучший, обрезанный по бюджету
+        best = scored[0][2]
+        selected.append(dict(best, text=best["text"][:token_budget * 3], tokens=token_budget))
+
+    logging.info(
+        f"[База знаний] Выбрано разделов: {len(selected)} из {total}, ~{sum(s['tokens'] for s in selected)} токенов: "
+        + ", ".join(s["id"] for s in selected)
+    )
+    return selected
+
+
+def format_sections(sections: list) -> str:
+    """Склеивает разделы в фрагмент для системного сообщения."""
+    texts = []
+    for section in sections:
+        header = f"{section['file']} — {section['title']}" if section["title"] else section["file"]
+        texts.append(f"📘 {header}:\n{section['text']}\n")
+    return "\n".join(texts)
+
+
+def sections_key(sections: list, store: KnowledgeStore = knowledge_store) -> tuple:
+    """
+    Набор разделов вместе с версиями файлов: правка файла меняет ключ.
+    Длина текста различает раздел, обрезанный retrieve_sections по бюджету, и целый.
+    """
+    return tuple((section["id"], store.version(section["file"]), len(section["text"])) for section in sections)
+
+
+class SnippetCache:
+    """
+    Готовые фрагменты базы знаний для системного сообщения и их размер в токенах.
+
+    Одни и те же наборы разделов (РТО + тахограф, CMR + документы) приходят снова и снова;
+    строка склеивается и токены считаются один раз на набор разделов и версии файлов,
+    лишние записи вытесняются по LRU. Токены отдельных разделов и заголовка (для отбора
+    разделов по бюджету) хранятся отдельно и в статистику попаданий не входят: она считает
+    один запрос на собранный фрагмент.
+    """
+
+    def __init__(self, store: KnowledgeStore = knowledge_store, max_entries: int = SNIPPET_CACHE_MAX_ENTRIES,
+                 max_parts: int = PART_TOKENS_MAX_ENTRIES):
+        self.store = store
+        self.max_entries = max_entries
+        self.max_parts = max_parts
+        self._entries = OrderedDict()  # {(заголовок, ключ разделов): {"text": str, "tokens": {модель: n}}}
+        self._parts = OrderedDict()    # {(заголовок, ключ разделов, модель): токены} — раздел или заголовок
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, sections: list, header: str) -> dict:
+        key = (header, sections_key(sections, self.store))
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        entry = {"text": header + format_sections(sections), "tokens": {}}
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def snippet(self, sections: list, header: str = "") -> str:
+        """format_sections с заголовком, без повторной склейки для уже встречавшегося набора."""
+        return self._entry(sections, header)["text"]
+
+    def assemble(self, sections: list, model: str, count, header: str = "") -> tuple:
+        """(фрагмент, его токены для модели); count(text, model) вызывается один раз на запись и модель."""
+        entry = self._entry(sections, header)
+        if model not in entry["tokens"]:
+            entry["tokens"][model] = count(entry["text"], model)
+        return entry["text"], entry["tokens"][model]
+
+    def part_tokens(self, sections: list, model: str, count, header: str = "") -> int:
+        """Токены одного раздела или одного заголовка — для отбора разделов, без записи в фрагменты и статистику."""
+        key = (header, sections_key(sections, self.store), model)
+        tokens = self._parts.get(key)
+        if tokens is not None:
+            self._parts.move_to_end(key)
+            return tokens
+        tokens = self._parts[key] = count(header + format_sections(sections), model)
+        while len(self._parts) > self.max_parts:
+            self._parts.popitem(last=False)
+        return tokens
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+snippet_cache = SnippetCache()
@@ -1,13 +1,20 @@
+import asyncio
+import contextlib
 import logging
 import os
 import openai
-import tempfile
 import requests
 import urllib.parse
 from geopy.distance import geodesic
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
 from dotenv import load_dotenv
+from knowledge_base import knowledge_store, retrieve_sections, snippet_cache
+from model_router import ModelRouter, classify_query
+from conversation_store import create_store
+from summarizer import Summarizer
+from voice_input import download_voice
+from transcription import create_transcriber
 
 # --- Настройка логирования ---
 logging.basicConfig(
@@ -17,7 +24,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # --- Глобальные переменные и загрузка окружения ---
-MAX_TURNS_FOR_SUMMARY = 10 # Сколько последних сообщений использовать для создания сводки
+MAX_TURNS_FOR_SUMMARY = 10 # Сколько последних сообщений хранить для обновления сводки
 MAX_DISTANCE_KM = 50       # Максимальное расстояние для результатов (в км)
 REQUEST_TIMEOUT = 15       # Таймаут для внешних HTTP запросов в секундах
 
@@ -30,6 +37,13 @@ GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 # --- Инициализация клиентов ---
 # Используем современный асинхронный клиент OpenAI
 client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
+# Общий выбор модели для ответов (размыкатель, дешёвые модели для простых вопросов)
+model_router = ModelRouter(client)
+# История и сводка диалога по пользователям; сводка дописывается в фоне после каждого ответа
+conversation_store = create_store(os.getenv("SESSIONS_BACKEND", "json"), depth=MAX_TURNS_FOR_SUMMARY)
+summarizer = Summarizer(client, conversation_store)
+# Распознавание голоса: Whisper API и/или локальная модель, порядок задаётся TRANSCRIPTION_BACKENDS
+transcriber = create_transcriber(client, os.getenv("TRANSCRIPTION_BACKENDS", "openai,local"))
 
 # Загрузка промта системы для GPT из файла
 try:
@@ -58,81 +72,26 @@ def load_relevant_knowledge(user_input: str) -> str:
         if keyword in lowered:
             selected_files.add(filename)
 
-    texts = []
+    filenames = []
     for filename in sorted(selected_files):
-        path = os.path.join("knowledge", filename)
-        if os.path.exists(path):
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    content = f.read().strip()
-                    if content:
-                        texts.append(f"📘 {filename}:\n{content}\n")
-            except Exception as e:
-                logger.error(f"Ошибка чтения файла базы знаний {filename}: {e}")
-        else:
-            logger.warning(f"Файл базы знаний не найден: {path}")
-    return "\n".join(texts) or ""
+        if knowledge_store.resolve(filename) is None:
+            logger.warning(f"Файл базы знаний не найден: {filename}")
+            continue
+        filenames.append(filename)
+    return snippet_cache.snippet(retrieve_sections(user_input, filenames))
 
 # --- Функции для взаимодействия с GPT ---
 
-async def summarize_history(history: list) -> str:
-    """
-    [TOKEN OPTIMIZATION] Создает краткую сводку диалога, чтобы не отправлять всю историю.
-    Использует более дешевую и быструю модель.
-    """
-    if not history:
-        return ""
-    
-    dialogue = "\n".join([f"{msg['role']}: {msg['content']}" for msg in history])
-    prompt = (
-        "Создай очень краткую и сжатую сводку следующего диалога. "
-        "Сохрани ключевые факты и детали, но убери все лишнее. "
-        "Сводка должна помочь ассистенту понять контекст для ответа на следующий вопрос.\n\n"
-        f"Диалог для анализа:\n{dialogue}"
-    )
-    try:
-        # Для этой служебной задачи оставляем быструю и дешевую модель
-        response = await client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.0,
-            max_tokens=250
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        logger.error(f"Ошибка при создании сводки диалога: {e}")
-        return ""
-
-async def ask_gpt(messages: list) -> str:
-    """
-    [MODIFIED] Отправляет запрос к GPT, используя модели из оригинального кода.
-    """
-    try:
-        response = await client.chat.completions.create(model="gpt-4.5-preview", messages=messages)
-        return response.choices[0].message.content.strip()
-    except openai.APIError as e:
-        logger.warning(f"GPT-4.5-preview недоступен, fallback к GPT-3.5: {e}")
-        try:
-            response = await client.chat.completions.create(model="gpt-3.5-turbo-1106", messages=messages)
-            return response.choices[0].message.content.strip()
-        except openai.APIError as e2:
-            logger.error(f"GPT-3.5 тоже не сработал: {e2}")
-            return None
-    except Exception as e:
-        logger.error(f"Неизвестная ошибка при запросе к OpenAI API: {e}")
-        return None
-
 # --- Основная логика обработки запросов ---
 async def process_user_request(update: Update, context: ContextTypes.DEFAULT_TYPE, user_input: str):
     """
     [REFACTORED] Общая функция для обработки текстовых и голосовых запросов.
     """
-    if 'history' not in context.user_data:
-        context.user_data['history'] = []
+    user_id = update.effective_user.id
+    conversation_store.append(user_id, "user", user_input)
 
-    context.user_data['history'].append({"role": "user", "content": user_input})
-    
-    history_summary = await summarize_history(context.user_data['history'][:-1])
+    # Сводка обновляется в фоне после ответа; берём ту, что уже готова, и не ждём
+    history_summary = conversation_store.summary(user_id)
 
     full_system_prompt = SYSTEM_PROMPT
     kb_snippet = load_relevant_knowledge(user_input)
@@ -145,19 +104,21 @@ async def process_user_request(update: Update, context: ContextTypes.DEFAULT_TYP
     
     messages.append({"role": "user", "content": user_input})
 
-    assistant_reply = await ask_gpt(messages)
+    assistant_reply = await model_router.complete(messages, classify_query(user_input, has_knowledge=bool(kb_snippet)))
 
     if assistant_reply:
-        context.user_data['history'].append({"role": "assistant", "content": assistant_reply})
-        context.user_data['history'] = context.user_data['history'][-MAX_TURNS_FOR_SUMMARY:]
+        assistant_reply = assistant_reply.strip()
+        conversation_store.append(user_id, "assistant", assistant_reply)
         await update.message.reply_text(assistant_reply)
+        summarizer.schedule(user_id)
     else:
         await update.message.reply_text("❌ Ошибка при запросе к GPT. Попробуй позже.")
 
 # --- Обработчики команд и сообщений Telegram ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает команду /start."""
-    context.user_data.clear() # Очищаем историю при рестарте
+    context.user_data.clear()
+    conversation_store.clear(update.effective_user.id)  # Очищаем историю и сводку при рестарте
     await update.message.reply_text("Здорова, я — Макс. Диспетчер, друг и напарник. Пиши, говори или отправляй координаты — разберёмся!")
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -172,16 +133,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает голосовые сообщения пользователя."""
-    audio_path = None
     try:
-        file = await update.message.voice.get_file()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".oga") as f:
-            await file.download_to_drive(f.name)
-            audio_path = f.name
-
-        with open(audio_path, "rb") as audio_file:
-            transcript = await client.audio.transcriptions.create(model="whisper-1", file=audio_file)
-            user_text = transcript.text.strip()
+        # Файл скачивается в память (крупный — во временный файл, который удаляется при закрытии)
+        with await download_voice(update.message.voice) as audio:
+            user_text = await transcriber.transcribe(audio)
         
         if not user_text:
             await update.message.reply_text("🎧 Не смог разобрать голос. Попробуй снова.")
@@ -196,9 +151,6 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.error(f"Неизвестная ошибка при обработке голоса: {e}", exc_info=True)
         await update.message.reply_text("⚠️ Не смог обработать голос. Внутренняя ошибка.")
-    finally:
-        if audio_path and os.path.exists(audio_path):
-            os.remove(audio_path)
 
 # --- Обработчики геолокации ---
 async def handle_location(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -311,12 +263,27 @@ async def search_with_overpass(query, context: ContextTypes.DEFAULT_TYPE, lat: f
         logger.error(f"Ошибка поиска Overpass API: {e}", exc_info=True)
         await query.message.reply_text("❌ Ошибка при поиске через OpenStreetMap.")
 
+# --- Запуск и остановка ---
+async def on_startup(app):
+    await conversation_store.start()
+    app.bot_data["transcriber_start"] = asyncio.create_task(transcriber.start())
+
+async def on_shutdown(app):
+    task = app.bot_data.pop("transcriber_start", None)
+    if task is not None:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    await transcriber.close()
+    await summarizer.close()
+    await conversation_store.close()
+
 # --- Запуск бота ---
 if __name__ == '__main__':
-    if not all([TELEGRAM_TOKEN, OPENAI_API_KEY, GOOGLE_MAPS_API_KEY):
+    if not all([TELEGRAM_TOKEN, OPENAI_API_KEY, GOOGLE_MAPS_API_KEY]):
         logger.critical("Не установлены все необходимые переменные окружения!")
     else:
-        app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+        app = ApplicationBuilder().token(TELEGRAM_TOKEN).post_init(on_startup).post_shutdown(on_shutdown).build()
         
         app.add_handler(CommandHandler("start", start))
         app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
@@ -0,0 +1,178 @@
+"""
+Пакетный расчёт графиков по РТО для всего автопарка (что-если для диспетчеров).
+
+Вход — JSONL, по поездке на строку:
+    {"id": "MAX-017", "start_time": "2025-03-03T06:00", "distance_km": 1450, "crew": false,
+     "state": {"reduced_rests_left": 1}, "country": "DE"}
+Вместо distance_km можно передать segments (как в plan_schedule), вместо start_time — список
+departures: поездка посчитается для каждого времени выезда. Выход — JSONL, строка на расчёт,
+в порядке входа. Строка, которую не удалось разобрать, даёт на выходе {"line": номер, "error": ...},
+поэтому выход не сдвигается относительно входа.
+
+Запуск из корня репозитория:
+    python -m logic.batch trips.jsonl -o schedules.jsonl --workers 4
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from logic.constraints import RULESET_DIR, load_constraints
+from logic.route_calc import DEFAULT_RULESET, load_rules, plan_schedule
+
+BATCH_CHUNK_SIZE = 64  # Поездок на одну задачу пула: расчёт занимает сотни микросекунд, дороже пересылка
+MAX_PENDING_CHUNKS = 4  # Задач в очереди на процесс; вход дочитывается по мере готовности результатов
+
+PLAN_OPTIONS = ("segments", "distance_km", "speed_kmh", "crew", "state", "country")
+
+# --- Состояние процесса пула ---
+_worker_rules = None
+_worker_constraints = None
+
+
+def _init_worker(ruleset: str = DEFAULT_RULESET, ruleset_dir: str = RULESET_DIR):
+    """Загружает наборы правил один раз на процесс пула."""
+    global _worker_rules, _worker_constraints
+    _worker_rules = load_rules(ruleset)
+    _worker_constraints = load_constraints(ruleset_dir)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="minutes")
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def expand_trips(trips):
+    """Поездка со списком departures → по расчёту на каждое время выезда."""
+    for trip in trips:
+        departures = trip.get("departures")
+        if departures is None or "error" in trip:
+            yield trip
+            continue
+        if not isinstance(departures, list):
+            yield {"id": trip.get("id"), "start_time": None, "error": "departures должен быть списком времён выезда"}
+            continue
+        for departure in departures:
+            yield dict(trip, start_time=departure, departures=None)
+
+
+def plan_trip(trip: dict, events: bool = True) -> dict:
+    """Один расчёт; ошибка во входных данных возвращается в поле error, а не роняет весь пакет."""
+    if "error" in trip:
+        return trip  # Строка входа, которую не удалось разобрать
+    if _worker_rules is None:
+        _init_worker()
+    result = {"id": trip.get("id"), "start_time": trip.get("start_time")}
+    try:
+        options = {key: trip[key] for key in PLAN_OPTIONS if trip.get(key) is not None}
+        schedule = plan_schedule(
+            datetime.fromisoformat(trip["start_time"]), rules=_worker_rules, constraints=_worker_constraints, **options
+        )
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+    if not events:
+        schedule.pop("events")
+    schedule.pop("departure")
+    result.update(schedule)
+    return result
+
+
+def _plan_chunk(trips: list, events: bool) -> list:
+    return [plan_trip(trip, events) for trip in trips]
+
+
+def _chunks(trips, size: int):
+    chunk = []
+    for trip in trips:
+        chunk.append(trip)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def plan_batch(trips, workers: int = None, events: bool = True, chunk_size: int = BATCH_CHUNK_SIZE):
+    """
+    Считает графики для итератора поездок в пуле процессов и отдаёт результаты по мере готовности,
+    сохраняя порядок входа. В работе не больше MAX_PENDING_CHUNKS пачек на процесс, поэтому вход
+    любого размера читается потоково. workers=1 — расчёт в текущем процессе без пула.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunks(expand_trips(trips), chunk_size)
+    if workers == 1:
+        _init_worker()
+        for chunk in chunks:
+            yield from _plan_chunk(chunk, events)
+        return
+
+    # spawn, а не fork: так же, как пул распознавания голоса
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    ) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_plan_chunk, chunk, events))
+            if len(pending) >= workers * MAX_PENDING_CHUNKS:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def read_jsonl(stream):
+    """Поездки из JSONL; вместо неразобранной строки — {"line": номер, "error": ...}."""
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            trip = json.loads(line)
+        except json.JSONDecodeError as e:
+            logging.error(f"[Пакетный расчёт] Строка {number}: некорректный JSON: {e}")
+            yield {"line": number, "error": f"некорректный JSON: {e}"}
+            continue
+        if not isinstance(trip, dict):
+            logging.error(f"[Пакетный расчёт] Строка {number}: ожидался объект, а не {type(trip).__name__}")
+            yield {"line": number, "error": f"ожидался объект JSON, а не {type(trip).__name__}"}
+            continue
+        yield trip
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL с поездками ('-' — stdin)")
+    parser.add_argument("-o", "--output", default="-", help="куда писать JSONL с графиками ('-' — stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="процессов в пуле (по умолчанию — по числу ядер)")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_CHUNK_SIZE)
+    parser.add_argument("--no-events", action="store_true", help="без списка событий, только итоги")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    target = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    started, count, errors = time.perf_counter(), 0, 0
+    try:
+        for result in plan_batch(read_jsonl(source), args.workers, not args.no_events, args.chunk_size):
+            target.write(json.dumps(result, ensure_ascii=False, default=_json_default) + "\n")
+            count += 1
+            errors += "error" in result
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+    elapsed = time.perf_counter() - started
+    print(f"Графиков: {count}, ошибок: {errors}, за {elapsed:.2f} с", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,268 @@
-# Здесь будут ограничения (время окончания смены, страна и т.д.)
+# Ограничения по странам: запреты движения грузовиков и рекомендуемое время окончания смены
+import glob
+import json
+import os
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+RULESET_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rulesets")
+DEFAULT_WEIGHT_T = 40  # Стандартный автопоезд: под запреты попадает по любому порогу массы
+DAY = 24 * 60
+DAYS = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+SEARCH_DAYS = 14  # Насколько далеко вперёд ищем следующую смену запрета/разрешения
+DAY_CACHE_MAX_ENTRIES = 1024  # Скомпилированных по дате таблиц на страну (сезон, праздники); ~3 года
+
+
+def _minutes(value: str) -> int:
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _merge(intervals) -> tuple:
+    """Сортирует и склеивает интервалы [начало, конец) в минутах суток → (starts, ends) для bisect."""
+    starts, ends = [], []
+    for start, end in sorted(intervals):
+        if ends and start <= ends[-1]:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+def _easter(year: int) -> date:
+    """Католическая (григорианская) Пасха."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _orthodox_easter(year: int) -> date:
+    """Православная Пасха (юлианский расчёт, переведённый в григорианский календарь)."""
+    a, b, c = year % 4, year % 7, year % 19
+    d = (19 * c + 15) % 30
+    e = (2 * a + 4 * b - d + 34) % 7
+    month, day = divmod(d + e + 114, 31)
+    return date(year, month, day + 1) + timedelta(days=year // 100 - year // 400 - 2)
+
+
+def _in_season(day: date, season) -> bool:
+    if not season:
+        return True
+    return season[0] <= f"{day:%m-%d}" <= season[1]
+
+
+class CountryConstraints:
+    """
+    Запреты движения одной страны, скомпилированные в таблицы интервалов по дням.
+
+    Для каждого дня недели (и для праздника/кануна праздника) хранятся отсортированные списки
+    начал и концов запретов в минутах суток; проверка момента — один bisect. Интервалы через
+    полночь разрезаются по суткам, сезонные запреты хранятся отдельно и проверяются по дате.
+    """
+
+    def __init__(self, code: str, name: str, weekly: list, holiday: dict = None, holidays: list = (),
+                 latest_stop: str = None, explain: str = None, local_bans: list = ()):
+        self.code = code
+        self.name = name or code
+        self.latest_stop = _minutes(latest_stop) if latest_stop else None
+        self.latest_stop_text = latest_stop
+        self.explain = explain
+        self.local_bans = list(local_bans)  # Запреты на отдельных дорогах: в таблицы не входят, только для справки
+        self._holiday = holiday
+        self._holiday_rules = list(holidays)
+        self._holiday_years = {}  # {год: множество дат праздников}
+        self._dated = {}          # {дата: (starts, ends)} — дни, таблица которых зависит от даты
+
+        # {день недели: [(start, end, season)]}
+        self._rules = {weekday: [] for weekday in range(7)}
+        for start_day, start, end_day, end, season in weekly:
+            for day in range(start_day, end_day + 1):
+                low = start if day == start_day else 0
+                high = end if day == end_day else DAY
+                if high > low:
+                    self._rules[day % 7].append((low, high, season))
+        self._weekdays = [self._compile(weekday, None) for weekday in range(7)]
+        self._seasonal = any(season for rules in self._rules.values() for _, _, season in rules)
+
+    def _compile(self, weekday: int, day: date) -> tuple:
+        """Таблица запретов на день недели; с датой — с учётом сезона, праздника и кануна праздника."""
+        intervals = [
+            (start, end) for start, end, season in self._rules[weekday]
+            if (day is None and not season) or (day is not None and _in_season(day, season))
+        ]
+        if day is not None and self._holiday:
+            if self.is_holiday(day) and _in_season(day, self._holiday.get("season")):
+                intervals.append((_minutes(self._holiday["from"]), _minutes(self._holiday["to"])))
+            eve_from = self._holiday.get("eve_from")
+            if eve_from and self.is_holiday(day + timedelta(days=1)):
+                intervals.append((_minutes(eve_from), DAY))
+        return _merge(intervals)
+
+    def is_holiday(self, day: date) -> bool:
+        holidays = self._holiday_years.get(day.year)
+        if holidays is None:
+            holidays = set()
+            for rule in self._holiday_rules:
+                if rule.startswith(("easter", "orthodox_easter")):
+                    base, _, offset = rule.replace("-", "+-").partition("+")
+                    easter = _orthodox_easter(day.year) if base == "orthodox_easter" else _easter(day.year)
+                    holidays.add(easter + timedelta(days=int(offset or 0)))
+                else:
+                    month, day_of_month = rule.split("-")
+                    holidays.add(date(day.year, int(month), int(day_of_month)))
+            self._holiday_years[day.year] = holidays
+        return day in holidays
+
+    def _table(self, day: date) -> tuple:
+        table = self._dated.get(day)
+        if table is not None:
+            return table
+        if self._seasonal or (self._holiday and (self.is_holiday(day) or self.is_holiday(day + timedelta(days=1)))):
+            table = self._compile(day.weekday(), day)
+            if len(self._dated) >= DAY_CACHE_MAX_ENTRIES:
+                self._dated.clear()  # Даты из плана идут подряд: проще начать заново, чем вести LRU
+            self._dated[day] = table
+            return table
+        return self._weekdays[day.weekday()]
+
+    def state(self, moment: datetime) -> tuple:
+        """
+        (запрещено ли движение в момент moment, момент следующей смены состояния).
+        Второе значение — None, если в ближайшие SEARCH_DAYS дней ничего не меняется.
+        """
+        day = moment.date()
+        minute = moment.hour * 60 + moment.minute + (moment.second + moment.microsecond / 1e6) / 60
+        starts, ends = self._table(day)
+        index = bisect_right(starts, minute) - 1
+        banned = index >= 0 and minute < ends[index]
+        if banned:
+            if ends[index] < DAY:
+                return True, self._at(day, ends[index])
+            # Запрет до полуночи: ищем его конец в следующих сутках
+            for offset in range(1, SEARCH_DAYS):
+                next_day = day + timedelta(days=offset)
+                starts, ends = self._table(next_day)
+                if not starts or starts[0] > 0:
+                    return True, self._at(next_day, 0)
+                if ends[0] < DAY:
+                    return True, self._at(next_day, ends[0])
+            return True, None
+        if index + 1 < len(starts):
+            return False, self._at(day, starts[index + 1])
+        for offset in range(1, SEARCH_DAYS):
+            next_day = day + timedelta(days=offset)
+            starts, _ = self._table(next_day)
+            if starts:
+                return False, self._at(next_day, starts[0])
+        return False, None
+
+    @staticmethod
+    def _at(day: date, minute: int) -> datetime:
+        return datetime(day.year, day.month, day.day) + timedelta(minutes=minute)
+
+    def is_driving_allowed(self, moment: datetime) -> bool:
+        return not self.state(moment)[0]
+
+    def next_allowed(self, moment: datetime) -> datetime:
+        """Ближайший момент, когда движение разрешено (moment, если разрешено уже сейчас)."""
+        banned, change = self.state(moment)
+        return change if banned else moment
+
+    def stop_too_late(self, moment: datetime) -> bool:
+        """Остановка на отдых позже рекомендуемого времени (например, в Германии после 16:30)."""
+        return self.latest_stop is not None and moment.hour * 60 + moment.minute > self.latest_stop
+
+
+def _parse_weekly(interval: dict) -> tuple:
+    start_day, start = interval["from"].split()
+    end_day, end = interval["to"].split()
+    start_day, end_day = DAYS[start_day], DAYS[end_day]
+    if end_day < start_day or (end_day == start_day and _minutes(end) <= _minutes(start)):
+        end_day += 7
+    return start_day, _minutes(start), end_day, _minutes(end), interval.get("season")
+
+
+def _parse_night(interval: dict) -> list:
+    """Ежедневный ночной запрет 22:00–05:00 → семь недельных интервалов."""
+    start, end = _minutes(interval["from"]), _minutes(interval["to"])
+    return [(day, start, day + (end <= start), end, interval.get("season")) for day in range(7)]
+
+
+def _read_rulesets(directory: str) -> dict:
+    """Все rulesets/*.json с ограничениями по странам → {код страны: объединённое описание}."""
+    countries = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if "countries" in data:
+            entries = data["countries"].items()
+        elif "country" in data:
+            entries = [(data["country"], data)]
+        else:
+            continue  # Нормы РТО и прочие наборы без привязки к стране
+        for code, entry in entries:
+            merged = countries.setdefault(code.upper(), {})
+            for key, value in entry.items():
+                if isinstance(value, list):
+                    merged[key] = merged.get(key, []) + value
+                else:
+                    merged.setdefault(key, value)
+    return countries
+
+
+@lru_cache(maxsize=None)
+def load_constraints(directory: str = RULESET_DIR, weight_t: float = DEFAULT_WEIGHT_T,
+                     local: bool = False) -> dict:
+    """
+    Читает наборы правил один раз и компилирует их по странам → {код страны: CountryConstraints}.
+    local=True добавляет запреты, действующие только на отдельных дорогах (по умолчанию — только общие).
+    """
+    constraints = {}
+    for code, entry in _read_rulesets(directory).items():
+        applies = weight_t > entry.get("min_weight_t", 0)
+        weekly = [_parse_weekly(interval) for interval in entry.get("weekly", [])] if applies else []
+        night = entry.get("night", [])
+        for interval in night:
+            if applies and (local or not interval.get("roads")):
+                weekly += _parse_night(interval)
+        constraints[code] = CountryConstraints(
+            code, entry.get("name"), weekly,
+            holiday=entry.get("holiday") if applies else None,
+            holidays=entry.get("holidays", []),
+            latest_stop=entry.get("max_day_end_time"),
+            explain=entry.get("explain"),
+            local_bans=[interval for interval in night if interval.get("roads")],
+        )
+    return constraints
+
+
+def get_constraints(country: str, **options) -> CountryConstraints:
+    """Ограничения страны по коду ISO (DE) или названию (Германия); None, если страна неизвестна."""
+    constraints = load_constraints(**options)
+    key = country.strip().upper()
+    if key in constraints:
+        return constraints[key]
+    for entry in constraints.values():
+        if entry.name.upper() == key:
+            return entry
+    return None
+
+
+def is_driving_allowed(country: str, moment: datetime, **options) -> bool:
+    """Разрешено ли движение грузовика в стране в момент moment (неизвестная страна — без запретов)."""
+    constraints = get_constraints(country, **options)
+    return constraints is None or constraints.is_driving_allowed(moment)
+
+
+def next_allowed(country: str, moment: datetime, **options) -> datetime:
+    constraints = get_constraints(country, **options)
+    return moment if constraints is None else constraints.next_allowed(moment)
@@ -0,0 +1,339 @@
+# Паромы и «катящееся шоссе»: маршруты из knowledge/ferry_routes в виде индексированных записей
+import re
+import unicodedata
+from bisect import bisect_right
+
+from knowledge_base import knowledge_store
+
+FERRY_FILE = "ferry_routes"
+
+# Страны в тексте базы знаний → ISO-код
+COUNTRY_CODES = {
+    "австрия": "AT", "бельгия": "BE", "великобритания": "GB", "uk": "GB", "германия": "DE", "дания": "DK",
+    "ирландия": "IE", "италия": "IT", "латвия": "LV", "литва": "LT", "люксембург": "LU", "нидерланды": "NL",
+    "норвегия": "NO", "польша": "PL", "финляндия": "FI", "франция": "FR", "швейцария": "CH", "швеция": "SE",
+    "эстония": "EE",
+}
+
+ROUTE_RE = re.compile(r"^#{3,4}\s*\d+\.\s*(.+?)\s*$")
+RAIL_ROUTE_RE = re.compile(r"\*\*Маршрут\*\*:\s*(.+)")
+PLACE_RE = re.compile(r"^(.+?)\s*\(([^)]+)\)$")
+FIELD_RE = re.compile(r"^\s*-\s*(?:\*\*)?(Операторы?|Продолжительность|Питание|Каюта|Удобства|Для водителя)(?:\*\*)?:\s*(.*)$")
+HOURS_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*час")
+MINUTES_RE = re.compile(r"(\d+)\s*мин")
+NUMBER_RE = re.compile(r"(\d+(?:[.,]\d+)?)")
+
+
+def normalize_place(name: str) -> str:
+    """'Świnoujście' и 'swinoujscie' → один ключ: без регистра и диакритики."""
+    decomposed = unicodedata.normalize("NFKD", name.casefold().replace("ø", "o").replace("ł", "l"))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).strip()
+
+
+def port_key(name: str) -> str:
+    """Ключ порта в индексе: 'Гданьска' и 'Gdańsk' → 'gdansk'."""
+    key = normalize_place(name)
+    alias = PORT_ALIAS_RE.fullmatch(key)
+    return PORT_ALIASES[alias.group(1)] if alias else key
+
+
+# Русские названия портов («из Таллина», «в Хельсинки») → ключ порта в индексе.
+# Ключи — основы в виде normalize_place (й → и, ё → е), к ним добавляются падежные окончания PORT_ENDINGS
+PORT_ALIASES = {
+    "таллин": "tallinn", "таллинн": "tallinn", "хельсинк": "helsinki", "турку": "turku", "наантали": "naantali",
+    "ханко": "hanko", "вааса": "vaasa", "палдиск": "paldiski", "гданьск": "gdansk", "гдын": "gdynia",
+    "свиноуисьц": "swinoujscie", "свиноуисц": "swinoujscie", "устк": "ustka", "росток": "rostock",
+    "травемюнде": "travemunde", "кил": "kiel", "путтгарден": "puttgarden", "треллеборг": "trelleborg",
+    "истад": "ystad", "мальме": "malmo", "карлскрун": "karlskrona", "нюнесхамн": "nynashamn",
+    "капельшер": "kapellskar", "стокгольм": "stockholm", "умео": "umea", "гетеборг": "goteborg",
+    "хальмстад": "halmstad", "хельсингборг": "helsingborg", "хельсингер": "helsingor", "редбю": "rodby",
+    "гедсер": "gedser", "копенгаген": "kobenhavn", "фредериксхавн": "frederikshavn", "хиртсхальс": "hirtshals",
+    "гренаа": "grenaa", "осло": "oslo", "ларвик": "larvik", "кристиансанд": "kristiansand",
+    "ставангер": "stavanger", "клаипед": "klaipeda", "вентспилс": "ventspils", "роттердам": "rotterdam",
+    "зебрюгге": "zeebrugge", "дувр": "dover", "кале": "calais", "дюнкерк": "dunkerque", "дублин": "dublin",
+    "холихед": "holyhead", "феликстоу": "felixstowe",
+}
+PORT_ENDINGS = r"(?:ь|а|я|у|ю|е|и|ы|ом|ем|ой|ей)?"
+PORT_ALIAS_RE = re.compile(rf"({'|'.join(sorted(PORT_ALIASES, key=len, reverse=True))}){PORT_ENDINGS}")
+
+
+def parse_duration(text: str) -> tuple:
+    """'5 часов 45 минут - 6 часов' → (345, 360) в минутах; (None, None), если длительность не указана."""
+    text = re.sub(r"\(.*?\)", "", text)
+    values, pending = [], []
+    for part in re.split(r"\s*[-–]\s*", text):
+        hours, minutes = HOURS_RE.search(part), MINUTES_RE.search(part)
+        if hours or minutes:
+            unit = 60 if hours else 1
+            value = (float(hours.group(1).replace(",", ".")) * 60 if hours else 0) + (int(minutes.group(1)) if minutes else 0)
+            values += [float(number) * unit for number in pending] + [value]
+            pending = []
+        else:
+            pending += [n.replace(",", ".") for n in NUMBER_RE.findall(part)]
+    if not values:
+        return None, None
+    return round(min(values)), round(max(values))
+
+
+def _place(raw: str) -> list:
+    """'Wörgl (Австрия)' или 'Вёргль (Wörgl, Австрия)' → [(порт, код страны)]."""
+    match = PLACE_RE.match(raw.strip())
+    if not match:
+        return [(raw.strip(), None)]
+    port, inside = match.groups()
+    parts = [p.strip() for p in inside.split(",")]
+    if len(parts) > 1 and re.search(r"[а-яё]", port, re.IGNORECASE):
+        port = parts[0]  # «Вёргль (Wörgl, Австрия)»: латинское название в скобках
+    country = parts[-1].split("/")[0].strip().casefold()
+    return [(port.strip(), COUNTRY_CODES.get(country))]
+
+
+def _ends(title: str) -> tuple:
+    """'A (X) - B (Y)', в том числе с альтернативами через '/', → ([откуда], [куда])."""
+    sides = re.split(r"\s+[-–]\s+", title, maxsplit=1)
+    if len(sides) != 2:
+        return [], []
+    return tuple([place for alt in side.split(" / ") for place in _place(alt)] for side in sides)
+
+
+def _cabin(value: str, block: str, kind: str) -> bool:
+    """True — есть спальное место (время на борту засчитывается как отдых), False — нет, None — не ясно."""
+    value, block = value.casefold(), block.casefold()
+    if "с каютой" in block or "кушетк" in block or "засчитывается как период отдыха" in block:
+        return True  # Хотя бы у одного оператора или сервиса
+    if value.startswith(("нет", "без")):
+        return False
+    if value.startswith("есть") or "каюта" in value or "кровать" in value:
+        return True
+    if kind == "ferry" and value.startswith("на "):
+        return False  # «На 20 минут» — выспаться не получится
+    return None
+
+
+def _record(kind: str, title: str, lines: list) -> list:
+    fields = {}
+    for line in lines:
+        match = FIELD_RE.match(line)
+        if match and match.group(1) not in fields:
+            fields[match.group(1)] = match.group(2).strip()
+        route = RAIL_ROUTE_RE.search(line)
+        if route:
+            title = route.group(1)
+        if "Приблизительная продолжительность" in line and "Продолжительность" not in fields:
+            fields["Продолжительность"] = line.split(":", 1)[1]
+    origins, destinations = _ends(title)
+    block = "\n".join(lines)
+    low, high = parse_duration(fields.get("Продолжительность", ""))
+    operators = fields.get("Операторы") or fields.get("Оператор") or ""
+    meals = (fields.get("Питание") or "").split(". ")[0]
+    records = []
+    for origin in origins:
+        for destination in destinations:
+            records.append({
+                "kind": kind,
+                "from": origin[0], "from_country": origin[1],
+                "to": destination[0], "to_country": destination[1],
+                "operators": [o.strip() for o in re.split(r",|\(", operators.replace("**", "")) if o.strip() and ")" not in o],
+                "duration_min": low, "duration_max": high,
+                "cabin": _cabin(fields.get("Каюта", ""), block, kind),
+                "meals": meals or None,
+                "amenities": fields.get("Удобства") or fields.get("Для водителя") or None,
+            })
+    return records
+
+
+def parse_routes(text: str) -> list:
+    """Разбирает markdown базы знаний на записи маршрутов (паромы и железная дорога)."""
+    records, kind, title, lines = [], "ferry", None, []
+
+    def flush():
+        if title:
+            records.extend(_record(kind, title, lines))
+
+    for line in text.splitlines():
+        if line.startswith("## "):
+            flush()
+            title, lines = None, []
+            kind = "rail" if "Железнодорож" in line else "ferry"
+            continue
+        match = ROUTE_RE.match(line)
+        if match:
+            flush()
+            title, lines = match.group(1), []
+        elif title:
+            lines.append(line)
+    flush()
+    return records
+
+
+class FerryIndex:
+    """
+    Маршруты с индексами по порту, стране и длительности.
+
+    Маршруты двусторонние: запрос «из PL в SE» находит и запись «Ystad — Świnoujście» и
+    возвращает её развёрнутой. Индекс по длительности — отсортированный список для bisect.
+    """
+
+    def __init__(self, records: list):
+        self.records = records
+        self.by_port = {}     # {нормализованный порт: [номера записей]}
+        self.by_country = {}  # {код страны: [номера записей]}
+        for index, record in enumerate(records):
+            for port, country in ((record["from"], record["from_country"]), (record["to"], record["to_country"])):
+                self.by_port.setdefault(normalize_place(port), []).append(index)
+                if country:
+                    self.by_country.setdefault(country, []).append(index)
+        ordered = sorted(
+            (record["duration_max"], index) for index, record in enumerate(records) if record["duration_max"] is not None
+        )
+        self._durations = [duration for duration, _ in ordered]
+        self._by_duration = [index for _, index in ordered]
+
+    def _matching(self, place: str) -> set:
+        key = place.strip()
+        if key.upper() in self.by_country:
+            return set(self.by_country[key.upper()])
+        code = COUNTRY_CODES.get(key.casefold())
+        if code:
+            return set(self.by_country.get(code, []))
+        return set(self.by_port.get(port_key(key), []))
+
+    @staticmethod
+    def _side(record: dict, place: str, end: str) -> bool:
+        code = COUNTRY_CODES.get(place.strip().casefold(), place.strip().upper())
+        return code == record[end + "_country"] or port_key(place) == normalize_place(record[end])
+
+    def find(self, origin: str = None, destination: str = None, cabin: bool = None, max_hours: float = None,
+             kind: str = None) -> list:
+        """
+        Маршруты по стране (код или название) либо порту отправления и назначения, с каютой или без,
+        не длиннее max_hours. Результат — копии записей в запрошенном направлении, от коротких к длинным.
+        """
+        candidates = set(range(len(self.records)))
+        if max_hours is not None:
+            candidates &= set(self._by_duration[:bisect_right(self._durations, max_hours * 60)])
+        for place in (origin, destination):
+            if place:
+                candidates &= self._matching(place)
+
+        results = []
+        for index in candidates:
+            record = self.records[index]
+            if (cabin is not None and record["cabin"] is not cabin) or (kind and record["kind"] != kind):
+                continue
+            forward = (not origin or self._side(record, origin, "from")) and (
+                not destination or self._side(record, destination, "to"))
+            backward = (not origin or self._side(record, origin, "to")) and (
+                not destination or self._side(record, destination, "from"))
+            if forward:
+                results.append(dict(record))
+            elif backward:
+                results.append(dict(record, **{
+                    "from": record["to"], "from_country": record["to_country"],
+                    "to": record["from"], "to_country": record["from_country"],
+                }))
+        results.sort(key=lambda r: (r["duration_max"] is None, r["duration_max"] or 0, r["from"]))
+        return results
+
+
+_index = None
+_index_version = None
+
+
+def ferry_index() -> FerryIndex:
+    """Индекс по текущей версии knowledge/ferry_routes; перестраивается, только если файл изменился."""
+    global _index, _index_version
+    version = knowledge_store.version(FERRY_FILE)
+    if _index is None or version != _index_version:
+        _index = FerryIndex(parse_routes(knowledge_store.get(FERRY_FILE)))
+        _index_version = version
+    return _index
+
+
+def find_routes(origin: str = None, destination: str = None, **filters) -> list:
+    return ferry_index().find(origin, destination, **filters)
+
+
+# Основы названий стран в запросе водителя («из Польши», «в Швецию») → ISO-код
+COUNTRY_STEMS = {
+    "польш": "PL", "швец": "SE", "финлянд": "FI", "эстони": "EE", "латви": "LV", "литв": "LT", "германи": "DE",
+    "дани": "DK", "норвеги": "NO", "нидерланд": "NL", "голланд": "NL", "британи": "GB", "англи": "GB",
+    "ирланди": "IE", "бельги": "BE", "франци": "FR", "итали": "IT", "австри": "AT", "люксембург": "LU",
+    "швейцари": "CH",
+}
+FERRY_QUERY_RE = re.compile(r"паром|переправ|поезд(?!к)|\bж/?д\b|rola|катящ", re.IGNORECASE)  # «поездка» — не поезд
+RAIL_QUERY_RE = re.compile(r"поезд(?!к)|\bж/?д\b|rola|катящ", re.IGNORECASE)
+MAX_HOURS_RE = re.compile(r"(?:до|меньше|не больше|не дольше|быстрее|короче)\s+(\d+(?:[.,]\d+)?)\s*ч", re.IGNORECASE)
+ORIGIN_PREPOSITIONS = {"из", "с", "со", "от"}
+
+
+def parse_ferry_query(text: str) -> dict:
+    """
+    «паром из Польши в Швецию с каютой до 9 часов» → аргументы для find_routes:
+    {"origin": "PL", "destination": "SE", "cabin": True, "max_hours": 9.0}. None, если это не вопрос о пароме
+    или в нём не узнана ни страна, ни порт.
+    """
+    if not FERRY_QUERY_RE.search(text):
+        return None
+    normalized = normalize_place(text)
+    ports = sorted(ferry_index().by_port, key=len, reverse=True)
+    places = "|".join(
+        [re.escape(stem) + r"\w*" for stem in COUNTRY_STEMS]
+        + [PORT_ALIAS_RE.pattern]
+        + [re.escape(port) for port in ports]
+    )
+    query = {}
+    for match in re.finditer(rf"(?:\b(\w+)\s+)?\b({places})\b", normalized):
+        preposition, place = match.group(1), match.group(2)
+        code = next((code for stem, code in COUNTRY_STEMS.items() if place.startswith(stem)), None)
+        value = code or port_key(place)
+        if preposition in ORIGIN_PREPOSITIONS and "origin" not in query:
+            query["origin"] = value
+        elif preposition not in ORIGIN_PREPOSITIONS and "destination" not in query and (
+                preposition in {"в", "во", "на", "до"} or "origin" in query):
+            query["destination"] = value
+        elif "origin" not in query:
+            query["origin"] = value
+    if not query:
+        return None  # Ни страны, ни порта: весь список маршрутов не поможет, пусть отвечает база знаний
+
+    if re.search(r"без\s+кают", normalized):
+        query["cabin"] = False
+    elif re.search(r"кают|спальн", normalized):
+        query["cabin"] = True
+    max_hours = MAX_HOURS_RE.search(text)
+    if max_hours:
+        query["max_hours"] = float(max_hours.group(1).replace(",", "."))
+    if RAIL_QUERY_RE.search(text):
+        query["kind"] = "rail"
+    elif "паром" in normalized:
+        query["kind"] = "ferry"
+    return query
+
+
+def format_duration(record: dict) -> str:
+    low, high = record["duration_min"], record["duration_max"]
+    if low is None:
+        return "длительность не указана"
+
+    def hours(minutes):
+        if minutes < 60:
+            return f"{minutes} мин"
+        return f"{minutes // 60} ч {minutes % 60:02d} мин" if minutes % 60 else f"{minutes // 60} ч"
+    return hours(low) if low == high else f"{hours(low)} – {hours(high)}"
+
+
+def format_routes(records: list) -> str:
+    """Список маршрутов одной строкой на маршрут — для ответа водителю или для GPT."""
+    lines = []
+    for record in records:
+        icon = "🚂" if record["kind"] == "rail" else "🚢"
+        cabin = {True: "каюта/спальное место есть", False: "без каюты", None: "про каюту неизвестно"}[record["cabin"]]
+        line = f"{icon} {record['from']} ({record['from_country'] or '?'}) → {record['to']} ({record['to_country'] or '?'}): "
+        line += f"{format_duration(record)}, {cabin}"
+        if record["meals"]:
+            line += f", питание: {record['meals']}"
+        if record["operators"]:
+            line += f", оператор: {', '.join(record['operators'])}"
+        lines.append(line)
+    return "\n".join(lines)
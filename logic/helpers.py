@@ -1 +1,50 @@
 # Вспомогательные парсеры, фильтры и т.д.
+import re
+from datetime import datetime, timedelta
+
+SCHEDULE_TRIGGER_RE = re.compile(r"рас+чит|посчитай|график\s+(?:езды|движения|отдыха)|когда\s+приеду", re.IGNORECASE)
+DISTANCE_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*км(?!\s*/\s*ч)", re.IGNORECASE)
+SPEED_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*км\s*/\s*ч", re.IGNORECASE)
+START_RE = re.compile(r"\b([01]?\d|2[0-3])[:.]([0-5]\d)\b")
+CREW_RE = re.compile(r"экипаж|вдво[её]м|(?:два|2|двое)\s+водител", re.IGNORECASE)
+EXTENDED_RE = re.compile(r"(\d)\s*(?:удлин|десятичас|10-?час|по\s*10)", re.IGNORECASE)
+REDUCED_RE = re.compile(r"(\d)\s*(?:сокращ|девятичас|9-?час|по\s*9)", re.IGNORECASE)
+
+
+def _number(value: str) -> float:
+    return float(value.replace(",", "."))
+
+
+def parse_schedule_request(text: str, now: datetime) -> dict:
+    """
+    Просьба рассчитать поездку («рассчитай 1200 км, выезд 06:00, 80 км/ч, экипаж, 1 удлинённый
+    и 2 сокращённых») → аргументы для route_calc.plan_schedule. None, если это не расчёт
+    или в сообщении нет расстояния.
+    """
+    if not SCHEDULE_TRIGGER_RE.search(text):
+        return None
+    distance = DISTANCE_RE.search(text)
+    if not distance:
+        return None
+
+    request = {"distance_km": _number(distance.group(1)), "crew": bool(CREW_RE.search(text)), "state": {}}
+    speed = SPEED_RE.search(text)
+    if speed:
+        request["speed_kmh"] = _number(speed.group(1))
+
+    start = START_RE.search(text)
+    if start:
+        start_time = now.replace(hour=int(start.group(1)), minute=int(start.group(2)), second=0, microsecond=0)
+        if start_time < now - timedelta(hours=1):
+            start_time += timedelta(days=1)  # «выезд в 06:00», сказанное вечером, — это завтра
+        request["start_time"] = start_time
+    else:
+        request["start_time"] = now.replace(second=0, microsecond=0)
+
+    extended = EXTENDED_RE.search(text)
+    if extended:
+        request["state"]["extended_days_left"] = int(extended.group(1))
+    reduced = REDUCED_RE.search(text)
+    if reduced:
+        request["state"]["reduced_rests_left"] = int(reduced.group(1))
+    return request
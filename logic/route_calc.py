@@ -1,5 +1,44 @@
 
+import json
+import math
+import os
 from datetime import datetime, timedelta
+from functools import lru_cache
+
+from logic.constraints import RULESET_DIR, load_constraints
+
+DEFAULT_RULESET = os.path.join(RULESET_DIR, "default.json")
+HOUR = 3600
+
+# Нормы Регламента (ЕС) № 561/2006; rulesets/default.json может их переопределить
+DEFAULT_RULES = {
+    "max_driving_hours": 9,              # Ежедневное время управления
+    "extended_driving_hours": 10,        # ...удлинённое, не чаще extended_days_per_week раз
+    "extended_days_per_week": 2,
+    "pause_after_hours": 4.5,            # Перерыв после 4,5 ч управления
+    "pause_duration": 0.75,
+    "daily_rest": 11,
+    "reduced_daily_rest": 9,             # Сокращённый отдых, не чаще reduced_rests_per_week раз между недельными
+    "reduced_rests_per_week": 3,
+    "duty_period_hours": 24,             # Ежедневный отдых должен закончиться в пределах 24 ч от начала смены
+    "crew_duty_period_hours": 30,        # Экипаж: 9 ч отдыха в пределах 30 ч
+    "crew_daily_rest": 9,
+    "weekly_driving_hours": 56,
+    "weekly_rest": 45,
+    "weekly_rest_interval_hours": 144,   # Недельный отдых — не позже шести 24-часовых периодов
+}
+
+WEEKDAYS = ["пн", "вт", "ср", "чт", "пт", "сб", "вс"]
+
+
+@lru_cache(maxsize=None)
+def load_rules(path: str = DEFAULT_RULESET) -> dict:
+    """Нормы РТО: значения по умолчанию, переопределённые файлом набора правил (читается один раз, не изменять)."""
+    rules = dict(DEFAULT_RULES)
+    with open(path, "r", encoding="utf-8") as f:
+        rules.update(json.load(f))
+    return rules
+
 
 def calculate_eta(start_time, segments, speed_kmh=73):
     events = []
@@ -37,3 +76,360 @@ def calculate_eta(start_time, segments, speed_kmh=73):
             current_time = end_time
 
     return events, total_distance
+
+
+class DriverClock:
+    """Счётчики одного водителя (в секундах) и оставшиеся послабления недели."""
+
+    def __init__(self, rules: dict, state: dict = None):
+        state = state or {}
+        self.since_break = round(state.get("since_break_h", 0) * HOUR)
+        self.today = round(state.get("driven_today_h", 0) * HOUR)
+        self.week = round(state.get("driven_week_h", 0) * HOUR)
+        self.extended_left = state.get("extended_days_left", rules["extended_days_per_week"])
+        self.reduced_left = state.get("reduced_rests_left", rules["reduced_rests_per_week"])
+        self.extended_today = False
+        self.idle = 0  # Секунд без управления подряд (в экипаже — перерыв на соседнем сиденье)
+
+    def rest(self, weekly: bool, rules: dict):
+        self.today = 0
+        self.since_break = 0
+        self.extended_today = False
+        if weekly:
+            self.week = 0
+            self.extended_left = rules["extended_days_per_week"]
+            self.reduced_left = rules["reduced_rests_per_week"]
+
+    def as_dict(self) -> dict:
+        return {
+            "driven_today_h": round(self.today / HOUR, 2),
+            "since_break_h": round(self.since_break / HOUR, 2),
+            "driven_week_h": round(self.week / HOUR, 2),
+            "extended_days_left": self.extended_left,
+            "reduced_rests_left": self.reduced_left,
+        }
+
+
+class SchedulePlanner:
+    """
+    Раскладывает поездку на вождение, перерывы, ежедневный и еженедельный отдых по Регламенту 561/2006.
+
+    Планировщик ищет самый быстрый допустимый график: перерыв — как только набрано 4,5 ч,
+    сокращённый отдых — пока есть в запасе, удлинённый 10-часовой день — только если он позволяет
+    доехать без ещё одного ежедневного отдыха. Экипаж из двух водителей меняется за рулём,
+    перерыв второго водителя идёт на соседнем сиденье, отдых — 9 ч в пределах 30 ч.
+    Если у участка указана страна, на каждой границе участка и отрезка вождения проверяются запреты
+    движения (logic/constraints.py): под запретом грузовик стоит, а стоянка засчитывается как перерыв или отдых.
+    Время считается целыми секундами событиями, а не шагами по минутам, поэтому расчёт занимает
+    микросекунды–доли миллисекунды. Двухнедельный лимит 90 ч и разделённые перерывы/отдых не учитываются.
+    """
+
+    def __init__(self, start_time: datetime, rules: dict, crew: bool = False, state: dict = None,
+                 constraints: dict = None):
+        state = state or {}
+        self.start_time = start_time
+        self.rules = rules
+        self.crew = crew
+        self.constraints = constraints or {}  # {код страны: CountryConstraints}
+        self.country = None
+        self.warnings = []
+        self.drivers = [DriverClock(rules, state) for _ in range(2 if crew else 1)]
+        self.active = 0
+        self.t = 0
+        self.duty_start = -round(state.get("duty_started_h_ago", 0) * HOUR)
+        self.weekly_due = round(state.get("hours_until_weekly_rest", rules["weekly_rest_interval_hours"]) * HOUR)
+        self.events = []
+        self.distance_km = 0.0
+        self.driving = 0
+        self.drive_ahead = 0  # Секунд управления до конца поездки (для решения об удлинённом дне)
+
+        self.pause_after = round(rules["pause_after_hours"] * HOUR)
+        self.pause_len = round(rules["pause_duration"] * HOUR)
+        self.daily_drive = round(rules["max_driving_hours"] * HOUR)
+        self.extended_drive = round(rules["extended_driving_hours"] * HOUR)
+        self.weekly_drive = round(rules["weekly_driving_hours"] * HOUR)
+        self.rest_len = round(rules["daily_rest"] * HOUR)
+        self.reduced_rest_len = round(rules["reduced_daily_rest"] * HOUR)
+        self.weekly_rest_len = round(rules["weekly_rest"] * HOUR)
+        if crew:
+            self.duty_period = round(rules["crew_duty_period_hours"] * HOUR)
+        else:
+            self.duty_period = round(rules["duty_period_hours"] * HOUR)
+
+    # --- События ---
+    def _now(self) -> datetime:
+        return self.start_time + timedelta(seconds=self.t)
+
+    def _add(self, kind: str, seconds: int, action: str, **extra):
+        start = self.start_time + timedelta(seconds=self.t)
+        self.t += seconds
+        end = self.start_time + timedelta(seconds=self.t)
+        last = self.events[-1] if self.events else None
+        if (kind == "drive" and last and last["type"] == "drive" and last["end"] == start
+                and last.get("driver") == extra.get("driver") and last.get("note") == extra.get("note")):
+            last["end"] = end
+            last["distance_km"] = round(last["distance_km"] + extra["distance_km"], 1)
+            last["action"] = f"Вождение {last['distance_km']:g} км"
+            return
+        self.events.append(dict({"start": start, "end": end, "type": kind, "action": action}, **extra))
+
+    def _idle(self, seconds: int, drivers=None):
+        """Время без управления: после pause_duration подряд перерыв считается сделанным."""
+        for driver in drivers if drivers is not None else self.drivers:
+            driver.idle += seconds
+            if driver.idle >= self.pause_len:
+                driver.since_break = 0
+
+    # --- Отдых ---
+    def _next_rest_len(self) -> int:
+        if self.crew:
+            return round(self.rules["crew_daily_rest"] * HOUR)
+        return self.reduced_rest_len if self.drivers[0].reduced_left > 0 else self.rest_len
+
+    def _rest_deadline(self) -> int:
+        """Момент, не позже которого нужно начать ежедневный отдых, чтобы уложиться в 24 (30) ч."""
+        return self.duty_start + self.duty_period - self._next_rest_len()
+
+    def _daily_rest(self):
+        self._check_stop_time()
+        length = self._next_rest_len()
+        if self.country is not None:
+            # Если к концу отдыха действует запрет движения, отдыхаем до его конца — сокращённый отдых не тратится
+            banned, change = self.country.state(self._now() + timedelta(seconds=length))
+            if banned and change is not None:
+                length = max(length, math.ceil((change - self._now()).total_seconds()))
+        reduced = not self.crew and length < self.rest_len
+        self._add("daily_rest", length, "Сокращённый ежедневный отдых" if reduced else "Ежедневный отдых")
+        for driver in self.drivers:
+            driver.rest(weekly=False, rules=self.rules)
+            driver.idle = 0
+            if reduced:
+                driver.reduced_left -= 1
+        self.duty_start = self.t
+
+    def _check_stop_time(self):
+        """Предупреждение, если отдых начинается позже рекомендуемого для страны (DE — 16:30)."""
+        country = self.country
+        if country is None or not country.stop_too_late(self._now()):
+            return
+        warning = f"{country.name}: остановка на отдых в {self._now():%H:%M}, позже {country.latest_stop_text}."
+        if country.explain:
+            warning += f" {country.explain}"
+        if warning not in self.warnings:
+            self.warnings.append(warning)
+
+    def _weekly_rest(self):
+        self._check_stop_time()
+        self._add("weekly_rest", self.weekly_rest_len, "Еженедельный отдых")
+        for driver in self.drivers:
+            driver.rest(weekly=True, rules=self.rules)
+            driver.idle = 0
+        self.duty_start = self.t
+        self.weekly_due = self.t + round(self.rules["weekly_rest_interval_hours"] * HOUR)
+
+    def _break(self):
+        self._add("break", self.pause_len, "Перерыв")
+        self._idle(self.pause_len)
+
+    # --- Управление ---
+    def _daily_limit(self, driver: DriverClock) -> int:
+        if (not driver.extended_today and driver.today >= self.daily_drive and driver.extended_left > 0
+                and self.drive_ahead <= self.extended_drive - driver.today):
+            # Удлинённый день берём, только если он позволяет доехать без ещё одного отдыха
+            driver.extended_today = True
+            driver.extended_left -= 1
+        return self.extended_drive if driver.extended_today else self.daily_drive
+
+    def _window(self, driver: DriverClock) -> int:
+        """Сколько секунд водитель может ехать прямо сейчас."""
+        return min(
+            self.pause_after - driver.since_break,
+            self._daily_limit(driver) - driver.today,
+            self.weekly_drive - driver.week,
+            self._rest_deadline() - self.t,
+            self.weekly_due - self.t,
+        )
+
+    def _unblock(self):
+        """Никто не может ехать: вставляет недельный отдых, ежедневный отдых или перерыв."""
+        if self.t >= self.weekly_due or all(d.week >= self.weekly_drive for d in self.drivers):
+            self._weekly_rest()
+        elif (self._rest_deadline() - self.t <= self.pause_len
+              or all(d.today >= self._daily_limit(d) for d in self.drivers)):
+            self._daily_rest()
+        else:
+            self._break()
+
+    def _pick_driver(self):
+        """Текущий водитель, если может ехать, иначе сменщик (в экипаже); None — нужен отдых."""
+        order = [self.active] + [i for i in range(len(self.drivers)) if i != self.active]
+        for index in order:
+            window = self._window(self.drivers[index])
+            if window > 0:
+                self.active = index
+                return index, window
+        return None, 0
+
+    def _ban_window(self, window: int) -> int:
+        """
+        Сколько можно ехать с учётом запретов страны текущего участка; 0 — сейчас запрет,
+        и стоянка до его конца уже добавлена в график.
+        """
+        if self.country is None:
+            return window
+        banned, change = self.country.state(self._now())
+        if banned:
+            if change is None:
+                raise ValueError(f"Движение в стране {self.country.code} запрещено без окончания")
+            wait = math.ceil((change - self._now()).total_seconds())
+            self.pause(wait, f"Запрет движения ({self.country.name}) до {change:%d.%m %H:%M}", kind="ban")
+            return 0
+        if change is not None:
+            window = min(window, math.ceil((change - self._now()).total_seconds()))
+        return window
+
+    def drive(self, seconds: int, speed_kmh: float, note: str = None, country: str = None):
+        self.country = self.constraints.get(country.upper()) if country else None
+        while seconds > 0:
+            index, window = self._pick_driver()
+            if index is None:
+                self._unblock()
+                continue
+            window = self._ban_window(window)
+            if window <= 0:
+                continue
+            chunk = min(seconds, window)
+            km = chunk * speed_kmh / HOUR
+            extra = {"distance_km": round(km, 1), "driver": index + 1 if self.crew else None, "note": note}
+            self._add("drive", chunk, f"Вождение {round(km, 1):g} км", **extra)
+            driver = self.drivers[index]
+            driver.since_break += chunk
+            driver.today += chunk
+            driver.week += chunk
+            driver.idle = 0
+            self._idle(chunk, [d for d in self.drivers if d is not driver])
+            seconds -= chunk
+            self.drive_ahead -= chunk
+            self.driving += chunk
+            self.distance_km += km
+
+    def other_work(self, seconds: int, action: str):
+        """Погрузка, таможня, ожидание: время идёт, но перерывом не считается."""
+        self._add("wait", seconds, action)
+        for driver in self.drivers:
+            driver.idle = 0
+
+    def pause(self, seconds: int, action: str, kind: str = "pause"):
+        """Пауза из плана: засчитывается как перерыв, ежедневный или недельный отдых по длительности."""
+        self._add(kind, seconds, action)
+        if seconds >= self.weekly_rest_len:
+            for driver in self.drivers:
+                driver.rest(weekly=True, rules=self.rules)
+            self.duty_start = self.t
+            self.weekly_due = self.t + round(self.rules["weekly_rest_interval_hours"] * HOUR)
+        elif seconds >= self._next_rest_len():
+            reduced = not self.crew and seconds < self.rest_len
+            for driver in self.drivers:
+                driver.rest(weekly=False, rules=self.rules)
+                if reduced:
+                    driver.reduced_left -= 1
+            self.duty_start = self.t
+        else:
+            self._idle(seconds)
+
+    def ferry(self, seconds: int, action: str, cabin: bool):
+        """
+        Паром или поезд. Со спальным местом время на борту засчитывается как отдых (ст. 9 Регламента),
+        без него — только как перерыв.
+        """
+        if cabin:
+            self.pause(seconds, action, kind="ferry")
+        else:
+            self._add("ferry", seconds, action)
+            self._idle(seconds)
+
+    def result(self) -> dict:
+        return {
+            "events": self.events,
+            "departure": self.start_time,
+            "arrival": self.start_time + timedelta(seconds=self.t),
+            "distance_km": round(self.distance_km, 1),
+            "driving_h": round(self.driving / HOUR, 2),
+            "total_h": round(self.t / HOUR, 2),
+            "drivers": [driver.as_dict() for driver in self.drivers],
+            "hours_until_weekly_rest": round((self.weekly_due - self.t) / HOUR, 2),
+            "warnings": self.warnings,
+        }
+
+
+def plan_schedule(start_time: datetime, segments: list = None, distance_km: float = None, speed_kmh: float = 73,
+                  crew: bool = False, state: dict = None, rules: dict = None, country: str = None,
+                  constraints: dict = None) -> dict:
+    """
+    График поездки с перерывами и отдыхом по нормам РТО.
+
+    segments — как в calculate_eta (drive / wait / pause) плюс ferry: duration_min и cabin либо route —
+    запись из logic/ferries.find_routes; вместо участков можно передать distance_km.
+    country у участка (или общий country) — код страны для проверки запретов движения;
+    constraints — скомпилированные ограничения (по умолчанию load_constraints()).
+    state — состояние водителя на старте (по умолчанию — после отдыха): driven_today_h, since_break_h,
+    driven_week_h, extended_days_left (оставшиеся 10-часовые дни), reduced_rests_left (оставшиеся
+    9-часовые отдыхи), duty_started_h_ago, hours_until_weekly_rest.
+    Возвращает события (start, end, type, action), время прибытия и оставшиеся послабления.
+    """
+    rules = rules or load_rules()
+    if segments is None:
+        segments = [{"type": "drive", "distance_km": distance_km}]
+    if constraints is None and (country or any(segment.get("country") for segment in segments)):
+        constraints = load_constraints()
+    planner = SchedulePlanner(start_time, rules, crew, state, constraints)
+
+    drives = []
+    for segment in segments:
+        speed = segment.get("speed_kmh", speed_kmh)
+        drives.append(round(segment["distance_km"] / speed * HOUR) if segment["type"] == "drive" else 0)
+    planner.drive_ahead = sum(drives)
+
+    for segment, drive_seconds in zip(segments, drives):
+        if segment["type"] == "drive":
+            planner.drive(
+                drive_seconds, segment.get("speed_kmh", speed_kmh), segment.get("note"), segment.get("country", country),
+            )
+        elif segment["type"] == "wait":
+            planner.other_work(round(segment["duration_min"] * 60), segment.get("note", "Ожидание"))
+        elif segment["type"] == "pause":
+            planner.pause(round(segment["duration_min"] * 60), segment.get("note", "Пауза"))
+        elif segment["type"] == "ferry":
+            route = segment.get("route") or {}
+            minutes = segment.get("duration_min")
+            if minutes is None:
+                minutes = route.get("duration_max")
+            note = segment.get("note") or (f"Паром {route['from']} → {route['to']}" if route else "Паром")
+            if minutes is None:
+                raise ValueError(f"{note}: длительность не указана, передайте duration_min")
+            planner.ferry(round(minutes * 60), note, segment.get("cabin", route.get("cabin") is True))
+    return planner.result()
+
+
+def format_schedule(schedule: dict) -> str:
+    """Текстовый график для ответа водителю (или для GPT, чтобы он только сформулировал ответ)."""
+    def moment(value: datetime) -> str:
+        return f"{WEEKDAYS[value.weekday()]} {value:%d.%m %H:%M}"
+
+    lines = []
+    for event in schedule["events"]:
+        duration = (event["end"] - event["start"]).total_seconds() / HOUR
+        driver = f" (водитель {event['driver']})" if event.get("driver") else ""
+        end = moment(event["end"]) if duration >= 24 else f"{event['end']:%H:%M}"
+        lines.append(f"{moment(event['start'])}–{end} {event['action']}{driver}, {duration:.2f} ч")
+    lines.append(
+        f"Прибытие: {moment(schedule['arrival'])}. {schedule['distance_km']:g} км, за рулём {schedule['driving_h']:g} ч, "
+        f"всего в пути {schedule['total_h']:g} ч."
+    )
+    driver = schedule["drivers"][0]
+    lines.append(
+        f"Осталось на неделю: удлинённых дней {driver['extended_days_left']}, сокращённых отдыхов "
+        f"{driver['reduced_rests_left']}, до недельного отдыха {schedule['hours_until_weekly_rest']:g} ч."
+    )
+    lines += [f"⚠️ {warning}" for warning in schedule.get("warnings", [])]
+    return "\n".join(lines)
@@ -8,6 +8,9 @@ from geopy.distance import geodesic
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
 from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from knowledge_base import knowledge_store, retrieve_sections, snippet_cache
+from model_router import ModelRouter, classify_query
 
 # --- Настройка логирования ---
 logging.basicConfig(
@@ -27,6 +30,8 @@ TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 openai.api_key = OPENAI_API_KEY
+# Ответы GPT идут через общий роутер моделей (размыкатель, дешёвые модели для простых вопросов)
+model_router = ModelRouter(AsyncOpenAI(api_key=OPENAI_API_KEY))
 
 # Загрузка промта системы для GPT
 try:
@@ -62,42 +67,15 @@ def load_relevant_knowledge(user_input: str) -> str:
         if keyword in lowered:
             selected_files.add(filename)
 
-    texts = []
+    filenames = []
     for filename in sorted(selected_files):
-        path = os.path.join("knowledge", filename)
-        if os.path.exists(path):
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    content = f.read().strip()
-                    if content:
-                        texts.append(f"📘 {filename}:\n{content}\n")
-            except Exception as e:
-                logger.error(f"Ошибка чтения файла базы знаний {filename}: {e}")
-        else:
-            logger.warning(f"Файл базы знаний не найден: {path}")
-
-    return "\n".join(texts) or ""
+        if knowledge_store.resolve(filename) is None:
+            logger.warning(f"Файл базы знаний не найден: {filename}")
+            continue
+        filenames.append(filename)
+    return snippet_cache.snippet(retrieve_sections(user_input, filenames))
 
 # --- Функции для взаимодействия с GPT ---
-async def ask_gpt(messages: list) -> dict:
-    """
-    Отправляет запрос к GPT-модели, пытаясь сначала GPT-4.5, затем GPT-3.5.
-    """
-    try:
-        response = await openai.ChatCompletion.acreate(model="gpt-4-0125-preview", messages=messages)
-        return response
-    except openai.error.OpenAIError as e:
-        logger.warning(f"gpt-4-0125-preview недоступен, fallback к GPT-3.5: {e}")
-        try:
-            response = await openai.ChatCompletion.acreate(model="gpt-3.5-turbo-1106", messages=messages)
-            return response
-        except openai.error.OpenAIError as e2:
-            logger.error(f"GPT-3.5 тоже не сработал: {e2}")
-            return None
-    except Exception as e:
-        logger.error(f"Неизвестная ошибка при запросе к OpenAI API: {e}")
-        return None
-
 # --- Обработчики команд и сообщений Telegram ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает команду /start."""
@@ -136,9 +114,9 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     messages.extend(context_history[-MAX_TURNS:])
 
-    response = await ask_gpt(messages)
-    if response and response.choices:
-        assistant_reply = response.choices[0].message.content.strip()
+    assistant_reply = await model_router.complete(messages, classify_query(user_input, has_knowledge=bool(kb_snippet)))
+    if assistant_reply:
+        assistant_reply = assistant_reply.strip()
         context_history.append({"role": "assistant", "content": assistant_reply})
         await update.message.reply_text(assistant_reply)
     else:
@@ -171,9 +149,9 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
             messages.append({"role": "system", "content": "📚 База знаний:\n" + kb_snippet})
         messages.extend(context_history[-MAX_TURNS:])
 
-        response = await ask_gpt(messages)
-        if response and response.choices:
-            assistant_reply = response.choices[0].message.content.strip()
+        assistant_reply = await model_router.complete(messages, classify_query(user_text, has_knowledge=bool(kb_snippet)))
+        if assistant_reply:
+            assistant_reply = assistant_reply.strip()
             context_history.append({"role": "assistant", "content": assistant_reply})
             await update.message.reply_text(assistant_reply)
         else:
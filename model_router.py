@@ -0,0 +1,296 @@
+import asyncio
+import bisect
+import logging
+import re
+import time
+from collections import Counter, deque
+
+# Модели в порядке предпочтения. tier: "full" — основные, "light" — дешёвые и быстрые
+DEFAULT_MODELS = [
+    {"name": "gpt-5", "tier": "full", "timeout": 60,
+     "params": {"temperature": 1, "max_tokens": 4000, "top_p": 1.0, "frequency_penalty": 0.0, "presence_penalty": 0.0}},
+    {"name": "gpt-4.1", "tier": "full", "timeout": 60,
+     "params": {"temperature": 0.7, "max_tokens": 4000}},
+    {"name": "gpt-3.5-turbo", "tier": "light", "timeout": 30,
+     "params": {"temperature": 0.2, "max_tokens": 4000}},
+]
+
+FAILURE_THRESHOLD = 3       # Столько ошибок подряд — и модель выключается на BREAKER_COOLDOWN
+ERROR_RATE_THRESHOLD = 0.5  # ...или такая доля ошибок среди последних ERROR_WINDOW запросов
+ERROR_WINDOW = 20
+MIN_WINDOW_SAMPLES = 5      # Долю ошибок считаем только при стольких запросах в окне
+BREAKER_COOLDOWN = 60       # Секунд до пробного запроса к выключенной модели
+
+SIMPLE_QUERY_MAX_CHARS = 80  # Короткие вопросы без данных из базы знаний идут на дешёвые модели
+COMPLEX_QUERY_RE = re.compile(
+    r"рассчит|расчит|посчитай|почему|объясни|сравни|маршрут|штраф|тахограф|\d", re.IGNORECASE
+)
+
+LATENCY_BUCKETS = (0.5, 1, 2, 4, 8, 16, 32, 64)  # Верхние границы корзин гистограммы, секунды
+
+
+def classify_query(user_input: str, has_knowledge: bool = False) -> str:
+    """
+    "simple" — короткая реплика без расчётов и без данных из базы знаний ("спасибо", "привет, как дела"),
+    иначе "complex".
+    """
+    text = (user_input or "").strip()
+    if has_knowledge or len(text) > SIMPLE_QUERY_MAX_CHARS or COMPLEX_QUERY_RE.search(text):
+        return "complex"
+    return "simple"
+
+
+def _prompt(messages, model: str) -> list:
+    """Готовый список сообщений или функция, которая собирает промт под бюджет токенов модели."""
+    return messages(model) if callable(messages) else messages
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными корзинами; квантили оцениваются по границам корзин."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Последняя корзина — всё, что дольше buckets[-1]
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def as_dict(self) -> dict:
+        labels = [f"≤{b}s" for b in self.buckets] + [f">{self.buckets[-1]}s"]
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 3) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class CircuitBreaker:
+    """
+    Размыкатель для одной модели: closed → open (после серии ошибок или высокой доли ошибок)
+    → half-open (по истечении cooldown пропускает один пробный запрос) → closed/open.
+    """
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, error_rate: float = ERROR_RATE_THRESHOLD,
+                 window: int = ERROR_WINDOW, cooldown: float = BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate
+        self.cooldown = cooldown
+        self.outcomes = deque(maxlen=window)  # True — успех, False — ошибка
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def available(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half-open" and not self._probe_in_flight)
+
+    def acquire(self) -> bool:
+        """Разрешение на запрос; в состоянии half-open пропускается только один пробный запрос."""
+        if not self.available():
+            return False
+        if self.state == "half-open":
+            self._probe_in_flight = True
+        return True
+
+    def release(self):
+        """Запрос прерван без результата (например, пользователь не дочитал поток)."""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if (
+            self.opened_at is not None  # Пробный запрос не прошёл — снова ждём cooldown
+            or self.consecutive_failures >= self.failure_threshold
+            or (len(self.outcomes) >= MIN_WINDOW_SAMPLES and self.error_rate() >= self.error_rate_threshold)
+        ):
+            self.opened_at = time.monotonic()
+
+
+class ModelRouter:
+    """
+    Выбор модели для запроса вместо последовательного перебора на каждом сообщении.
+
+    Простые запросы сначала идут на дешёвые модели, сложные — на основные. Модель, которая
+    падает, выключается размыкателем на cooldown, и следующие запросы сразу идут на запасную,
+    не дожидаясь ошибки. По каждой модели копятся гистограммы задержек и счётчики решений.
+    """
+
+    def __init__(self, client, models: list = None):
+        self.client = client
+        self.models = models or DEFAULT_MODELS
+        self.breakers = {m["name"]: CircuitBreaker() for m in self.models}
+        self.latency = {m["name"]: LatencyHistogram() for m in self.models}
+        self.first_token = {m["name"]: LatencyHistogram() for m in self.models}
+        self.requests = Counter()
+        self.errors = Counter()
+        self.decisions = Counter()  # {(сложность, модель): сколько раз выбрана первой}
+
+    def candidates(self, complexity: str = "complex") -> list:
+        """Модели в порядке попыток для запроса данной сложности, без выключенных размыкателем."""
+        preferred = "light" if complexity == "simple" else "full"
+        ordered = [m for m in self.models if m["tier"] == preferred] + [m for m in self.models if m["tier"] != preferred]
+        return [m for m in ordered if self.breakers[m["name"]].available()] or ordered
+
+    def preferred(self, complexity: str = "complex") -> str:
+        """Модель, которая ответит на запрос, если не упадёт (для ключей кеша ответов)."""
+        return self.candidates(complexity)[0]["name"]
+
+    def _attempts(self, complexity: str):
+        """
+        Модели, к которым действительно идёт запрос. Если выключены все, пробуем их по порядку:
+        лучше попытаться, чем сразу отказать.
+        """
+        candidates = self.candidates(complexity)
+        forced = not any(self.breakers[m["name"]].available() for m in candidates)
+        if forced:
+            logging.warning("[Роутер] Все модели выключены размыкателем, пробую по порядку")
+        first = True
+        for model in candidates:
+            if not forced and not self.breakers[model["name"]].acquire():
+                continue
+            if first:
+                self.decisions[(complexity, model["name"])] += 1
+                first = False
+            self.requests[model["name"]] += 1
+            yield model
+
+    def _complexity(self, messages, complexity: str = None) -> str:
+        if complexity:
+            return complexity
+        messages = _prompt(messages, self.preferred())
+        user_messages = [m["content"] for m in messages if m["role"] == "user"]
+        return classify_query(user_messages[-1] if user_messages else "")
+
+    def _success(self, name: str, started: float):
+        self.breakers[name].record_success()
+        self.latency[name].observe(time.perf_counter() - started)
+
+    def _failure(self, name: str, error: Exception):
+        self.breakers[name].record_failure()
+        self.errors[name] += 1
+        logging.warning(f"[Роутер] {name}: ошибка ({error}), размыкатель: {self.breakers[name].state}")
+
+    async def complete(self, messages, complexity: str = None, route: dict = None):
+        """
+        Текст ответа или None, если не ответила ни одна модель. В route["model"] пишется ответившая модель.
+        messages — список сообщений или функция model -> список: тогда промт собирается заново
+        под каждую модель, к которой идёт запрос (у запасной модели бюджет может быть меньше).
+        """
+        complexity = self._complexity(messages, complexity)
+        for model in self._attempts(complexity):
+            name = model["name"]
+            started = time.perf_counter()
+            try:
+                response = await self.client.chat.completions.create(
+                    model=name, messages=_prompt(messages, name), timeout=model["timeout"], **model["params"]
+                )
+                text = response.choices[0].message.content if response.choices else None
+            except asyncio.CancelledError:
+                self.breakers[name].release()  # Иначе пробный запрос half-open так и считается идущим
+                raise
+            except Exception as e:
+                self._failure(name, e)
+                continue
+            self._success(name, started)
+            if route is not None:
+                route["model"] = name
+            logging.info(f"[Роутер] {complexity} → {name}, {time.perf_counter() - started:.2f} с")
+            return text
+        logging.error("[Роутер] Все модели GPT не сработали")
+        return None
+
+    async def stream(self, messages, complexity: str = None, route: dict = None):
+        """
+        Отдаёт ответ по кускам (в route["model"] пишется ответившая модель). На следующую модель переходим, только пока не пришёл первый токен:
+        начатый ответ уже виден пользователю, поэтому обрыв просто завершает поток.
+        messages — как в complete.
+        """
+        complexity = self._complexity(messages, complexity)
+        for model in self._attempts(complexity):
+            name = model["name"]
+            started = time.perf_counter()
+            got_first_token = False
+            try:
+                stream = await self.client.chat.completions.create(
+                    model=name, messages=_prompt(messages, name), stream=True, timeout=model["timeout"], **model["params"]
+                )
+                async for chunk in stream:
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    if not got_first_token:
+                        got_first_token = True
+                        first_token = time.perf_counter() - started
+                        self.first_token[name].observe(first_token)
+                        logging.info(f"[GPT] {name}: первый токен через {first_token:.2f} с")
+                    yield chunk.choices[0].delta.content
+            except (GeneratorExit, asyncio.CancelledError):
+                # Поток бросили или задачу отменили: результата нет, пробный запрос half-open освобождается
+                self.breakers[name].release()
+                raise
+            except Exception as e:
+                self._failure(name, e)
+                if got_first_token:
+                    logging.error(f"[Роутер] {name}: поток оборвался")
+                    return
+                continue
+            self._success(name, started)
+            if route is not None:
+                route["model"] = name
+            logging.info(f"[Роутер] {complexity} → {name}, {time.perf_counter() - started:.2f} с")
+            return
+        logging.error("[Роутер] Все модели GPT не сработали")
+
+    def stats(self) -> dict:
+        models = {}
+        for model in self.models:
+            name = model["name"]
+            breaker = self.breakers[name]
+            models[name] = {
+                "tier": model["tier"],
+                "state": breaker.state,
+                "requests": self.requests[name],
+                "errors": self.errors[name],
+                "error_rate": round(breaker.error_rate(), 3),
+                "latency": self.latency[name].as_dict(),
+                "first_token": self.first_token[name].as_dict(),
+            }
+        decisions = {f"{complexity}→{name}": count for (complexity, name), count in self.decisions.items()}
+        return {"models": models, "decisions": decisions}
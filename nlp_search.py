@@ -1,14 +1,24 @@
-import spacy
+import hashlib
+import logging
 import os
+import threading
+import time
 
-# Загрузка русской NLP-модели
-try:
-    nlp = spacy.load("ru_core_news_sm")
-except OSError:
-    raise SystemExit(
-        "❌ Модель ru_core_news_sm не найдена. Установите её с помощью:\n"
-        "python -m spacy download ru_core_news_sm"
-    )
+import numpy as np
+
+from knowledge_base import (
+    knowledge_store, KNOWLEDGE_TOP_K, KNOWLEDGE_TOKEN_BUDGET, retrieve_sections, snippet_cache,
+)
+from keyword_matcher import KeywordMatcher
+
+# Русская NLP-модель загружается лениво: при первом запросе или в фоне после старта бота
+MODEL_NAME = "ru_core_news_sm"
+nlp = None
+vector_index = None
+_load_lock = threading.Lock()    # держится всё время загрузки модели
+_thread_lock = threading.Lock()  # короткий, только для запуска фонового потока
+_load_thread = None
+_load_failed = False
 
 # Базовые ключевые слова для каждой категории
 keywords_map = {
@@ -28,40 +38,199 @@ keywords_map = {
 
 # Порог сходства слов (0.5–1.0)
 SIMILARITY_THRESHOLD = 0.65
+# Порог сходства запроса с разделом базы знаний
+SECTION_SIMILARITY_THRESHOLD = 0.3
+# Векторы ключей и разделов кешируются на диске, чтобы не пересчитывать их при рестарте
+VECTOR_CACHE_PATH = os.path.join("memory", "nlp_vectors.npz")
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Нормирует строки матрицы, чтобы скалярное произведение стало косинусным сходством."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
 
 
-def load_relevant_knowledge(user_input: str) -> str:
+class VectorIndex:
     """
-    Находит подходящие файлы знаний на основе NLP-сравнения.
+    Предрассчитанные векторы ключевых слов и разделов базы знаний в виде NumPy-матриц.
+    Поиск — одно матрично-векторное произведение вместо вложенного цикла token.similarity.
     """
-    lowered = user_input.lower()
-    doc = nlp(lowered)
-
-    selected_files = set()
-
-    for keyword, filename in keywords_map.items():
-        keyword_doc = nlp(keyword)
-        # Сравнение с каждым токеном в запросе
-        for token in doc:
-            similarity = token.similarity(keyword_doc)
-            if similarity > SIMILARITY_THRESHOLD:
-                print(f"[NLP] Совпадение: '{token.text}' ~ '{keyword}' ({similarity:.2f})")
-                selected_files.add(filename)
-
-    texts = []
-    for filename in sorted(selected_files):
-        path = os.path.join("knowledge", filename)
-        if os.path.exists(path):
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    content = f.read().strip()
-                    if content:
-                        texts.append(f"📘 {filename}:\n{content}\n")
-                    else:
-                        print(f"[База знаний] Файл пуст: {filename}")
-            except Exception as e:
-                print(f"[База знаний] Ошибка чтения файла {filename}: {e}")
-        else:
-            print(f"[База знаний] Файл не найден: {path}")
-
-    return "\n".join(texts) or ""
+
+    def __init__(self, model, keywords: dict, store=knowledge_store, cache_path: str = VECTOR_CACHE_PATH):
+        self.model = model
+        self.keywords = list(keywords)
+        self.keyword_files = [keywords[k] for k in self.keywords]
+        self.store = store
+        self.cache_path = cache_path
+        self.sections = []
+        self.keyword_matrix = None  # K×D
+        self.section_matrix = None  # S×D
+        self._cache_key = None
+        self._versions = None
+
+    def _current_key(self, sections: list) -> str:
+        digest = hashlib.sha1()
+        digest.update(f"{self.model.meta.get('name')}-{self.model.meta.get('version')}".encode())
+        for keyword in self.keywords:
+            digest.update(keyword.encode())
+        for section in sections:
+            digest.update(section["id"].encode())
+            digest.update(hashlib.sha1(section["text"].encode()).digest())
+        return digest.hexdigest()
+
+    def _load_cache(self, key: str) -> bool:
+        if not os.path.exists(self.cache_path):
+            return False
+        try:
+            with np.load(self.cache_path) as data:
+                if str(data["key"]) != key:
+                    return False
+                self.keyword_matrix = data["keywords"]
+                self.section_matrix = data["sections"]
+            return True
+        except (OSError, KeyError, ValueError) as e:
+            logging.warning(f"[NLP] Не удалось прочитать кеш векторов {self.cache_path}: {e}")
+            return False
+
+    def _save_cache(self, key: str):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            tmp_path = self.cache_path + ".tmp.npz"
+            np.savez(tmp_path, key=np.array(key), keywords=self.keyword_matrix, sections=self.section_matrix)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logging.warning(f"[NLP] Не удалось сохранить кеш векторов {self.cache_path}: {e}")
+
+    def _vectors(self, texts, count: int) -> np.ndarray:
+        matrix = np.array([doc.vector for doc in self.model.pipe(texts)], dtype=np.float32)
+        return _normalize_rows(matrix.reshape(count, -1)) if count else np.zeros((0, 0), dtype=np.float32)
+
+    def ensure_built(self):
+        """Строит матрицы (или берёт их из кеша); пересобирает, если изменились файлы базы знаний."""
+        files = sorted(set(self.keyword_files))
+        versions = tuple(self.store.version(filename) for filename in files)
+        if versions == self._versions:
+            return
+        sections = [section for filename in files for section in self.store.sections(filename)]
+        key = self._current_key(sections)
+        self._versions = versions
+        if key == self._cache_key:
+            return
+        self.sections = sections
+        if not self._load_cache(key):
+            self.keyword_matrix = self._vectors(self.keywords, len(self.keywords))
+            self.section_matrix = self._vectors((f"{s['title']}\n{s['text']}" for s in sections), len(sections))
+            self._save_cache(key)
+            logging.info(f"[NLP] Векторы пересчитаны: {len(self.keywords)} ключей, {len(sections)} разделов")
+        self._cache_key = key
+
+    def match_files(self, doc) -> set:
+        """Файлы, чьи ключевые слова похожи хотя бы на один токен запроса."""
+        token_vectors = np.array([token.vector for token in doc if not token.is_punct and token.has_vector])
+        if token_vectors.size == 0:
+            return set()
+        similarity = _normalize_rows(token_vectors) @ self.keyword_matrix.T  # T×K
+        best = similarity.max(axis=0)
+        selected = set()
+        for index in np.flatnonzero(best > SIMILARITY_THRESHOLD):
+            logging.info(f"[NLP] Совпадение: '{self.keywords[index]}' ({best[index]:.2f})")
+            selected.add(self.keyword_files[index])
+        return selected
+
+    def top_sections(self, doc, filenames: set, top_k: int = KNOWLEDGE_TOP_K,
+                     token_budget: int = KNOWLEDGE_TOKEN_BUDGET) -> list:
+        """Самые близкие к запросу разделы выбранных файлов (порог, top-k и бюджет токенов)."""
+        if not self.sections or not filenames:
+            return []
+        resolved = {self.store.resolve(f) for f in filenames}
+        mask = np.array([section["file"] in resolved for section in self.sections])
+        query = _normalize_rows(doc.vector.reshape(1, -1))[0]
+        scores = np.where(mask, self.section_matrix @ query, -np.inf)
+
+        selected, used = [], 0
+        for index in np.argsort(-scores):
+            if scores[index] < SECTION_SIMILARITY_THRESHOLD or len(selected) >= top_k:
+                break
+            section = self.sections[index]
+            if used + section["tokens"] > token_budget:
+                continue
+            selected.append(section)
+            used += section["tokens"]
+        return selected
+
+
+# Запасной вариант, пока модель грузится или если её нет
+fallback_matcher = KeywordMatcher(keywords_map)
+
+
+def load_model() -> bool:
+    """Загружает spaCy-модель и строит индекс векторов. Возвращает True, если семантический поиск доступен."""
+    global nlp, vector_index, _load_failed
+    with _load_lock:
+        if vector_index is not None:
+            return True
+        if _load_failed:
+            return False
+        started = time.perf_counter()
+        try:
+            import spacy
+            model = spacy.load(MODEL_NAME)
+            index = VectorIndex(model, keywords_map)
+            index.ensure_built()
+        except (ImportError, OSError) as e:
+            _load_failed = True
+            logging.warning(
+                f"[NLP] Модель {MODEL_NAME} недоступна, используется поиск по ключевым словам: {e}. "
+                f"Установить: python -m spacy download {MODEL_NAME}"
+            )
+            return False
+        nlp, vector_index = model, index
+        logging.info(f"[NLP] Модель {MODEL_NAME} загружена за {time.perf_counter() - started:.2f} с")
+        return True
+
+
+def start_background_load():
+    """Запускает загрузку модели в фоновом потоке (не блокирует старт бота)."""
+    global _load_thread
+    with _thread_lock:
+        if vector_index is not None or _load_failed or (_load_thread and _load_thread.is_alive()):
+            return
+        _load_thread = threading.Thread(target=load_model, name="nlp-model-loader", daemon=True)
+        _load_thread.start()
+
+
+def is_ready() -> bool:
+    return vector_index is not None
+
+
+def embed(text: str):
+    """Нормированный вектор текста или None, пока модель не загружена."""
+    if not is_ready():
+        return None
+    return _normalize_rows(nlp(text.lower()).vector.reshape(1, -1))[0]
+
+
+def relevant_sections(user_input: str, wait: bool = False) -> list:
+    """
+    Находит подходящие разделы базы знаний на основе NLP-сравнения.
+    Пока модель не загружена (или если её нет), отвечает поиском по ключевым словам;
+    с wait=True дожидается загрузки модели.
+    """
+    if wait:
+        load_model()
+    elif not is_ready():
+        start_background_load()
+
+    if not is_ready():
+        selected_files = fallback_matcher.targets_for(user_input)
+        return retrieve_sections(user_input, sorted(selected_files))
+
+    vector_index.ensure_built()
+    doc = nlp(user_input.lower())
+    selected_files = vector_index.match_files(doc)
+    return vector_index.top_sections(doc, selected_files)
+
+
+def load_relevant_knowledge(user_input: str, wait: bool = False) -> str:
+    return snippet_cache.snippet(relevant_sections(user_input, wait))
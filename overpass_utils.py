@@ -1,5 +1,61 @@
-import aiohttp
 import logging
+import re
+from http_client import get_session
+
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+OVERPASS_QUERY_TIMEOUT = 25  # [timeout:...] в запросе: сколько секунд сервер может выполнять запрос
+
+# Категории мест для поиска: фильтры по тегам (ключ, оператор, значение).
+# Из них же строится общий запрос и по ним же ответ раскладывается по категориям.
+OVERPASS_CATEGORIES = [
+    {"label": "🌳 Парки", "filters": [("leisure", "=", "park")]},
+    {"label": "🏛 Достопримечательности", "filters": [("tourism", "~", "attraction|museum|monument")]},
+    {"label": "🅿️ Парковка для фур", "filters": [("amenity", "=", "parking"), ("truck", "=", "yes")]},
+    {"label": "🏨 Отель/Мотель", "filters": [("tourism", "~", "hotel|motel")]},
+    {"label": "🛒 Магазин", "filters": [("shop", "=", "supermarket")]},
+    {"label": "🧺 Прачечная", "filters": [("shop", "=", "laundry")]},
+    {"label": "🚿 Душевые", "filters": [("amenity", "=", "shower")]},
+]
+
+
+def build_combined_query(lat, lon, radius, categories=OVERPASS_CATEGORIES):
+    """
+    Один запрос на все категории: объединение selectors по node/way/relation (nwr)
+    с одним around-фильтром на каждый. `out center` отдаёт центроиды для way/relation.
+    """
+    selectors = []
+    for category in categories:
+        tag_filters = "".join(f'["{key}"{op}"{value}"]' for key, op, value in category["filters"])
+        selectors.append(f"nwr{tag_filters}(around:{radius},{lat},{lon});")
+    return f"[out:json][timeout:{OVERPASS_QUERY_TIMEOUT}];({''.join(selectors)});out center;"
+
+
+def _tag_matches(tags, key, op, value):
+    if key not in tags:
+        return False
+    if op == "=":
+        return tags[key] == value
+    # Overpass "~" — поиск регулярки без привязки к началу/концу строки
+    return re.search(value, tags[key]) is not None
+
+
+def classify_element(tags, categories=OVERPASS_CATEGORIES):
+    """Метки категорий, под фильтры которых подходит элемент (их может быть несколько)."""
+    return [
+        category["label"]
+        for category in categories
+        if all(_tag_matches(tags, key, op, value) for key, op, value in category["filters"])
+    ]
+
+
+def element_coords(element):
+    """Координаты элемента: у node — lat/lon, у way/relation — центроид из `out center`."""
+    if "lat" in element and "lon" in element:
+        return element["lat"], element["lon"]
+    center = element.get("center")
+    if center:
+        return center["lat"], center["lon"]
+    return None
 
 async def query_overpass(lat, lon, radius=10000):
     query = f"""
@@ -16,16 +72,13 @@ async def query_overpass(lat, lon, radius=10000):
     >;
     out skel qt;
     """
-    url = "https://overpass-api.de/api/interpreter"
-
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, data={"data": query}) as resp:
-                if resp.status == 200:
-                    return await resp.json()
-                else:
-                    logging.error(f"Overpass статус {resp.status}")
-                    return None
+        async with get_session().post(OVERPASS_URL, data={"data": query}) as resp:
+            if resp.status == 200:
+                return await resp.json()
+            else:
+                logging.error(f"Overpass статус {resp.status}")
+                return None
     except Exception as e:
         logging.error(f"Ошибка Overpass: {e}")
         return None
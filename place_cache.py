@@ -0,0 +1,58 @@
+import time
+from collections import OrderedDict
+
+from geo_utils import geohash_encode
+
+PLACE_CACHE_PRECISION = 5       # Длина geohash ячейки (5 знаков ≈ 4,9×4,9 км)
+PLACE_CACHE_TTL = 6 * 3600      # Сколько секунд результаты поиска по ячейке считаются свежими
+PLACE_CACHE_MAX_ENTRIES = 2000  # Максимум записей (источник, категория, ячейка)
+
+
+class PlaceCache:
+    """
+    Кеш найденных мест по ключу (источник, категория, geohash-ячейка) с TTL и LRU-вытеснением.
+    Хранятся «сырые» места с координатами, поэтому для соседней точки в той же ячейке
+    пересчитываются только расстояния.
+    """
+
+    def __init__(self, precision: int = PLACE_CACHE_PRECISION, ttl: float = PLACE_CACHE_TTL,
+                 max_entries: int = PLACE_CACHE_MAX_ENTRIES):
+        self.precision = precision
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # {(source, category, cell): (expires_at, places)}
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source: str, category: str, lat: float, lon: float) -> tuple:
+        return source, category, geohash_encode(lat, lon, self.precision)
+
+    def get(self, source: str, category: str, lat: float, lon: float):
+        """Места из кеша или None, если ячейки нет или запись устарела."""
+        key = self.key(source, category, lat, lon)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, source: str, category: str, lat: float, lon: float, places: list):
+        key = self.key(source, category, lat, lon)
+        self._entries[key] = (time.monotonic() + self.ttl, places)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": len(self._entries),
+            "precision": self.precision,
+        }
@@ -0,0 +1,45 @@
+import re
+
+COORD_PRECISION = 3  # Округление координат для сравнения мест без id (3 знака ≈ 110 м)
+
+_NON_WORD_RE = re.compile(r"[^\w]+")
+
+
+def normalize_name(name: str) -> str:
+    return _NON_WORD_RE.sub(" ", (name or "").lower().replace("ё", "е")).strip()
+
+
+class PlaceAccumulator:
+    """
+    Собирает найденные места по категориям без дублей за O(1) на кандидата.
+
+    Место считается уже добавленным, если совпал id источника (Google place_id, OSM type/id)
+    или нормализованное название вместе с округлёнными координатами. Индекс общий для всех
+    категорий и источников, поэтому одна и та же стоянка не выводится дважды.
+    """
+
+    def __init__(self):
+        self.grouped = {}   # {метка категории: [(название, адрес, ссылка, км), ...]}
+        self._ids = set()
+        self._fallback_keys = set()
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, label: str, source: str, place: dict, maps_url: str, distance_km: float) -> bool:
+        """Добавляет место в категорию; возвращает False, если такое место уже есть."""
+        id_key = (source, place["id"]) if place.get("id") else None
+        fallback_key = (
+            normalize_name(place["name"]),
+            round(place["lat"], COORD_PRECISION),
+            round(place["lon"], COORD_PRECISION),
+        )
+        if (id_key and id_key in self._ids) or fallback_key in self._fallback_keys:
+            return False
+        if id_key:
+            self._ids.add(id_key)
+        self._fallback_keys.add(fallback_key)
+        self._count += 1
+        self.grouped.setdefault(label, []).append((place["name"], place["address"], maps_url, distance_km))
+        return True
@@ -0,0 +1,129 @@
+import logging
+
+from knowledge_base import estimate_tokens, snippet_cache
+
+try:
+    import tiktoken  # Необязательная зависимость: без неё токены оцениваются по длине текста
+except ImportError:
+    tiktoken = None
+
+# Бюджет токенов на весь промт (без ответа) для каждой модели
+PROMPT_BUDGETS = {
+    "gpt-5": 8000,
+    "gpt-4.1": 8000,
+    "gpt-3.5-turbo": 6000,  # Окно 16k, из них до 4000 уходит на ответ
+}
+DEFAULT_PROMPT_BUDGET = 4000
+MESSAGE_OVERHEAD = 4  # Служебные токены на каждое сообщение (роль, разделители)
+REPLY_OVERHEAD = 3    # Токены, которыми API начинает ответ ассистента
+
+_encoders = {}
+
+
+def _encoder(model: str):
+    if tiktoken is None:
+        return None
+    if model not in _encoders:
+        try:
+            _encoders[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encoders[model] = tiktoken.get_encoding("o200k_base")
+    return _encoders[model]
+
+
+def count_tokens(text: str, model: str = None) -> int:
+    """Точное число токенов через tiktoken, если он установлен, иначе оценка estimate_tokens."""
+    if not text:
+        return 0
+    encoder = _encoder(model or "gpt-4.1")
+    return len(encoder.encode(text)) if encoder else estimate_tokens(text)
+
+
+def message_tokens(message: dict, model: str = None) -> int:
+    return count_tokens(message["content"], model) + MESSAGE_OVERHEAD
+
+
+class PromptBuilder:
+    """
+    Собирает messages для запроса в пределах бюджета токенов модели.
+
+    Приоритет частей: системный промт, готовый расчёт (computed) и текущий вопрос отправляются всегда, затем разделы базы знаний
+    (менее релевантные отбрасываются первыми), затем история (сначала самые старые сообщения).
+    Число токенов статичного системного промта считается один раз на модель, фрагменты базы знаний
+    и их токены берутся из snippet_cache.
+    """
+
+    def __init__(self, system_prompt: str, budgets: dict = None, default_budget: int = DEFAULT_PROMPT_BUDGET):
+        self.system_prompt = system_prompt
+        self.budgets = budgets or PROMPT_BUDGETS
+        self.default_budget = default_budget
+        self._system_tokens = {}  # {модель: токены системного промта}
+
+    def budget(self, model: str) -> int:
+        return self.budgets.get(model, self.default_budget)
+
+    def system_tokens(self, model: str) -> int:
+        if model not in self._system_tokens:
+            self._system_tokens[model] = count_tokens(self.system_prompt, model) + MESSAGE_OVERHEAD
+        return self._system_tokens[model]
+
+    def build(self, model: str, history: list, sections: list = (), knowledge_header: str = "",
+              computed: str = None) -> list:
+        """
+        history — история диалога, последнее сообщение в ней — текущий вопрос пользователя.
+        knowledge_header — строка перед фрагментами базы знаний в системном сообщении.
+        computed — готовый результат расчёта (например, график по РТО), который модель должна только пересказать.
+        """
+        budget = self.budget(model)
+        question = history[-1:]
+        earlier = history[:-1]
+        system_tokens = self.system_tokens(model)
+        computed_message = {"role": "system", "content": computed} if computed else None
+        if computed_message:
+            system_tokens += message_tokens(computed_message, model)
+        question_tokens = sum(message_tokens(m, model) for m in question)
+        remaining = budget - system_tokens - question_tokens - REPLY_OVERHEAD
+
+        # База знаний: разделы уже отсортированы по релевантности, берём сколько влезает
+        kept_sections, knowledge_text, knowledge_tokens = [], None, 0
+        if sections:
+            used = snippet_cache.part_tokens([], model, count_tokens, knowledge_header) + MESSAGE_OVERHEAD
+            for section in sections:
+                tokens = snippet_cache.part_tokens([section], model, count_tokens)
+                if used + tokens > remaining:
+                    continue
+                kept_sections.append(section)
+                used += tokens
+            if kept_sections:
+                # Точное число для склеенного фрагмента (тоже из кеша при повторе набора разделов)
+                knowledge_text, knowledge_tokens = snippet_cache.assemble(
+                    kept_sections, model, count_tokens, knowledge_header,
+                )
+                knowledge_tokens += MESSAGE_OVERHEAD
+                remaining -= knowledge_tokens
+
+        # История: от новых сообщений к старым, пока есть место
+        kept_history, history_tokens = [], 0
+        for message in reversed(earlier):
+            tokens = message_tokens(message, model)
+            if history_tokens + tokens > remaining:
+                break
+            kept_history.append(message)
+            history_tokens += tokens
+        kept_history.reverse()
+
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if computed_message:
+            messages.append(computed_message)
+        if kept_sections:
+            messages.append({"role": "system", "content": knowledge_text})
+        messages += kept_history + question
+
+        total = system_tokens + knowledge_tokens + history_tokens + question_tokens + REPLY_OVERHEAD
+        logging.info(
+            f"[Промт] {model}: система {system_tokens}, база знаний {knowledge_tokens} "
+            f"({len(kept_sections)}/{len(sections)} разделов), история {history_tokens} "
+            f"({len(kept_history)}/{len(earlier)} сообщений), вопрос {question_tokens}, "
+            f"всего {total} из {budget}" + ("" if tiktoken else " (оценка без tiktoken)")
+        )
+        return messages
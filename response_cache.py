@@ -0,0 +1,149 @@
+import logging
+import re
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from knowledge_base import knowledge_store
+
+RESPONSE_CACHE_TTL = 24 * 3600      # Сколько секунд ответ считается актуальным
+RESPONSE_CACHE_MAX_ENTRIES = 500
+NEAR_DUPLICATE_THRESHOLD = 0.92     # Косинусное сходство вопросов, при котором берём готовый ответ
+
+_NON_WORD_RE = re.compile(r"[^\w]+")
+# Что отличает по сути похожие по вектору вопросы: числа, латиница (коды стран, номера трасс)
+# и имена собственные — слова с заглавной буквы не в начале предложения
+_SIGNATURE_RE = re.compile(r"\d+(?:[.,]\d+)?|\b[A-Za-z][\w-]*|(?<=[\w,;:)»\"]\s)[А-ЯЁ][\w-]*")
+
+# Вопрос с отсылкой к предыдущим сообщениям ("а если два водителя?", "а там что?") без истории не понять
+FOLLOW_UP_RE = re.compile(
+    r"^(?:а|и|но|тогда|еще|ну)\b"
+    r"|\b(?:этот|эта|эти|этого|этой|этому|том|тот|там|тогда|его|ее|их|он|она|оно|они|"
+    r"выше|предыдущ\w*|раньше|еще раз|тоже|также)\b"
+)
+
+
+def normalize_question(text: str) -> str:
+    return _NON_WORD_RE.sub(" ", (text or "").lower().replace("ё", "е")).strip()
+
+
+def depends_on_history(text: str) -> bool:
+    return bool(FOLLOW_UP_RE.search(normalize_question(text)))
+
+
+def question_signature(text: str) -> frozenset:
+    """Числа и имена собственные вопроса: похожий вопрос годится, только если они те же самые."""
+    return frozenset(match.lower().replace("ё", "е").replace(",", ".") for match in _SIGNATURE_RE.findall(text or ""))
+
+
+def knowledge_key(sections: list, store=knowledge_store) -> tuple:
+    """Разделы базы знаний вместе с версиями файлов: правка файла меняет ключ, и старые ответы не находятся."""
+    return tuple((section["id"], store.version(section["file"])) for section in sections)
+
+
+class ResponseCache:
+    """
+    Кеш ответов GPT на повторяющиеся вопросы (тахограф, CMR, 45 часов, паромы).
+
+    Ключ — нормализованный вопрос, использованные разделы базы знаний с версиями файлов и модель.
+    Если передан embed (векторизация вопроса), при точном промахе ищется почти такой же вопрос
+    с теми же разделами, моделью, числами и именами собственными (усреднённый вектор предложения
+    их почти не различает). Записи живут ttl секунд, лишние вытесняются по LRU.
+    """
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 embed=None, similarity_threshold: float = NEAR_DUPLICATE_THRESHOLD, store=knowledge_store):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.store = store
+        self._entries = OrderedDict()  # {(вопрос, разделы, модель): (expires_at, ответ, вектор)}
+        self._by_context = {}          # {(разделы, модель): {вопрос: (вектор, сигнатура)}} для поиска похожих
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def cacheable(self, question: str, sections: list) -> bool:
+        """Кешируем только вопросы по базе знаний, не ссылающиеся на предыдущие сообщения."""
+        if not sections or depends_on_history(question):
+            self.bypassed += 1
+            return False
+        return True
+
+    def _vector(self, question: str):
+        if self.embed is None:
+            return None
+        try:
+            return self.embed(question)
+        except Exception as e:
+            logging.warning(f"[Кеш ответов] Не удалось векторизовать вопрос: {e}")
+            return None
+
+    def _drop(self, key: tuple):
+        self._entries.pop(key, None)
+        question, context = key[0], key[1:]
+        bucket = self._by_context.get(context)
+        if bucket is not None:
+            bucket.pop(question, None)
+            if not bucket:
+                del self._by_context[context]
+
+    def _live(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def get(self, question: str, sections: list, model: str):
+        context = (knowledge_key(sections, self.store), model)
+        normalized = normalize_question(question)
+        answer = self._live((normalized,) + context)
+        if answer is not None:
+            self.hits += 1
+            return answer
+
+        vector = self._vector(question)
+        bucket = self._by_context.get(context)
+        if vector is not None and bucket:
+            signature = question_signature(question)
+            candidates = [(q, v) for q, (v, s) in bucket.items() if v is not None and s == signature]
+            if candidates:
+                similarity = np.stack([v for _, v in candidates]) @ vector
+                best = int(np.argmax(similarity))
+                if similarity[best] >= self.similarity_threshold:
+                    answer = self._live((candidates[best][0],) + context)
+                    if answer is not None:
+                        self.near_hits += 1
+                        logging.info(f"[Кеш ответов] Похожий вопрос ({similarity[best]:.2f}): '{candidates[best][0]}'")
+                        return answer
+        self.misses += 1
+        return None
+
+    def put(self, question: str, sections: list, model: str, answer: str):
+        context = (knowledge_key(sections, self.store), model)
+        normalized = normalize_question(question)
+        key = (normalized,) + context
+        vector = self._vector(question)
+        self._entries[key] = (time.monotonic() + self.ttl, answer, vector)
+        self._entries.move_to_end(key)
+        self._by_context.setdefault(context, {})[normalized] = (vector, question_signature(question))
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        total = self.hits + self.near_hits + self.misses
+        return {
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round((self.hits + self.near_hits) / total, 3) if total else 0.0,
+            "entries": len(self._entries),
+        }
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+
+SUMMARY_MODEL = "gpt-3.5-turbo"  # Служебная задача — быстрая и дешёвая модель
+SUMMARY_MAX_TOKENS = 250
+SUMMARY_MIN_NEW_MESSAGES = 2     # Обновляем сводку, когда накопилась хотя бы пара вопрос–ответ
+
+
+def build_summary_prompt(summary: str, new_messages: list) -> str:
+    dialogue = "\n".join(f"{msg['role']}: {msg['content']}" for msg in new_messages)
+    return (
+        "Обнови очень краткую и сжатую сводку диалога, добавив в неё новые сообщения. "
+        "Сохрани ключевые факты и детали, но убери все лишнее. "
+        "Сводка должна помочь ассистенту понять контекст для ответа на следующий вопрос.\n\n"
+        f"Текущая сводка:\n{summary or '(пока пусто)'}\n\n"
+        f"Новые сообщения:\n{dialogue}"
+    )
+
+
+class Summarizer:
+    """
+    Фоновое инкрементальное обновление сводки диалога.
+
+    schedule() вызывается после отправки ответа и сразу возвращается. В фоне в существующую сводку
+    дописываются только новые сообщения; результат сохраняется в ConversationStore. Следующий запрос
+    берёт ту сводку, что уже готова, и не ждёт обновления. На пользователя — не больше одной задачи:
+    если во время обновления пришли новые сообщения, задача обработает их следующим проходом.
+    """
+
+    def __init__(self, client, store, model: str = SUMMARY_MODEL, min_new_messages: int = SUMMARY_MIN_NEW_MESSAGES):
+        self.client = client
+        self.store = store
+        self.model = model
+        self.min_new_messages = min_new_messages
+        self._tasks = {}  # {user_id: asyncio.Task}
+
+    def schedule(self, user_id):
+        task = self._tasks.get(user_id)
+        if task is not None and not task.done():
+            return
+        self._tasks[user_id] = asyncio.create_task(self._run(user_id))
+
+    async def _run(self, user_id):
+        try:
+            while True:
+                summary, new_messages, upto = self.store.unsummarized(user_id)
+                if len(new_messages) < self.min_new_messages:
+                    return
+                started = time.perf_counter()
+                updated = await self._summarize(summary, new_messages)
+                if not updated:
+                    return
+                self.store.set_summary(user_id, updated, upto)
+                logging.info(
+                    f"[Сводка] Пользователь {user_id}: +{len(new_messages)} сообщений за {time.perf_counter() - started:.2f} с"
+                )
+        finally:
+            if self._tasks.get(user_id) is asyncio.current_task():
+                del self._tasks[user_id]
+
+    async def _summarize(self, summary: str, new_messages: list) -> str:
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": build_summary_prompt(summary, new_messages)}],
+                temperature=0.0,
+                max_tokens=SUMMARY_MAX_TOKENS,
+            )
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            logging.error(f"[Сводка] Ошибка при обновлении сводки диалога: {e}")
+            return ""
+
+    async def close(self):
+        """Отменяет незавершённые обновления (при остановке приложения)."""
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
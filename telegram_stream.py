@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import time
+
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+TELEGRAM_MESSAGE_LIMIT = 4096  # Максимальная длина одного сообщения Telegram
+EDIT_INTERVAL = 1.5            # Не чаще одного редактирования сообщения за столько секунд
+
+
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> list:
+    """
+    Делит текст на части не длиннее limit: по последнему переводу строки,
+    иначе по пробелу, иначе жёстко. Начало текста режется одинаково, сколько бы текста
+    ни дописалось в конец, поэтому уже отправленные части при стриминге не меняются.
+    """
+    parts = []
+    while len(text) > limit:
+        window = text[:limit]
+        cut = window.rfind("\n")
+        if cut < limit // 2:
+            cut = window.rfind(" ")
+        if cut < limit // 2:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n ")
+    parts.append(text)
+    return parts
+
+
+def _seconds(retry_after) -> float:
+    """RetryAfter.retry_after бывает int или timedelta в зависимости от версии python-telegram-bot."""
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+class StreamingReply:
+    """
+    Ответ, который отправляется сразу после первых токенов и дописывается правками сообщения.
+    Правки идут не чаще EDIT_INTERVAL, при переполнении 4096 символов начинается новое сообщение.
+    """
+
+    def __init__(self, message, edit_interval: float = EDIT_INTERVAL):
+        self.message = message          # Сообщение пользователя, на которое отвечаем
+        self.edit_interval = edit_interval
+        self.text = ""
+        self._sent = []                 # [(telegram.Message, отправленный текст), ...]
+        self._next_edit_at = 0.0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._sent)
+
+    async def append(self, delta: str):
+        self.text += delta
+        if self.text.strip() and time.monotonic() >= self._next_edit_at:
+            try:
+                await self._flush()
+            except RetryAfter as e:
+                delay = _seconds(e.retry_after)
+                logging.warning(f"[Стриминг] Лимит Telegram, следующая правка через {delay:.0f} с")
+                self._next_edit_at = time.monotonic() + delay
+
+    async def finish(self) -> str:
+        """Дописывает хвост без ограничения по частоте и возвращает полный текст."""
+        for _ in range(3):
+            if not self.text.strip():
+                break
+            try:
+                await self._flush()
+                break
+            except RetryAfter as e:
+                await asyncio.sleep(_seconds(e.retry_after))
+        return self.text
+
+    async def _flush(self):
+        parts = split_message(self.text.strip())
+        try:
+            for index, part in enumerate(parts):
+                if index < len(self._sent):
+                    sent_message, sent_text = self._sent[index]
+                    if sent_text != part:
+                        await sent_message.edit_text(part)
+                        self._sent[index] = (sent_message, part)
+                else:
+                    self._sent.append((await self.message.reply_text(part), part))
+        except RetryAfter:
+            raise
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                logging.warning(f"[Стриминг] Не удалось обновить сообщение: {e}")
+        except TelegramError as e:
+            logging.warning(f"[Стриминг] Ошибка Telegram: {e}")
+        finally:
+            # И после ошибки следующая правка не раньше чем через edit_interval; при RetryAfter
+            # вызывающий код сдвинет её ещё дальше
+            self._next_edit_at = time.monotonic() + self.edit_interval
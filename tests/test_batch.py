@@ -0,0 +1,62 @@
+# Юнит-тесты пакетного расчёта
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logic.batch import main, plan_batch  # noqa: E402
+
+TRIPS = [
+    {"id": "A", "departures": ["2025-03-03T06:00", "2025-03-08T20:00"], "distance_km": 900, "country": "DE"},
+    {"id": "B", "start_time": "2025-03-03T06:00", "distance_km": 300, "crew": True},
+    {"id": "C", "start_time": "не дата", "distance_km": 300},
+]
+
+
+def test_plan_batch_expands_departures_and_keeps_order():
+    results = list(plan_batch(TRIPS, workers=1, events=False))
+    assert [(r["id"], r["start_time"]) for r in results] == [
+        ("A", "2025-03-03T06:00"), ("A", "2025-03-08T20:00"), ("B", "2025-03-03T06:00"), ("C", "не дата"),
+    ]
+    assert "events" not in results[0]
+    assert results[1]["total_h"] > results[0]["total_h"]  # Воскресный запрет в Германии
+    assert "error" in results[3]
+
+
+def test_pool_matches_single_process():
+    single = list(plan_batch(TRIPS * 5, workers=1))
+    pooled = list(plan_batch(TRIPS * 5, workers=2, chunk_size=2))
+    assert pooled == single
+
+
+def test_cli_streams_jsonl(tmp_path, monkeypatch):
+    source = tmp_path / "trips.jsonl"
+    source.write_text("\n".join(json.dumps(trip, ensure_ascii=False) for trip in TRIPS) + "\n", encoding="utf-8")
+    output = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", output)
+    main([str(source), "--workers", "1"])
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert len(lines) == 4
+    assert lines[0]["events"][0]["start"] == "2025-03-03T06:00"
+
+
+def test_departures_must_be_a_list():
+    results = list(plan_batch([{"id": "D", "departures": "2025-03-03T06:00", "distance_km": 300}], workers=1))
+    assert len(results) == 1
+    assert results[0]["id"] == "D" and "departures" in results[0]["error"]
+
+
+def test_cli_keeps_a_row_per_bad_line(tmp_path, monkeypatch):
+    source = tmp_path / "trips.jsonl"
+    source.write_text(
+        json.dumps(TRIPS[1]) + "\n[1, 2]\n{не json\n" + json.dumps(TRIPS[1]) + "\n", encoding="utf-8"
+    )
+    output = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", output)
+    main([str(source), "--workers", "1"])
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [line.get("line") for line in lines] == [None, 2, 3, None]
+    assert "error" not in lines[0] and "error" not in lines[3]
+    assert "list" in lines[1]["error"] and "JSON" in lines[2]["error"]
@@ -1 +1,97 @@
 # Юнит-тесты ограничений по стране и времени
+import os
+import sys
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logic.constraints import (  # noqa: E402
+    _easter, _orthodox_easter, get_constraints, is_driving_allowed, next_allowed,
+)
+from logic.route_calc import plan_schedule  # noqa: E402
+
+
+def test_easter_dates():
+    assert _easter(2025) == date(2025, 4, 20)
+    assert _easter(2024) == date(2024, 3, 31)
+    assert _orthodox_easter(2024) == date(2024, 5, 5)
+    assert _orthodox_easter(2026) == date(2026, 4, 12)
+
+
+def test_germany_sunday_ban():
+    assert is_driving_allowed("DE", datetime(2025, 3, 8, 23, 0))
+    assert not is_driving_allowed("DE", datetime(2025, 3, 9, 10, 0))
+    assert is_driving_allowed("DE", datetime(2025, 3, 9, 22, 0))
+    assert next_allowed("DE", datetime(2025, 3, 9, 10, 0)) == datetime(2025, 3, 9, 22, 0)
+
+
+def test_country_by_name():
+    assert get_constraints("Германия").code == "DE"
+    assert is_driving_allowed("XX", datetime(2025, 3, 9, 10, 0))
+
+
+def test_holiday_ban():
+    assert not is_driving_allowed("DE", datetime(2025, 4, 18, 10, 0))  # Страстная пятница
+    assert not is_driving_allowed("DE", datetime(2025, 10, 3, 12, 0))
+    assert is_driving_allowed("DE", datetime(2025, 10, 2, 12, 0))
+
+
+def test_ban_across_midnight_and_holiday_eve():
+    france = get_constraints("FR")
+    assert france.state(datetime(2025, 3, 8, 23, 0)) == (True, datetime(2025, 3, 9, 22, 0))
+    # Воскресенье 13.07 и канун 14 июля сливаются в один запрет
+    assert france.state(datetime(2025, 7, 13, 12, 0)) == (True, datetime(2025, 7, 14, 22, 0))
+
+
+def test_seasonal_ban():
+    assert not is_driving_allowed("GR", datetime(2025, 7, 4, 17, 0))
+    assert is_driving_allowed("GR", datetime(2025, 3, 7, 17, 0))
+
+
+def test_weight_threshold():
+    assert not is_driving_allowed("PL", datetime(2025, 3, 9, 10, 0))
+    assert is_driving_allowed("PL", datetime(2025, 3, 9, 10, 0), weight_t=10)
+
+
+def test_road_specific_night_ban_is_opt_in():
+    assert is_driving_allowed("AT", datetime(2025, 3, 5, 23, 0))
+    assert not is_driving_allowed("AT", datetime(2025, 3, 5, 23, 0), local=True)
+    assert get_constraints("AT").local_bans[0]["roads"] == "A12, A13"
+
+
+def test_no_bans_country():
+    assert get_constraints("SE").state(datetime(2025, 3, 9, 10, 0)) == (False, None)
+
+
+def test_latest_stop_from_ruleset():
+    germany = get_constraints("DE")
+    assert germany.latest_stop_text == "16:30"
+    assert germany.stop_too_late(datetime(2025, 3, 10, 17, 0))
+    assert not germany.stop_too_late(datetime(2025, 3, 10, 16, 0))
+
+
+def test_schedule_waits_out_ban():
+    schedule = plan_schedule(datetime(2025, 3, 9, 6, 0), distance_km=300, country="DE")
+    ban, drive = schedule["events"]
+    assert ban["type"] == "ban" and ban["end"] == datetime(2025, 3, 9, 22, 0)
+    assert drive["start"] == datetime(2025, 3, 9, 22, 0)
+
+
+def test_schedule_stops_when_ban_starts():
+    schedule = plan_schedule(datetime(2025, 3, 8, 22, 0), distance_km=73 * 3, country="DE")
+    first, ban, second = schedule["events"]
+    assert first["end"] == datetime(2025, 3, 9, 0, 0)
+    assert ban["type"] == "ban"
+    assert second["start"] == datetime(2025, 3, 9, 22, 0)
+
+
+def test_daily_rest_runs_through_ban():
+    schedule = plan_schedule(datetime(2025, 3, 8, 6, 0), distance_km=1500, country="DE")
+    rest = next(event for event in schedule["events"] if event["type"] == "daily_rest")
+    assert rest["end"] == datetime(2025, 3, 9, 22, 0)
+    assert rest["action"] == "Ежедневный отдых"
+
+
+def test_late_stop_warning():
+    schedule = plan_schedule(datetime(2025, 3, 10, 8, 0), distance_km=900, country="DE")
+    assert schedule["warnings"] and "16:30" in schedule["warnings"][0]
@@ -0,0 +1,80 @@
+# Юнит-тесты истории диалогов: вытеснение из памяти и запись на диск
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_store import ConversationStore, JsonBackend, SqliteBackend  # noqa: E402
+
+DAY = 24 * 3600
+
+
+def test_lru_keeps_recent_users():
+    store = ConversationStore(max_users=2)
+    for user_id in (1, 2, 3):
+        store.append(user_id, "user", f"вопрос {user_id}")
+    assert len(store) == 2
+    assert 1 not in store._users
+    assert store.history(3) == [{"role": "user", "content": "вопрос 3"}]
+
+
+def test_history_is_a_ring_buffer():
+    store = ConversationStore(depth=3)
+    for number in range(5):
+        store.append(1, "user", str(number))
+    assert [m["content"] for m in store.history(1)] == ["2", "3", "4"]
+    assert [m["content"] for m in store.history(1, limit=2)] == ["3", "4"]
+
+
+def test_json_flush_keeps_evicted_users(tmp_path):
+    path = str(tmp_path / "sessions.json")
+    store = ConversationStore(max_users=2, backend=JsonBackend(path))
+    for user_id in (1, 2, 3):
+        store.append(user_id, "user", f"вопрос {user_id}")
+    asyncio.run(store.flush())
+    store.append(3, "assistant", "ответ 3")
+    asyncio.run(store.flush())  # Пишется только пользователь 3, но 1 и 2 остаются в файле
+
+    with open(path, encoding="utf-8") as f:
+        assert set(json.load(f)) == {"1", "2", "3"}
+    assert store.history(1) == [{"role": "user", "content": "вопрос 1"}]
+
+    reloaded = ConversationStore(max_users=2, backend=JsonBackend(path))
+    reloaded.load()
+    assert reloaded.history(1) == [{"role": "user", "content": "вопрос 1"}]
+    assert len(reloaded.history(3)) == 2
+
+
+def test_sqlite_writes_only_changed_users(tmp_path):
+    backend = SqliteBackend(str(tmp_path / "sessions.db"))
+    store = ConversationStore(max_users=1, backend=backend)
+    store.append(1, "user", "вопрос 1")
+    store.append(2, "user", "вопрос 2")  # Вытесняет 1, его запись ждёт сброса
+    asyncio.run(store.flush())
+    assert backend.load(1)["messages"] == [{"role": "user", "content": "вопрос 1"}]
+    assert backend.load(2)["total"] == 1
+
+
+def test_stale_user_returns_with_new_message(tmp_path):
+    backend = SqliteBackend(str(tmp_path / "sessions.db"))
+    backend.save({"7": {
+        "messages": [{"role": "user", "content": "старый вопрос"}, {"role": "assistant", "content": "старый ответ"}],
+        "last_seen": time.time() - 8 * DAY, "summary": "", "summarized": 0, "total": 2,
+    }})
+    store = ConversationStore(backend=backend)
+    store.append(7, "user", "НОВЫЙ вопрос")
+    assert len(store) == 1
+    assert store.history(7)[-1]["content"] == "НОВЫЙ вопрос"
+    asyncio.run(store.flush())
+    assert backend.load(7)["messages"][-1]["content"] == "НОВЫЙ вопрос"
+
+
+def test_idle_users_are_evicted_on_access():
+    store = ConversationStore(idle_ttl=DAY)
+    store.append(1, "user", "вопрос 1")
+    store._users[1]["last_seen"] -= 2 * DAY
+    store.append(2, "user", "вопрос 2")
+    assert list(store._users) == [2]
@@ -0,0 +1,62 @@
+# Юнит-тесты паромных маршрутов
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logic.ferries import ferry_index, find_routes, parse_duration, parse_ferry_query  # noqa: E402
+
+
+def test_parse_duration():
+    assert parse_duration("2 часа") == (120, 120)
+    assert parse_duration("9-10 часов") == (540, 600)
+    assert parse_duration("5 часов 45 минут - 6 часов") == (345, 360)
+    assert parse_duration("9 часов (через Rostock - 11 часов)") == (540, 540)
+    assert parse_duration("55 минут") == (55, 55)
+    assert parse_duration("") == (None, None)
+
+
+def test_routes_are_parsed():
+    records = ferry_index().records
+    assert len(records) > 30
+    route = next(r for r in records if r["from"] == "Świnoujście" and r["to"] == "Ystad")
+    assert route["from_country"] == "PL" and route["to_country"] == "SE"
+    assert route["operators"] == ["Polferries"]
+    assert route["cabin"] is True
+    assert any(r["kind"] == "rail" and r["from"] == "Wörgl" and r["to"] == "Trento" for r in records)
+
+
+def test_find_by_country_cabin_and_duration():
+    routes = find_routes("PL", "SE", cabin=True, max_hours=9)
+    assert [(r["from"], r["to"]) for r in routes] == [("Świnoujście", "Trelleborg"), ("Świnoujście", "Ystad")]
+
+
+def test_find_returns_requested_direction():
+    routes = find_routes("Швеция", "Польша")
+    assert routes and all(r["from_country"] == "SE" and r["to_country"] == "PL" for r in routes)
+    assert routes == sorted(routes, key=lambda r: r["duration_max"])
+
+
+def test_find_by_port_without_diacritics():
+    routes = find_routes("swinoujscie", "trelleborg")
+    assert len(routes) == 1 and routes[0]["duration_max"] == 420
+
+
+def test_parse_ferry_query():
+    query = parse_ferry_query("паром из Польши в Швецию с каютой до 9 часов")
+    assert query == {"origin": "PL", "destination": "SE", "cabin": True, "max_hours": 9.0, "kind": "ferry"}
+    assert parse_ferry_query("поезд через Альпы в Италию")["kind"] == "rail"
+    assert parse_ferry_query("рассчитай поездку на 900 км") is None
+
+
+def test_parse_ferry_query_russian_ports():
+    query = parse_ferry_query("какой паром из Таллина в Хельсинки")
+    assert (query["origin"], query["destination"]) == ("tallinn", "helsinki")
+    query = parse_ferry_query("паром Гданьск Нюнесхамн")
+    assert [(r["from"], r["to"]) for r in find_routes(**query)] == [("Gdańsk", "Nynäshamn")]
+    assert parse_ferry_query("сколько идёт паром из Ростока")["origin"] == "rostock"
+    assert find_routes("Свиноуйсьце", "Истад")[0]["to"] == "Ystad"
+
+
+def test_parse_ferry_query_without_place():
+    assert parse_ferry_query("паром с каютой до 9 часов") is None
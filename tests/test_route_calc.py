@@ -1 +1,175 @@
 # Юнит-тесты расчёта маршрута
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logic.helpers import parse_schedule_request  # noqa: E402
+from logic.route_calc import calculate_eta, load_rules, plan_schedule  # noqa: E402
+
+MONDAY = datetime(2025, 3, 3, 6, 0)
+
+
+def hours(event) -> float:
+    return (event["end"] - event["start"]).total_seconds() / 3600
+
+
+def of_type(schedule, kind) -> list:
+    return [event for event in schedule["events"] if event["type"] == kind]
+
+
+def test_calculate_eta_unchanged():
+    segments = [
+        {"type": "drive", "distance_km": 146},
+        {"type": "wait", "duration_min": 30, "note": "Таможня"},
+        {"type": "drive", "distance_km": 73},
+    ]
+    events, distance = calculate_eta(MONDAY, segments)
+    assert distance == 219
+    assert events[-1]["end"] == MONDAY + timedelta(hours=3.5)
+    assert events[1]["action"] == "Таможня"
+
+
+def test_default_ruleset_is_read():
+    rules = load_rules()
+    assert rules["max_driving_hours"] == 9
+    assert rules["pause_after_hours"] == 4.5
+    assert rules["daily_rest"] == 11
+
+
+def test_short_trip_has_no_stops():
+    schedule = plan_schedule(MONDAY, distance_km=200)
+    assert [event["type"] for event in schedule["events"]] == ["drive"]
+    assert schedule["driving_h"] == round(200 / 73, 2)
+
+
+def test_break_after_four_and_a_half_hours():
+    schedule = plan_schedule(MONDAY, distance_km=73 * 6)
+    first, pause, second = schedule["events"]
+    assert hours(first) == 4.5
+    assert pause["type"] == "break" and hours(pause) == 0.75
+    assert abs(hours(second) - 1.5) < 1e-6
+    assert schedule["arrival"] == MONDAY + timedelta(hours=6.75)
+
+
+def test_no_drive_stint_exceeds_limits():
+    schedule = plan_schedule(MONDAY, distance_km=3000)
+    since_break = 0
+    for event in schedule["events"]:
+        if event["type"] == "drive":
+            since_break += hours(event)
+            assert since_break <= 4.5 + 1e-6
+        else:
+            since_break = 0
+    assert schedule["distance_km"] == 3000
+
+
+def test_reduced_rests_are_used_first():
+    schedule = plan_schedule(MONDAY, distance_km=73 * 25)
+    rests = of_type(schedule, "daily_rest")
+    assert [hours(rest) for rest in rests] == [9, 9]
+    assert schedule["drivers"][0]["reduced_rests_left"] == 1
+
+
+def test_regular_rest_when_no_reduced_left():
+    schedule = plan_schedule(MONDAY, distance_km=73 * 12, state={"reduced_rests_left": 0})
+    rest, = of_type(schedule, "daily_rest")
+    assert hours(rest) == 11
+    assert rest["action"] == "Ежедневный отдых"
+
+
+def test_extended_day_only_when_it_finishes_the_trip():
+    schedule = plan_schedule(MONDAY, distance_km=73 * 10)
+    assert not of_type(schedule, "daily_rest")
+    assert schedule["drivers"][0]["extended_days_left"] == 1
+
+    schedule = plan_schedule(MONDAY, distance_km=73 * 12)
+    assert len(of_type(schedule, "daily_rest")) == 1
+    assert schedule["drivers"][0]["extended_days_left"] == 2
+
+
+def test_no_extended_day_without_allowance():
+    schedule = plan_schedule(MONDAY, distance_km=73 * 10, state={"extended_days_left": 0})
+    assert len(of_type(schedule, "daily_rest")) == 1
+
+
+def test_crew_alternates_drivers_without_breaks():
+    schedule = plan_schedule(MONDAY, distance_km=73 * 18, crew=True)
+    drives = of_type(schedule, "drive")
+    assert [event["driver"] for event in drives] == [1, 2, 1, 2]
+    assert not of_type(schedule, "break")
+    assert schedule["arrival"] == MONDAY + timedelta(hours=18)
+
+
+def test_crew_daily_rest_is_nine_hours():
+    schedule = plan_schedule(MONDAY, distance_km=73 * 20, crew=True)
+    rest, = of_type(schedule, "daily_rest")
+    assert hours(rest) == 9
+
+
+def test_weekly_rest_after_weekly_limit():
+    schedule = plan_schedule(MONDAY, distance_km=6000)
+    weekly = of_type(schedule, "weekly_rest")
+    assert weekly and hours(weekly[0]) == 45
+    driven = sum(hours(event) for event in schedule["events"] if event["end"] <= weekly[0]["start"]
+                 and event["type"] == "drive")
+    assert driven <= 56 + 1e-6
+
+
+def test_long_pause_counts_as_daily_rest():
+    segments = [
+        {"type": "drive", "distance_km": 73 * 8},
+        {"type": "pause", "duration_min": 11 * 60, "note": "Паром"},
+        {"type": "drive", "distance_km": 73 * 8},
+    ]
+    schedule = plan_schedule(MONDAY, segments=segments)
+    assert not of_type(schedule, "daily_rest")
+    assert schedule["events"][-1]["end"] == schedule["arrival"]
+
+
+def test_driver_state_carries_over():
+    schedule = plan_schedule(MONDAY, distance_km=73, state={"since_break_h": 4.5})
+    assert schedule["events"][0]["type"] == "break"
+
+
+def test_parse_schedule_request():
+    now = datetime(2025, 3, 3, 20, 0)
+    request = parse_schedule_request("Рассчитай 1200 км, выезд в 06:00, 80 км/ч, экипаж, 1 удлинённый", now)
+    assert request["distance_km"] == 1200
+    assert request["speed_kmh"] == 80
+    assert request["crew"] is True
+    assert request["start_time"] == datetime(2025, 3, 4, 6, 0)
+    assert request["state"] == {"extended_days_left": 1}
+    assert parse_schedule_request("сколько стоит паром", now) is None
+
+
+def test_ferry_with_cabin_counts_as_daily_rest():
+    segments = [
+        {"type": "drive", "distance_km": 73 * 9},
+        {"type": "ferry", "duration_min": 11 * 60, "cabin": True, "note": "Паром"},
+        {"type": "drive", "distance_km": 73 * 5},
+    ]
+    schedule = plan_schedule(MONDAY, segments=segments)
+    assert not of_type(schedule, "daily_rest")
+    assert len(of_type(schedule, "ferry")) == 1
+
+
+def test_ferry_without_cabin_is_only_a_break():
+    segments = [
+        {"type": "drive", "distance_km": 73 * 4},
+        {"type": "ferry", "route": {"from": "Calais", "to": "Dover", "duration_max": 90, "cabin": None}},
+        {"type": "drive", "distance_km": 73 * 6},
+    ]
+    schedule = plan_schedule(MONDAY, segments=segments, state={"extended_days_left": 0})
+    assert schedule["events"][1]["action"] == "Паром Calais → Dover"
+    assert hours(schedule["events"][2]) == 4.5  # Паром засчитан как перерыв
+    assert len(of_type(schedule, "daily_rest")) == 1  # ...но не как отдых
+
+
+def test_ferry_without_duration_is_rejected():
+    segments = [{"type": "ferry", "route": {"from": "Calais", "to": "Dover", "duration_max": None, "cabin": None}}]
+    with pytest.raises(ValueError, match="Calais → Dover"):
+        plan_schedule(MONDAY, segments=segments)
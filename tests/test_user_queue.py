@@ -0,0 +1,91 @@
+# Юнит-тесты очереди сообщений по пользователям
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_queue import UserQueue  # noqa: E402
+
+
+def texts(batch) -> list:
+    return [text for _, text in batch]
+
+
+def test_messages_in_a_row_become_one_batch():
+    async def scenario():
+        batches = []
+
+        async def handler(batch):
+            batches.append(texts(batch))
+
+        queue = UserQueue(handler, debounce=0.01)
+        queue.submit(1, None, "раз")
+        queue.submit(1, None, "два")
+        queue.submit(2, None, "другой")
+        await asyncio.sleep(0.05)
+        return batches, queue
+
+    batches, queue = asyncio.run(scenario())
+    assert sorted(batches) == [["другой"], ["раз", "два"]]
+    assert queue.stats() == {"received": 3, "batches": 2}
+
+
+def test_batches_of_one_user_never_overlap():
+    async def scenario():
+        active, overlaps, done = set(), [], []
+
+        async def handler(batch):
+            if active:
+                overlaps.append(texts(batch))
+            active.add(1)
+            await asyncio.sleep(0.05)
+            active.discard(1)
+            done.append(texts(batch))
+
+        queue = UserQueue(handler, debounce=0)
+        queue.submit(1, None, "m1")
+        await asyncio.sleep(0.01)
+        queue.submit(1, None, "m2")  # Ждёт замок, пока обрабатывается m1
+        await asyncio.sleep(0.065)
+        queue.submit(1, None, "m3")  # m1 уже отпустил замок, m2 ещё обрабатывается
+        await asyncio.sleep(0.2)
+        return overlaps, done, queue
+
+    overlaps, done, queue = asyncio.run(scenario())
+    assert overlaps == []
+    assert done == [["m1"], ["m2"], ["m3"]]
+    assert queue._locks == {}
+
+
+def test_close_waits_for_batches_in_progress():
+    async def scenario():
+        done = []
+
+        async def handler(batch):
+            await asyncio.sleep(0.03)
+            done.extend(texts(batch))
+
+        queue = UserQueue(handler, debounce=0)
+        queue.submit(1, None, "в работе")
+        await asyncio.sleep(0.01)
+        queue.submit(2, None, "ещё ждёт паузы")  # Отменяется, не начавшись
+        await queue.close()
+        return done
+
+    assert asyncio.run(scenario()) == ["в работе"]
+
+
+def test_close_cancels_batches_after_timeout():
+    async def scenario():
+        async def handler(batch):
+            await asyncio.sleep(10)
+
+        queue = UserQueue(handler, debounce=0)
+        queue.submit(1, None, "долгая пачка")
+        await asyncio.sleep(0.01)
+        await queue.close(timeout=0.01)
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert not queue._running and queue._locks == {}
@@ -0,0 +1,169 @@
+import asyncio
+import importlib.util
+import io
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from voice_input import VOICE_FILENAME
+
+TRANSCRIPTION_BACKENDS = "openai,local"  # Порядок попыток; следующий бэкенд — запасной
+TRANSCRIPTION_LANGUAGE = "ru"
+OPENAI_WHISPER_MODEL = "whisper-1"
+LOCAL_WHISPER_MODEL = "small"        # Размер модели faster-whisper: tiny, base, small, medium...
+LOCAL_WHISPER_COMPUTE_TYPE = "int8"  # Квантизация для CPU
+LOCAL_WHISPER_WORKERS = 1            # Процессов в пуле; каждый держит свою копию модели
+
+# --- Локальная модель (живёт в процессах пула) ---
+_worker_model = None
+
+
+def _init_worker(model_size: str, compute_type: str):
+    """Загружает модель один раз на процесс пула."""
+    global _worker_model
+    from faster_whisper import WhisperModel
+    _worker_model = WhisperModel(model_size, device="cpu", compute_type=compute_type)
+
+
+def _worker_ready() -> bool:
+    return _worker_model is not None
+
+
+def _worker_transcribe(data: bytes, language: str) -> str:
+    segments, _ = _worker_model.transcribe(io.BytesIO(data), language=language, beam_size=1, vad_filter=True)
+    return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+class OpenAIWhisperBackend:
+    """Распознавание через OpenAI Whisper API."""
+
+    name = "openai"
+
+    def __init__(self, client, model: str = OPENAI_WHISPER_MODEL):
+        self.client = client
+        self.model = model
+
+    async def transcribe(self, audio) -> str:
+        # Формат Whisper определяет по расширению; у буфера в памяти имени нет
+        name = getattr(audio, "name", None)
+        filename = os.path.basename(name) if isinstance(name, str) else VOICE_FILENAME
+        transcript = await self.client.audio.transcriptions.create(model=self.model, file=(filename, audio))
+        return transcript.text
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class LocalWhisperBackend:
+    """
+    Офлайн-распознавание квантизованной моделью faster-whisper на CPU.
+    Модель работает в пуле процессов, поэтому не блокирует цикл событий бота.
+    """
+
+    name = "local"
+
+    def __init__(self, model_size: str = LOCAL_WHISPER_MODEL, compute_type: str = LOCAL_WHISPER_COMPUTE_TYPE,
+                 workers: int = LOCAL_WHISPER_WORKERS, language: str = TRANSCRIPTION_LANGUAGE):
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.workers = workers
+        self.language = language
+        self._pool = None
+
+    @staticmethod
+    def available() -> bool:
+        return importlib.util.find_spec("faster_whisper") is not None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn, а не fork: процесс бота многопоточный
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_size, self.compute_type),
+            )
+        return self._pool
+
+    async def start(self):
+        """Поднимает пул и загружает модель в фоне, чтобы первое голосовое не ждало загрузки."""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            await loop.run_in_executor(self._get_pool(), _worker_ready)
+            logging.info(
+                f"[Распознавание] Локальная модель {self.model_size} загружена за {time.perf_counter() - started:.2f} с"
+            )
+        except Exception as e:
+            logging.warning(f"[Распознавание] Локальная модель {self.model_size} недоступна: {e}")
+
+    async def transcribe(self, audio) -> str:
+        data = audio.read()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_pool(), _worker_transcribe, data, self.language)
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class Transcriber:
+    """Пробует бэкенды распознавания по порядку; при ошибке переходит к следующему."""
+
+    def __init__(self, backends: list):
+        self.backends = backends
+
+    async def transcribe(self, audio) -> str:
+        last_error = None
+        for backend in self.backends:
+            audio.seek(0)
+            started = time.perf_counter()
+            try:
+                text = await backend.transcribe(audio)
+            except Exception as e:
+                last_error = e
+                logging.warning(f"[Распознавание] {backend.name}: ошибка, пробую следующий бэкенд: {e}")
+                continue
+            logging.info(f"[Распознавание] {backend.name}: {time.perf_counter() - started:.2f} с")
+            return (text or "").strip()
+        raise RuntimeError(f"Ни один бэкенд распознавания не сработал: {last_error}")
+
+    async def start(self):
+        """
+        Прогревает только основной бэкенд. Запасные (например, локальная модель за Whisper API)
+        поднимаются при первом обращении к ним и до того не держат память.
+        """
+        if self.backends:
+            await self.backends[0].start()
+
+    async def close(self):
+        for backend in self.backends:
+            await backend.close()
+
+
+def create_transcriber(client, names: str = TRANSCRIPTION_BACKENDS, **local_options) -> Transcriber:
+    """
+    Распознаватель из списка бэкендов через запятую: 'openai', 'local' (faster-whisper).
+    Недоступные бэкенды (например, без установленного faster-whisper) пропускаются.
+    """
+    backends = []
+    for name in (n.strip() for n in names.split(",")):
+        if name == "openai":
+            backends.append(OpenAIWhisperBackend(client))
+        elif name == "local":
+            if LocalWhisperBackend.available():
+                backends.append(LocalWhisperBackend(**local_options))
+            else:
+                logging.warning("[Распознавание] faster-whisper не установлен, локальный бэкенд отключён")
+        elif name:
+            logging.warning(f"[Распознавание] Неизвестный бэкенд: {name}")
+    if not backends:
+        backends.append(OpenAIWhisperBackend(client))
+    logging.info(f"[Распознавание] Бэкенды: {', '.join(b.name for b in backends)}")
+    return Transcriber(backends)
@@ -0,0 +1,105 @@
+import asyncio
+import inspect
+import logging
+
+DEBOUNCE_SECONDS = 1.0       # Сколько ждать следующего сообщения, прежде чем отвечать на пачку
+MAX_CONCURRENT_REQUESTS = 8  # Сколько пачек (запросов к GPT) обрабатывается одновременно на всех пользователей
+CLOSE_TIMEOUT = 10.0         # Сколько секунд при остановке ждать пачки, которые уже обрабатываются
+
+
+class UserQueue:
+    """
+    Очередь сообщений по пользователям.
+
+    Сообщения, пришедшие подряд с паузой меньше debounce, склеиваются в одну пачку и уходят
+    в handler одним вызовом. Пачки одного пользователя обрабатываются строго по очереди, а общее
+    число одновременно обрабатываемых пачек ограничено семафором. Вместо текста можно передать
+    awaitable (например, задачу распознавания голосового) — порядок сообщений при этом сохраняется.
+    """
+
+    def __init__(self, handler, debounce: float = DEBOUNCE_SECONDS, max_concurrent: int = MAX_CONCURRENT_REQUESTS):
+        self.handler = handler  # async handler([(update, text), ...])
+        self.debounce = debounce
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._pending = {}  # {user_id: [(update, текст или awaitable), ...]}
+        self._waiting = {}  # {user_id: задача, ждущая паузы в сообщениях}
+        self._locks = {}    # {user_id: [asyncio.Lock, сколько задач держат его или ждут]}
+        self._running = set()  # Задачи, дождавшиеся паузы: ждут замок/семафор или обрабатывают пачку
+        self.received = 0
+        self.batches = 0
+
+    def submit(self, user_id, update, text):
+        self.received += 1
+        self._pending.setdefault(user_id, []).append((update, text))
+        waiting = self._waiting.get(user_id)
+        if waiting is not None:
+            waiting.cancel()  # Пришло ещё сообщение — ждём паузу заново
+        self._waiting[user_id] = asyncio.create_task(self._debounce(user_id))
+
+    async def _debounce(self, user_id):
+        try:
+            await asyncio.sleep(self.debounce)
+        except asyncio.CancelledError:
+            return  # Пачку заберёт задача, созданная для нового сообщения
+        del self._waiting[user_id]
+        task = asyncio.current_task()
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+        # Замок удаляется, только когда его никто не держит и не ждёт: после release() разбуженная
+        # задача ещё не захватила его, и locked() уже False
+        entry = self._locks.setdefault(user_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                batch = self._pending.pop(user_id, [])
+                async with self._semaphore:
+                    await self._process(batch)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[user_id]
+
+    async def _process(self, batch: list):
+        resolved = []
+        for update, text in batch:
+            if inspect.isawaitable(text):
+                try:
+                    text = await text
+                except Exception as e:
+                    logging.error(f"[Очередь] Не удалось получить текст сообщения: {e}")
+                    continue
+            if text:
+                resolved.append((update, text))
+        if not resolved:
+            return
+        self.batches += 1
+        if len(resolved) > 1:
+            logging.info(f"[Очередь] Склеено сообщений: {len(resolved)}")
+        try:
+            await self.handler(resolved)
+        except Exception as e:
+            logging.error(f"[Очередь] Ошибка обработки сообщений: {e}", exc_info=True)
+
+    async def close(self, timeout: float = CLOSE_TIMEOUT):
+        """
+        При остановке приложения: отменяет пачки, ещё ждущие паузы, и до timeout секунд ждёт
+        уже начатые, чтобы ответы не обрывались закрытием HTTP-сессии; не успевшие отменяются.
+        """
+        tasks = list(self._waiting.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._waiting.clear()
+
+        running = list(self._running)
+        if running:
+            _, pending = await asyncio.wait(running, timeout=timeout)
+            if pending:
+                logging.warning(f"[Очередь] Не дождались пачек при остановке: {len(pending)}, отменяю")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {"received": self.received, "batches": self.batches}
@@ -0,0 +1,25 @@
+import tempfile
+
+# Голосовые до этого размера держим в памяти, более крупные уходят во временный файл на диске
+VOICE_MEMORY_LIMIT = 5 * 1024 * 1024
+VOICE_FILENAME = "voice.oga"  # Имя для Whisper: по расширению он определяет формат (OGG/Opus)
+
+
+async def download_voice(voice) -> tempfile.SpooledTemporaryFile:
+    """
+    Скачивает голосовое сообщение Telegram в буфер в памяти без записи на диск.
+    Если файл больше VOICE_MEMORY_LIMIT, буфер сам переносится во временный файл.
+    Временный файл удаляется при закрытии буфера, поэтому используйте его как контекстный менеджер:
+
+        with await download_voice(update.message.voice) as audio:
+            ...
+    """
+    telegram_file = await voice.get_file()
+    buffer = tempfile.SpooledTemporaryFile(max_size=VOICE_MEMORY_LIMIT, suffix=".oga")
+    try:
+        await telegram_file.download_to_memory(buffer)
+    except BaseException:
+        buffer.close()
+        raise
+    buffer.seek(0)
+    return buffer